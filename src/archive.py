@@ -0,0 +1,224 @@
+import os
+import queue
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+# Artifacts which are compressed already (pandas zip pickles, images, matplotlib PDFs, archives,
+# trace shards)
+COMPRESSED_SUFFIXES = {".pkl", ".levels", ".png", ".pdf", ".zip", ".gz", ".zst", ".npz"}
+# Files and directories which change until the experiment finishes
+MUTABLE_NAMES = {
+    "model-checkpoints",
+    "best_agent",
+    "results_log.jsonl",
+    "episode_summaries.jsonl",
+    "episode_labels.jsonl",
+}
+# Seconds since the last modification after which a file is considered completely written
+SETTLE_SECONDS = 5.0
+
+
+def is_final(relative_path: Path) -> bool:
+    """
+    Whether a file of an experiment directory is final once written, i.e. neither appended to nor
+    rotated (checkpoints, best agent). Files moved or deleted later (documented episodes, which are
+    labelled or deleted at the end) are final, their members are dropped when finalizing.
+    :param relative_path: Path of file relative to experiment directory.
+    :return:
+    """
+    return not (
+        relative_path.parts[0] in MUTABLE_NAMES or relative_path.suffix == ".tmp"
+    )
+
+
+class ArchiveWriter:
+    def __init__(self, fp, compressor, store_compressor):
+        """
+        File object for tarfile, which compresses the archive as a sequence of zstd frames, one per
+        member, so members can use different compressors and can be dropped without decompressing
+        the archive (concatenated frames form a valid .tar.zst).
+        :param fp: Binary file of archive.
+        :param compressor: zstandard.ZstdCompressor of members.
+        :param store_compressor: zstandard.ZstdCompressor of already-compressed members.
+        """
+        self.fp = fp
+        self.compressors = {True: compressor, False: store_compressor}
+        self.writer = None
+        self.position = 0
+        self.frame_start = 0
+
+    def start_frame(self, compress: bool):
+        self.end_frame()
+        self.frame_start = self.fp.tell()
+        self.writer = self.compressors[compress].stream_writer(self.fp, closefd=False)
+
+    def end_frame(self):
+        """
+        Ends the current frame.
+        :return: Start and end offset of the frame in the archive file, None without frame.
+        """
+        if self.writer is None:
+            return None
+        self.writer.close()
+        self.writer = None
+        return self.frame_start, self.fp.tell()
+
+    def write(self, data):
+        self.writer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+
+class StreamingArchive:
+    def __init__(
+        self,
+        outpath: Path,
+        archive_path: Path = None,
+        level: int = 3,
+        threads: int = 2,
+        recompress: bool = False,
+    ):
+        """
+        Archives an experiment directory as .tar.zst while it is written: files are compressed on a
+        background thread as soon as they are final, so finalize only adds the files which changed
+        until the end (checkpoints, logs). When finalizing, members of files which were changed, moved
+        or deleted since are dropped and the remaining members are sorted by path.
+        :param outpath: Path of experiment directory.
+        :param archive_path: Path of archive, defaults to <outpath>.tar.zst.
+        :param level: zstd compression level.
+        :param threads: zstd compression threads (training keeps running on the other cores).
+        :param recompress: Whether already-compressed artifacts are compressed again (otherwise
+        with the fastest level, at which zstd stores incompressible data).
+        """
+        import zstandard
+
+        self.outpath = Path(outpath)
+        if archive_path is None:
+            archive_path = f"{self.outpath}.tar.zst"
+        self.archive_path = Path(archive_path)
+        self.recompress = recompress
+        # Relative path -> (size, mtime) of archived version
+        self.archived = dict()
+        # Relative path and frame (start and end offset) of archived members, in archive order
+        self.frames = []
+        self.fp = open(str(self.archive_path), "wb")
+        self.writer = ArchiveWriter(
+            self.fp,
+            compressor=zstandard.ZstdCompressor(level=level, threads=threads),
+            store_compressor=zstandard.ZstdCompressor(level=1),
+        )
+        self.tar = tarfile.open(
+            fileobj=self.writer, mode="w", format=tarfile.PAX_FORMAT
+        )
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.write_loop, name="archive-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write_loop(self):
+        while True:
+            relative_path = self.queue.get()
+            if relative_path is None:
+                break
+            try:
+                self.write_member(relative_path)
+            except BaseException as exc:
+                self.error = exc
+
+    def write_member(self, relative_path: Path):
+        path = self.outpath / relative_path
+        try:
+            tarinfo = self.tar.gettarinfo(str(path), arcname=str(relative_path))
+            with open(str(path), "rb") as fp:
+                self.writer.start_frame(
+                    self.recompress or relative_path.suffix not in COMPRESSED_SUFFIXES
+                )
+                self.tar.addfile(tarinfo, fp)
+                self.frames.append((relative_path, self.writer.end_frame()))
+        except FileNotFoundError:
+            # Deleted after it was scanned
+            pass
+
+    def scan(self, final_only: bool = True) -> int:
+        """
+        Queues the new or changed files of the experiment directory (in sorted order).
+        :param final_only: Whether only files which are final already (and completely written)
+        are queued.
+        :return: Number of queued files.
+        """
+        if self.error is not None:
+            raise self.error
+        paths = sorted(
+            path.relative_to(self.outpath)
+            for path in self.outpath.rglob("*")
+            if path.is_file()
+        )
+        num_queued = 0
+        now = time.time()
+        for relative_path in paths:
+            if final_only and not is_final(relative_path):
+                continue
+            try:
+                stat = (self.outpath / relative_path).stat()
+            except FileNotFoundError:
+                continue
+            if final_only and now - stat.st_mtime < SETTLE_SECONDS:
+                continue
+            version = (stat.st_size, stat.st_mtime_ns)
+            if self.archived.get(relative_path) == version:
+                continue
+            # A changed file is archived again, finalize drops the previous version
+            self.archived[relative_path] = version
+            self.queue.put(relative_path)
+            num_queued += 1
+        return num_queued
+
+    def finalize(self):
+        """
+        Adds the remaining files and closes the archive.
+        :return: Path of archive.
+        """
+        self.scan(final_only=False)
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.start_frame(True)
+        self.tar.close()
+        end_frame = self.writer.end_frame()
+        self.fp.close()
+        if self.error is not None:
+            raise self.error
+        self.compact(end_frame)
+        return self.archive_path
+
+    def compact(self, end_frame: tuple):
+        """
+        Drops the members of files which were changed (archived again), moved or deleted since
+        they were archived, by copying the frames of the remaining members (without recompressing)
+        sorted by path, so the member order does not depend on when files were archived.
+        :param end_frame: Frame of the end-of-archive blocks.
+        :return:
+        """
+        latest = dict()
+        for index, (relative_path, _) in enumerate(self.frames):
+            latest[relative_path] = index
+        frames = [
+            self.frames[index][1]
+            for relative_path, index in sorted(latest.items())
+            if (self.outpath / relative_path).is_file()
+        ]
+        tmp_path = str(self.archive_path) + ".tmp"
+        with open(str(self.archive_path), "rb") as source, open(tmp_path, "wb") as fp:
+            for start, end in frames + [end_frame]:
+                source.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    data = source.read(min(remaining, 2**24))
+                    fp.write(data)
+                    remaining -= len(data)
+        os.replace(tmp_path, str(self.archive_path))
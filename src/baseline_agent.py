@@ -0,0 +1,178 @@
+import json
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.append("./external")
+
+# Agent base class as resolved by the Runner's Agent.create (not external.tensorforce)
+from tensorforce import TensorforceError
+from tensorforce.agents import Agent, Recorder
+from tensorforce.core import ArrayDict
+
+from custom_environment import COLOURS, state_labels
+
+# Fees of the static baseline
+STATIC_FEES = {"yellow": 3.6, "green": 3.6, "teal": 1.8, "blue": 1.8}
+# Fee change of the incremental actions of CustomEnvironment
+FEE_INCREMENTS = np.array([-0.5, -0.25, 0, 0.25, 0.5])
+POLICIES = ["static", "occupancy"]
+
+
+class BaselineAgent(Agent):
+    def __init__(
+        self,
+        states: dict,
+        actions: dict,
+        max_episode_timesteps: int = None,
+        parallel_interactions: int = 1,
+        policy: str = "occupancy",
+        recorder: dict = None,
+    ):
+        """
+        Rule-based pricing baseline acting on the states and incremental fee actions of
+        CustomEnvironment, so baselines run with the Runner like RL agents.
+        Agent specification: {"agent": "baseline_agent", "policy": "static" | "occupancy"}.
+        :param states: States specification of CustomEnvironment.
+        :param actions: Actions specification of CustomEnvironment (incremental, not adjust_free).
+        :param max_episode_timesteps: Maximum number of timesteps per episode.
+        :param parallel_interactions: Number of parallel environments.
+        :param policy: "static" keeps the fees (environment starts with STATIC_FEES), "occupancy"
+        applies the rule of update-baseline-fees in Model.nlogo.
+        :param recorder: Traces recorder configuration.
+        """
+        if policy not in POLICIES:
+            raise TensorforceError.value(
+                name="BaselineAgent",
+                argument="policy",
+                value=policy,
+                hint="not in {static,occupancy}",
+            )
+        self.spec = OrderedDict(
+            agent="baseline_agent",
+            states=states,
+            actions=actions,
+            max_episode_timesteps=max_episode_timesteps,
+            parallel_interactions=parallel_interactions,
+            policy=policy,
+            recorder=recorder,
+        )
+        self.policy = policy
+
+        # Rule-based, hence no TensorFlow model and config of Agent.__init__
+        Recorder.__init__(
+            self,
+            fn_act=None,
+            states=states,
+            actions=actions,
+            max_episode_timesteps=max_episode_timesteps,
+            parallel_interactions=parallel_interactions,
+            recorder=recorder,
+        )
+
+        for c in COLOURS:
+            if self.actions_spec[c].num_values != len(FEE_INCREMENTS):
+                raise TensorforceError.value(
+                    name="BaselineAgent",
+                    argument="actions",
+                    value=self.actions_spec[c].num_values,
+                    hint="not incremental (use --no-adjust_free)",
+                )
+
+        # Column indices of fees and occupancies in the state vector
+        labels = state_labels(garages=self.states_spec.value().shape == (14,))
+        self.fee_indices = [labels.index(f"{c}-lot fee") for c in COLOURS]
+        self.occupancy_indices = [labels.index(f"{c}-lot occupancy") for c in COLOURS]
+
+    def get_architecture(self):
+        return f"Rule-based baseline ({self.policy})"
+
+    def initialize(self):
+        Recorder.initialize(self)
+        self.timesteps = 0
+        self.episodes = 0
+        self.updates = 0
+
+    def close(self):
+        Recorder.close(self)
+
+    def reset(self):
+        Recorder.reset(self)
+
+    def initial_internals(self):
+        return OrderedDict()
+
+    def trace_counts(self):
+        return Recorder.trace_counts(self)
+
+    def fee_changes(self, state: np.ndarray) -> np.ndarray:
+        """
+        Fee change per parallel environment and lot of the baseline policy.
+        The occupancies of the state are rounded to 2 decimals by CustomEnvironment.get_state, so
+        the rule thresholds apply to occupancies within 0.005 of them (e.g. an occupancy of 0.896
+        already raises the fee), unlike update-baseline-fees. Unrounded occupancies cannot be
+        passed with the state, since environments only return the state and action masks, and
+        the state is shared with RL agents and recorded traces.
+        :param state: Batch of state vectors.
+        :return: Array of shape (batch size, number of lots).
+        """
+        fees = np.around(state[:, self.fee_indices] * 10, 2)
+        if self.policy == "static":
+            return np.zeros_like(fees)
+        occupancy = state[:, self.occupancy_indices]
+        changes = np.select(
+            [
+                occupancy >= 0.9,
+                (occupancy < 0.75) & (occupancy >= 0.3),
+                (occupancy < 0.3) & (fees >= 1),
+            ],
+            [0.25, -0.25, -0.5],
+            default=0.0,
+        )
+        # change-fee does not lower fees below 0
+        return np.where(fees + changes < 0, 0.0, changes)
+
+    def fn_act(
+        self,
+        states,
+        internals,
+        parallel,
+        independent,
+        deterministic,
+        is_internals_none,
+        num_parallel,
+    ):
+        state = states.singleton() if states.is_singleton() else states["state"]
+        indices = np.searchsorted(FEE_INCREMENTS, self.fee_changes(state))
+        actions = ArrayDict(
+            {
+                c: indices[:, n].astype(self.actions_spec[c].np_type())
+                for n, c in enumerate(COLOURS)
+            }
+        )
+        if not independent:
+            self.timesteps += num_parallel
+        return actions, internals
+
+    def observe(self, reward=0.0, terminal=False, parallel=0):
+        reward, terminal, parallel = Recorder.observe(
+            self, reward=reward, terminal=terminal, parallel=parallel
+        )
+        self.episodes += int((terminal > 0).sum())
+        # Rules are not updated
+        return 0
+
+    def save(self, directory, filename=None, format="checkpoint", append=None):
+        """
+        Saves the agent specification (rules have no parameters).
+        :return: Path of specification file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        if filename is None:
+            filename = "agent"
+        path = os.path.join(directory, f"{filename}.json")
+        with open(path, "w") as fp:
+            json.dump({"agent": "baseline_agent", "policy": self.policy}, fp)
+        return path
@@ -0,0 +1,168 @@
+import json
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from util import add_bool_arg, episode_timesteps
+
+sys.path.append("./external")
+
+from custom_environment import CustomEnvironment
+from external.tensorforce.execution import Runner
+from resources import apply_agent_resources, plan_resources
+
+
+def run_benchmark(
+    agent: str,
+    num_parallel: int,
+    num_episodes: int,
+    manage_resources: bool,
+    affinity: bool,
+    model_size: str,
+    nl_path: str,
+    decision_interval: int = 30,
+    action_repeat: int = 1,
+):
+    """
+    Trains an agent for a number of episodes and measures the step throughput (in a fresh process,
+    as TensorFlow thread pools can only be sized once per process).
+    :param agent: Path of agent specification (JSON-file).
+    :param num_parallel: Number of parallel environments.
+    :param num_episodes: Number of episodes.
+    :param manage_resources: Whether resources are planned (otherwise TensorFlow and JVM defaults).
+    :param affinity: Whether agent and environment processes are pinned to their cores.
+    :param model_size: Model size to run experiments with, either "training" or "evaluation".
+    :param nl_path: Path to NetLogo Installation (for Linux users)
+    :param decision_interval: Simulated minutes between fee adjustments of the agent.
+    :param action_repeat: Number of decision intervals the fees of an action are kept for.
+    :return: Dictionary with timesteps, seconds, steps per second and agent seconds.
+    """
+    with open(agent, "r") as fp:
+        agent = json.load(fp=fp)
+    agent.pop("saver", None)
+    env_kwargs = {
+        "timestamp": "benchmark",
+        "reward_key": "occupancy",
+        "document": False,
+        "adjust_free": True,
+        "model_size": model_size,
+        "nl_path": nl_path,
+        "decision_interval": decision_interval,
+        "action_repeat": action_repeat,
+    }
+    max_episode_timesteps = episode_timesteps(decision_interval, action_repeat)
+    environments = [dict(environment=CustomEnvironment) for _ in range(num_parallel)]
+    if manage_resources:
+        resources = plan_resources(num_parallel, affinity=affinity)
+        apply_agent_resources(resources["agent"])
+        for environment, environment_resources in zip(
+            environments, resources["environments"]
+        ):
+            environment["resources"] = environment_resources
+
+    if num_parallel > 1:
+        runner = Runner(
+            agent=agent,
+            environments=environments,
+            remote="multiprocessing",
+            max_episode_timesteps=max_episode_timesteps,
+            **env_kwargs,
+        )
+    else:
+        runner = Runner(
+            agent=agent,
+            max_episode_timesteps=max_episode_timesteps,
+            **environments[0],
+            **env_kwargs,
+        )
+    start = time.time()
+    runner.run(
+        num_episodes=num_episodes,
+        batch_agent_calls=num_parallel > 1,
+        sync_episodes=num_parallel > 1,
+        use_tqdm=False,
+    )
+    seconds = time.time() - start
+    result = {
+        "timesteps": runner.timesteps,
+        "seconds": seconds,
+        "steps_per_second": runner.timesteps / seconds,
+        "agent_seconds": float(runner.episode_agent_seconds.sum),
+    }
+    runner.close()
+    return result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("agent", type=str, help="Specification (JSON) of Agent to use")
+    parser.add_argument(
+        "-e", "--episodes", type=int, default=16, help="Number of episodes per setting"
+    )
+    parser.add_argument(
+        "-p", "--num_parallel", type=int, default=4, help="CPU cores to use"
+    )
+    parser.add_argument(
+        "-m",
+        "--model_size",
+        type=str,
+        default="training",
+        choices=["training", "evaluation"],
+        help="Control which model size to size",
+    )
+    parser.add_argument(
+        "-np",
+        "--nl_path",
+        type=str,
+        default=None,
+        help="Path to NetLogo directory (for Linux Users)",
+    )
+    parser.add_argument(
+        "-di",
+        "--decision_interval",
+        type=int,
+        default=30,
+        help="Simulated minutes between fee adjustments (e.g. 15, 30, 60 or 120)",
+    )
+    parser.add_argument(
+        "-ar",
+        "--action_repeat",
+        type=int,
+        default=1,
+        help="Number of decision intervals the fees of an action are kept for",
+    )
+    add_bool_arg(parser, "affinity", default=False)
+    args = parser.parse_args()
+
+    results = dict()
+    for setting, manage_resources in [("defaults", False), ("planned", True)]:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context("spawn")
+        ) as executor:
+            results[setting] = executor.submit(
+                run_benchmark,
+                agent=args.agent,
+                num_parallel=args.num_parallel,
+                num_episodes=args.episodes,
+                manage_resources=manage_resources,
+                affinity=args.affinity,
+                model_size=args.model_size,
+                nl_path=args.nl_path,
+                decision_interval=args.decision_interval,
+                action_repeat=args.action_repeat,
+            ).result()
+
+    print(f"Step throughput with {args.num_parallel} environments:")
+    for setting, result in results.items():
+        print(
+            f"{setting:>8}: {result['steps_per_second']:.2f} steps/s "
+            f"({result['timesteps']} steps in {result['seconds']:.1f}s, "
+            f"{result['agent_seconds']:.1f}s in agent)"
+        )
+    speedup = (
+        results["planned"]["steps_per_second"]
+        / results["defaults"]["steps_per_second"]
+    )
+    print(f"Speedup of planned resources: {speedup:.2f}x")
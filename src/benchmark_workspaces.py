@@ -0,0 +1,150 @@
+import sys
+from argparse import ArgumentParser
+
+sys.path.append("./external")
+
+from custom_environment import COLOURS, CustomEnvironment
+from external.tensorforce.environments import MultiprocessingEnvironment
+from resources import plan_resources, process_rss
+from util import episode_timesteps
+
+
+def measure_memory(
+    num_environments: int,
+    workspaces_per_jvm: int,
+    num_steps: int,
+    model_size: str,
+    nl_path: str,
+    decision_interval: int = 30,
+    action_repeat: int = 1,
+) -> dict:
+    """
+    Starts environments (as NetLogo workspaces, possibly several per JVM process), runs a few steps
+    and measures the resident memory of their processes.
+    :param num_environments: Number of environments.
+    :param workspaces_per_jvm: Number of environments per JVM process (1: one JVM per environment).
+    :param num_steps: Number of timesteps run before measuring (heaps grow with the simulation), at most one episode.
+    :param model_size: Model size to run experiments with, either "training" or "evaluation".
+    :param nl_path: Path to NetLogo Installation (for Linux users)
+    :param decision_interval: Simulated minutes between fee adjustments of the agent.
+    :param action_repeat: Number of decision intervals the fees of an action are kept for.
+    :return: Dictionary with number of processes, total and per environment resident memory in MB.
+    """
+    env_kwargs = {
+        "timestamp": "benchmark",
+        "reward_key": "occupancy",
+        "document": False,
+        "adjust_free": False,
+        "model_size": model_size,
+        "nl_path": nl_path,
+        "decision_interval": decision_interval,
+        "action_repeat": action_repeat,
+    }
+    max_episode_timesteps = episode_timesteps(decision_interval, action_repeat)
+    # Same JVM options (heap share per JVM) as experiments with this layout
+    resources = plan_resources(num_environments, workspaces_per_jvm=workspaces_per_jvm)
+    specs = [
+        dict(environment=CustomEnvironment, resources=environment_resources)
+        for environment_resources in resources["environments"]
+    ]
+    environments = []
+    for n in range(0, num_environments, workspaces_per_jvm):
+        environments.extend(
+            MultiprocessingEnvironment.create_group(
+                environments=specs[n : n + workspaces_per_jvm],
+                max_episode_timesteps=max_episode_timesteps,
+                **env_kwargs,
+            )
+        )
+
+    # Keep fees (incremental action 2) for every lot
+    actions = {c: 2 for c in COLOURS}
+    for environment in environments:
+        environment.reset()
+    # Steps within one episode (fewer for long decision intervals)
+    for _ in range(min(num_steps, max_episode_timesteps)):
+        for environment in environments:
+            environment.execute(actions=actions)
+
+    pids = {environment._connection[1].pid for environment in environments}
+    rss = sum(process_rss(pid) for pid in pids)
+    for environment in environments:
+        environment.close()
+    return {
+        "processes": len(pids),
+        "rss_mb": rss,
+        "rss_per_environment_mb": rss / num_environments,
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--instances",
+        type=str,
+        default="4,8,16",
+        help="Comma-separated numbers of environments to measure",
+    )
+    parser.add_argument(
+        "-wj",
+        "--workspaces_per_jvm",
+        type=int,
+        default=None,
+        help="Workspaces per JVM of shared layout, defaults to all environments in one JVM",
+    )
+    parser.add_argument(
+        "-s", "--steps", type=int, default=12, help="Timesteps before measuring"
+    )
+    parser.add_argument(
+        "-m",
+        "--model_size",
+        type=str,
+        default="training",
+        choices=["training", "evaluation"],
+        help="Control which model size to size",
+    )
+    parser.add_argument(
+        "-np",
+        "--nl_path",
+        type=str,
+        default=None,
+        help="Path to NetLogo directory (for Linux Users)",
+    )
+    parser.add_argument(
+        "-di",
+        "--decision_interval",
+        type=int,
+        default=30,
+        help="Simulated minutes between fee adjustments (e.g. 15, 30, 60 or 120)",
+    )
+    parser.add_argument(
+        "-ar",
+        "--action_repeat",
+        type=int,
+        default=1,
+        help="Number of decision intervals the fees of an action are kept for",
+    )
+    args = parser.parse_args()
+
+    print("Resident memory of environment processes:")
+    for num_environments in [int(n) for n in args.instances.split(",")]:
+        workspaces = args.workspaces_per_jvm or num_environments
+        for layout, workspaces_per_jvm in [
+            ("one JVM per environment", 1),
+            (f"{workspaces} workspaces per JVM", workspaces),
+        ]:
+            result = measure_memory(
+                num_environments=num_environments,
+                workspaces_per_jvm=workspaces_per_jvm,
+                num_steps=args.steps,
+                model_size=args.model_size,
+                nl_path=args.nl_path,
+                decision_interval=args.decision_interval,
+                action_repeat=args.action_repeat,
+            )
+            print(
+                f"{num_environments:>3} environments, {layout}: "
+                f"{result['rss_per_environment_mb']:.0f} MB per environment "
+                f"({result['rss_mb']:.0f} MB in {result['processes']} processes)"
+            )
@@ -1,12 +1,20 @@
 import json
+import os
 import platform
+import random
 from pathlib import Path
 
 import numpy as np
 import pyNetLogo
 
 from external.tensorforce.environments import Environment
+from resources import apply_environment_resources, process_rss
+from traces import TraceWriter
 from util import (
+    EPISODE_MINUTES,
+    EPISODE_SEEDS,
+    PROCESS_SEEDS,
+    derive_seed,
     occupancy_reward_function,
     n_cars_reward_function,
     social_reward_function,
@@ -26,6 +34,20 @@ REWARD_FUNCTIONS = {
 }
 
 
+def state_labels(garages: bool) -> list:
+    """
+    Labels of the entries of the state vector returned by CustomEnvironment.get_state.
+    :param garages: Whether the model contains garages.
+    :return: List of labels (keys of current_state).
+    """
+    keys = ["overall_occupancy"] + [
+        f"{c}-lot {key}" for c in COLOURS for key in ["fee", "occupancy"]
+    ]
+    if garages:
+        keys.append("garages occupancy")
+    return ["ticks", "n_cars", "normalized_share_low", "mean_speed"] + sorted(keys)
+
+
 class CustomEnvironment(Environment):
     def __init__(
         self,
@@ -36,6 +58,16 @@ class CustomEnvironment(Environment):
         model_size: str = "training",
         nl_path: str = None,
         gui: bool = False,
+        seeds: list = None,
+        seed_index: int = 0,
+        seed_stride: int = 1,
+        run_seed: int = None,
+        initial_fees: dict = None,
+        resources: dict = None,
+        decision_interval: int = 30,
+        action_repeat: int = 1,
+        trace_dir: str = None,
+        trace_episodes: int = 10,
     ):
         """
         Wrapper-Class to interact with NetLogo parking simulations.
@@ -46,7 +78,23 @@ class CustomEnvironment(Environment):
         :param model_size: Model size to run experiments with, either "training" or "evaluation".
         :param nl_path: Path to NetLogo Installation (for Linux users)
         :param gui: Whether or not NetLogo UI is shown during episodes.
+        :param seeds: Per-episode seeds of NetLogo (e.g. shared with baseline runs), unseeded if None.
+        :param seed_index: Index of the seed of the first episode of this environment.
+        :param seed_stride: Seed index increment per episode (number of parallel environments).
+        :param run_seed: Seed of run to derive the seeds of the episodes and of this process from, unless seeds are given.
+        :param initial_fees: Fee per colour set at the start of every episode (e.g. static baseline), model defaults if None.
+        :param resources: JVM options, threads and cores of this environment (see resources.plan_resources).
+        :param decision_interval: Simulated minutes between fee adjustments (divisor of the 12 hours of an episode).
+        :param action_repeat: Number of intervals fees are kept for per action, rewards of the intervals are summed up.
+        :param trace_dir: Directory to record the episodes to as trace shards for pretraining (see traces.py), not recorded if None.
+        :param trace_episodes: Number of episodes per trace shard.
         """
+        if EPISODE_MINUTES % decision_interval != 0:
+            raise ValueError(
+                f"Decision interval of {decision_interval} minutes does not divide an episode"
+            )
+        if action_repeat < 1:
+            raise ValueError(f"Action repeat of {action_repeat} is less than 1")
         super().__init__()
         self.timestamp = timestamp
         self.outpath = (
@@ -59,9 +107,27 @@ class CustomEnvironment(Environment):
         self.reward_function = REWARD_FUNCTIONS[reward_key]
         self.reward_sum = 0
         self.model_size = model_size
+        self.seeds = seeds
+        self.seed_index = seed_index
+        self.seed_stride = seed_stride
+        self.run_seed = run_seed
+        if run_seed is not None:
+            # Environment processes get their own streams
+            process_seed = derive_seed(run_seed, PROCESS_SEEDS, seed_index % seed_stride)
+            random.seed(process_seed)
+            np.random.seed(process_seed)
+        self.initial_fees = initial_fees
+        self.decision_interval = decision_interval
+        self.action_repeat = action_repeat
+        self.traces = None
+        if trace_dir is not None:
+            self.traces = TraceWriter(trace_dir, episodes_per_shard=trace_episodes)
         # Load model parameters
         with open("model_config.json", "r") as fp:
             self.model_config = json.load(fp=fp)
+        # Configure process before the JVM is started
+        if resources is not None:
+            apply_environment_resources(resources)
         # Connect to NetLogo
         if platform.system() == "Linux":
             self.nl = pyNetLogo.NetLogoLink(
@@ -88,6 +154,9 @@ class CustomEnvironment(Environment):
 
         # General information about model
         self.temporal_resolution = self.nl.report("temporal-resolution")
+        # Ticks per decision interval and per episode
+        self.interval_ticks = self.temporal_resolution * self.decision_interval / 60
+        self.episode_ticks = self.temporal_resolution * EPISODE_MINUTES / 60
         self.n_garages = self.nl.report("num-garages")
         self.colours = COLOURS
 
@@ -160,13 +229,51 @@ class CustomEnvironment(Environment):
 
     # Optional additional steps to close environment
     def close(self):
+        if self.traces is not None:
+            self.traces.close()
         self.nl.kill_workspace()
         super().close()
 
+    def memory_usage(self):
+        """
+        Reports the memory of the environment process (shared by the workspaces of its JVM),
+        e.g. to monitor the memory growth of long runs.
+        :return: Dictionary with resident memory of the process, used and maximum JVM heap in MB.
+        """
+        import jpype
+
+        runtime = jpype.JClass("java.lang.Runtime").getRuntime()
+        return {
+            "rss_mb": process_rss(os.getpid()),
+            "jvm_heap_mb": int(runtime.totalMemory() - runtime.freeMemory()) / 2**20,
+            "jvm_max_heap_mb": int(runtime.maxMemory()) / 2**20,
+        }
+
+    def episode_seed(self):
+        """
+        Seed of the next episode, either from the seed list (common random numbers: episode k uses
+        the same seed as baseline episode k) or derived from the seed of the run.
+        :return: Seed or None if episodes are unseeded.
+        """
+        if self.seeds is not None:
+            return self.seeds[self.seed_index % len(self.seeds)]
+        if self.run_seed is not None:
+            # Index of environment and of its episode
+            episode, environment = divmod(self.seed_index, self.seed_stride)
+            return derive_seed(self.run_seed, EPISODE_SEEDS, environment, episode)
+        return None
+
     def reset(self):
+        seed = self.episode_seed()
+        if seed is not None:
+            self.nl.command(f"random-seed {seed}")
+            self.seed_index += self.seed_stride
         self.nl.command("setup")
         # Turn baseline pricing mechanism off
         self.nl.command("set dynamic-pricing-baseline false")
+        if self.initial_fees is not None:
+            for c, fee in self.initial_fees.items():
+                self.nl.command(f"change-fee-free {c}-lot {fee}")
         # Record data
         self.nl.command("ask one-of cars [record-data]")
         self.finished = False
@@ -177,28 +284,40 @@ class CustomEnvironment(Environment):
         self.current_state["overall_occupancy"] = self.nl.report("global-occupancy")
 
         state = self.get_state()
+        if self.traces is not None:
+            self.traces.reset(state)
         return state
 
     def execute(self, actions):
-        next_state = self.compute_step(actions)
-        terminal = self.terminal()
-        reward = self.reward()
+        reward = 0
+        for n in range(self.action_repeat):
+            # Fees are adjusted after the last interval, so they hold during the next action
+            last = n == self.action_repeat - 1
+            next_state = self.compute_step(actions if last else None)
+            terminal = self.terminal()
+            reward += self.reward()
+            if terminal:
+                break
         self.reward_sum += reward
+        if self.traces is not None:
+            self.traces.record(actions, reward, terminal, next_state)
         # if terminal and self.document:
         #    document_episode(self.nl, self.outpath, self.reward_sum)
         return next_state, terminal, reward
 
     def compute_step(self, actions):
         """
-        Moves simulation one time step forward and records current state.
-        :param actions: actions to be taken in next time step
+        Moves simulation one decision interval forward and records current state.
+        :param actions: actions to be taken in next time step, fees are kept if None
         :return:
         """
         # Move simulation forward
-        self.nl.repeat_command("go", self.temporal_resolution / 2)
+        self.nl.repeat_command("go", self.interval_ticks)
 
         # Adjust prices and query state
-        if self.adjust_free:
+        if actions is None:
+            new_state = self.get_state()
+        elif self.adjust_free:
             new_state = self.adjust_prices_free(actions)
         else:
             new_state = self.adjust_prices_step(actions)
@@ -263,7 +382,7 @@ class CustomEnvironment(Environment):
             )
 
         state = []
-        state.append(float(self.current_state["ticks"] / 21600))
+        state.append(float(self.current_state["ticks"] / self.episode_ticks))
         state.append(np.around(self.current_state["n_cars"], 2))
         state.append(np.around(self.current_state["normalized_share_low"], 2))
         state.append(
@@ -299,7 +418,7 @@ class CustomEnvironment(Environment):
         (minimum number of cars) is reached
         :return:
         """
-        self.episode_end = self.current_state["ticks"] >= self.temporal_resolution * 12
+        self.episode_end = self.current_state["ticks"] >= self.episode_ticks
         self.finished = self.current_state["n_cars"] < 0.1
 
         return self.finished or self.episode_end
@@ -0,0 +1,177 @@
+import socket
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+from multiprocessing import Process
+
+from util import add_bool_arg, episode_timesteps
+
+sys.path.append("./external")
+
+from baseline_agent import STATIC_FEES
+from external.tensorforce.environments import (
+    EnvironmentRegistry,
+    RegistryClient,
+    SocketEnvironment,
+)
+
+
+def serve_environment(port: int, registry: str, advertise_host: str, env_kwargs: dict):
+    """
+    Runs a persistent NetLogo environment worker and registers it with the registry.
+    :param port: Port to serve the environment on.
+    :param registry: Address (host:port) of the environment registry.
+    :param advertise_host: Hostname under which clients reach this worker.
+    :param env_kwargs: Keyword arguments of CustomEnvironment.
+    """
+    from custom_environment import CustomEnvironment
+
+    client = RegistryClient(address=registry)
+    client.register(host=advertise_host, port=port)
+    try:
+        SocketEnvironment.remote(
+            port=port,
+            environment=CustomEnvironment,
+            max_episode_timesteps=episode_timesteps(
+                env_kwargs["decision_interval"], env_kwargs["action_repeat"]
+            ),
+            persistent=True,
+            **env_kwargs,
+        )
+    finally:
+        client.unregister(host=advertise_host, port=port)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    registry_parser = subparsers.add_parser(
+        "registry", help="Run environment registry, which leases workers to runners"
+    )
+    registry_parser.add_argument(
+        "-po", "--port", type=int, default=6000, help="Port of registry"
+    )
+    registry_parser.add_argument(
+        "-lt",
+        "--lease_ttl",
+        type=float,
+        default=60.0,
+        help="Seconds after which leases of runners which stopped renewing them expire",
+    )
+
+    workers_parser = subparsers.add_parser(
+        "workers", help="Run persistent environment workers on this host"
+    )
+    workers_parser.add_argument(
+        "-k", "--num_workers", type=int, default=1, help="Environment workers to start"
+    )
+    workers_parser.add_argument(
+        "-rg",
+        "--registry",
+        type=str,
+        required=True,
+        help="Address (host:port) of environment registry",
+    )
+    workers_parser.add_argument(
+        "-bp",
+        "--base_port",
+        type=int,
+        default=6001,
+        help="Port of first worker, subsequent workers use increasing ports",
+    )
+    workers_parser.add_argument(
+        "-ah",
+        "--advertise_host",
+        type=str,
+        default=socket.gethostname(),
+        help="Hostname under which runners reach the workers",
+    )
+    workers_parser.add_argument(
+        "-r",
+        "--reward_key",
+        type=str,
+        default="occupancy",
+        help="Reward function to use",
+    )
+    workers_parser.add_argument(
+        "-m",
+        "--model_size",
+        type=str,
+        default="training",
+        choices=["training", "evaluation"],
+        help="Control which model size to size",
+    )
+    workers_parser.add_argument(
+        "-np",
+        "--nl_path",
+        type=str,
+        default=None,
+        help="Path to NetLogo directory (for Linux Users)",
+    )
+    workers_parser.add_argument(
+        "-t",
+        "--timestamp",
+        type=str,
+        default=datetime.now().strftime("%y%m-%d-%H%M"),
+        help="Timestamp of experiment directory episodes are documented in",
+    )
+    workers_parser.add_argument(
+        "-di",
+        "--decision_interval",
+        type=int,
+        default=30,
+        help="Simulated minutes between fee adjustments (e.g. 15, 30, 60 or 120)",
+    )
+    workers_parser.add_argument(
+        "-ar",
+        "--action_repeat",
+        type=int,
+        default=1,
+        help="Number of decision intervals the fees of an action are kept for",
+    )
+    add_bool_arg(workers_parser, "document", default=False)
+    add_bool_arg(workers_parser, "adjust_free", default=True)
+    add_bool_arg(workers_parser, "static_fees", default=False)
+
+    args = parser.parse_args()
+
+    if args.command == "registry":
+        registry = EnvironmentRegistry(port=args.port, lease_ttl=args.lease_ttl)
+        print(f"Environment registry listening on port {args.port}")
+        try:
+            registry.serve_forever()
+        finally:
+            registry.server_close()
+    else:
+        env_kwargs = {
+            "timestamp": args.timestamp,
+            "reward_key": args.reward_key,
+            "document": args.document,
+            "adjust_free": args.adjust_free,
+            "model_size": args.model_size,
+            "nl_path": args.nl_path,
+            "initial_fees": STATIC_FEES if args.static_fees else None,
+            "decision_interval": args.decision_interval,
+            "action_repeat": args.action_repeat,
+        }
+        workers = [
+            Process(
+                target=serve_environment,
+                kwargs=dict(
+                    port=args.base_port + n,
+                    registry=args.registry,
+                    advertise_host=args.advertise_host,
+                    env_kwargs=env_kwargs,
+                ),
+            )
+            for n in range(args.num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        print(
+            f"Started {args.num_workers} environment workers on ports "
+            f"{args.base_port}-{args.base_port + args.num_workers - 1}"
+        )
+        for worker in workers:
+            worker.join()
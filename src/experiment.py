@@ -1,21 +1,113 @@
 import json
+import os
+import pickle
 import shutil
+import time
+import tracemalloc
 from datetime import datetime
 from pathlib import Path
 
 import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 import seaborn as sns
 from cmcrameri import cm
 
+from archive import StreamingArchive
+from baseline_agent import STATIC_FEES
 from custom_environment import CustomEnvironment
+from external.tensorforce.core.utils import AsyncCheckpointManager
 from external.tensorforce.execution import Runner
-from util import label_episodes, delete_unused_episodes
+from resources import (
+    apply_agent_resources,
+    check_process_rss,
+    plan_resources,
+    process_rss,
+)
+from results_warehouse import ResultsWarehouse
+from traces import check_trace_spec, write_trace_spec
+from util import (
+    label_episodes,
+    delete_unused_episodes,
+    get_episode_index,
+    delete_episodes_after,
+    truncate_jsonl,
+    episode_timesteps,
+    derive_seed,
+    AGENT_SEEDS,
+    EPISODE_SEEDS,
+    ResultsLog,
+    read_results_log,
+)
 
 sns.set_style("dark")
 sns.set_context("paper")
 
+# Number of allocation sites (grown the most) in memory records
+MEMORY_TOP_ALLOCATIONS = 10
+# Seconds between scans for files to archive during a run
+ARCHIVE_SCAN_SECONDS = 30.0
+
+
+def agent_saver(runner):
+    """
+    Checkpoint manager of the agent of a runner (asynchronous or TensorFlow saver).
+    :param runner: Runner of experiment.
+    :return: Checkpoint manager, None if the agent has no saver (e.g. rule-based agents).
+    """
+    return getattr(getattr(runner.agent, "model", None), "saver", None)
+
+
+def saver_checkpoint(saver):
+    """
+    Name of the latest checkpoint of an agent saver, including one still written in the background
+    by an asynchronous saver.
+    :param saver: Checkpoint manager of agent (asynchronous or TensorFlow saver).
+    :return: Checkpoint name (without suffix), None if the agent was not checkpointed yet.
+    """
+    if (
+        isinstance(saver, AsyncCheckpointManager)
+        and saver.last_checkpoint_number is not None
+    ):
+        return f"{saver.checkpoint_name}-{saver.last_checkpoint_number}"
+    if saver.latest_checkpoint is None:
+        return None
+    return Path(saver.latest_checkpoint).stem
+
+
+def latest_checkpoint(directory: Path):
+    """
+    Name of the latest agent checkpoint in a directory, which the agent restores when resuming.
+    :param directory: Checkpoint directory of experiment.
+    :return: Checkpoint name (without suffix), None if there is no checkpoint.
+    """
+    # Asynchronous saver keeps an index of its completely written checkpoints
+    index_path = directory / AsyncCheckpointManager.INDEX_FILENAME
+    if index_path.is_file():
+        with open(str(index_path), "r") as fp:
+            latest = json.load(fp).get("latest")
+        if latest is None or not (directory / latest).is_file():
+            return None
+        return Path(latest).stem
+    import tensorflow as tf
+
+    path = tf.train.latest_checkpoint(checkpoint_dir=str(directory))
+    return Path(path).stem if path else None
+
+
+def baseline_env_kwargs(agent: dict) -> dict:
+    """
+    Environment arguments required by an agent specification, if it is a rule-based baseline.
+    :param agent: Agent specification.
+    :return: Dictionary of environment arguments (empty for other agents).
+    """
+    if agent.get("agent") != "baseline_agent":
+        return dict()
+    # Rule-based baselines adjust fees incrementally, static one from its fees
+    env_kwargs = {"adjust_free": False}
+    if agent.get("policy") == "static":
+        env_kwargs["initial_fees"] = STATIC_FEES
+    return env_kwargs
+
 
 class Experiment:
     def __init__(
@@ -25,6 +117,8 @@ class Experiment:
         args,
         batch_agent_calls: bool = False,
         sync_episodes: bool = False,
+        batch_min_size: int = None,
+        batch_max_wait: float = None,
         document: bool = True,
         adjust_free: bool = False,
         num_parallel: int = 1,
@@ -32,31 +126,82 @@ class Experiment:
         checkpoint: str = None,
         eval: bool = False,
         zip: bool = False,
+        archive: bool = False,
+        recompress: bool = False,
         model_size: str = "training",
         nl_path: str = None,
         gui: bool = False,
+        registry: str = None,
+        seeds: list = None,
+        run_seed: int = None,
+        manage_resources: bool = True,
+        affinity: bool = False,
+        workspaces_per_jvm: int = 1,
+        decision_interval: int = 30,
+        action_repeat: int = 1,
+        memory_interval: int = None,
+        memory_ceiling: float = None,
+        record_traces: bool = False,
+        pretrain_traces: str = None,
+        pretrain_iterations: int = 100,
     ):
         """
         Class to run individual experiments.
-        :param agent: Agent specification (Path to JSON-file)
+        :param agent: Agent specification (Path to JSON-file), possibly of a rule-based baseline agent.
         :param num_episodes: Number of episodes to run.
         :param batch_agent_calls: Whether or not agent calls are run in batches.
+        :param batch_min_size: Minimum number of ready environments to act on in a batch (others join a later batch).
+        :param batch_max_wait: Seconds to wait for all environments before acting on batch_min_size environments.
         :param document: Boolean if model outputs are to be saved.
         :param num_parallel: Number of environments to run in parallel.
         :param reward_key: Key to choose reward function.
         :param eval: Whether or not to use one core for evaluation (necessary for evaluation phase).
         :param zip: Whether or not to zip the experiment directory.
+        :param archive: Whether the experiment directory is archived (.tar.zst) while it is written.
+        :param recompress: Whether already-compressed artifacts are compressed again when archiving.
         :param model_size: Model size to run experiments with, either "training" or "evaluation".
         :param nl_path: Path to NetLogo Installation (for Linux users)
         :param gui: Whether or not NetLogo UI is shown during episodes.
+        :param registry: Address (host:port) of an environment registry to lease num_parallel remote environment workers from.
+        :param seeds: Per-episode NetLogo seeds (e.g. of a baseline run) for pairwise comparable episodes.
+        :param run_seed: Seed of run, from which the seeds of the agent, the environment processes and (unless seeds are given) the episodes are derived.
+        :param manage_resources: Whether TensorFlow and JVM threads are sized to the cores (see resources.py).
+        :param affinity: Whether agent and environment processes are pinned to their cores.
+        :param workspaces_per_jvm: Number of parallel environments running as NetLogo workspaces in one JVM process.
+        :param decision_interval: Simulated minutes between fee adjustments of the agent.
+        :param action_repeat: Number of decision intervals the fees of an action are kept for.
+        :param memory_interval: Episodes between allocation diffs of this process in the memory records of the results log, memory is not monitored if None.
+        :param memory_ceiling: Resident memory (MB) of an environment process above which it is recycled between episodes, requires memory_interval.
+        :param record_traces: Whether the episodes are recorded as trace shards (traces/training or traces/eval) for pretraining.
+        :param pretrain_traces: Directory of trace shards (e.g. of a baseline run) to pretrain a new agent on before its episodes.
+        :param pretrain_iterations: Number of pretraining iterations, each an update on one shard.
         """
+        if memory_ceiling is not None and (
+            memory_interval is None or registry is not None or workspaces_per_jvm > 1
+        ):
+            raise ValueError(
+                "Memory ceiling requires memory monitoring of environments running in "
+                "their own processes"
+            )
+        if record_traces and registry is not None:
+            raise ValueError("Traces are only recorded by local environments")
+        if memory_interval is not None:
+            # Fails before any episode on platforms without /proc and psutil
+            check_process_rss()
         self.num_episodes = num_episodes
         self.batch_agent_calls = batch_agent_calls
         self.sync_episodes = sync_episodes
+        self.batch_min_size = batch_min_size
+        self.batch_max_wait = batch_max_wait
         self.eval = eval
         self.zip = zip
         self.document = document
         self.num_parallel = num_parallel
+        self.reward_key = reward_key
+        # Seeds are only known here for local environments
+        self.seeds = seeds if registry is None else None
+        self.run_seed = run_seed if registry is None and seeds is None else None
+        self.episode_counts = [0] * num_parallel
         # Check if checkpoint is given (resume if given)
         if checkpoint is not None:
             self.resume_checkpoint = True
@@ -70,6 +215,11 @@ class Experiment:
         )
         # Create directory (if it does not exist yet)
         self.outpath.mkdir(parents=True, exist_ok=True)
+        # Files of the experiment are archived as soon as they are final
+        self.archive = (
+            StreamingArchive(self.outpath, recompress=recompress) if archive else None
+        )
+        self.archive_scan_time = 0.0
         env_kwargs = {
             "timestamp": self.timestamp,
             "reward_key": reward_key,
@@ -78,7 +228,12 @@ class Experiment:
             "model_size": model_size,
             "nl_path": nl_path,
             "gui": gui,
+            "decision_interval": decision_interval,
+            "action_repeat": action_repeat,
         }
+        if self.run_seed is not None:
+            env_kwargs["run_seed"] = run_seed
+        max_episode_timesteps = episode_timesteps(decision_interval, action_repeat)
 
         if self.resume_checkpoint:
             agent = dict()
@@ -89,33 +244,146 @@ class Experiment:
             with open(agent, "r") as fp:
                 agent = json.load(fp=fp)
             # Update checkpoint path
-            agent["saver"]["directory"] = str(self.outpath / "model-checkpoints")
+            if "saver" in agent:
+                agent["saver"]["directory"] = str(self.outpath / "model-checkpoints")
+            if run_seed is not None and agent.get("agent") != "baseline_agent":
+                # Seeds Python, NumPy and TensorFlow of the agent process
+                agent.setdefault("config", dict()).setdefault(
+                    "seed", derive_seed(run_seed, AGENT_SEEDS)
+                )
+            env_kwargs.update(baseline_env_kwargs(agent))
 
             # Document Config
             args["agent"] = agent
             with open(str(self.outpath / "config.txt"), "w") as outfile:
                 json.dump(args, outfile)
 
+        # Episodes are recorded by the environments, whatever the agent
+        if record_traces:
+            trace_dir = self.outpath / "traces" / ("eval" if self.eval else "training")
+            write_trace_spec(trace_dir, env_kwargs)
+            env_kwargs["trace_dir"] = str(trace_dir)
+
+        # Size thread pools of agent and local environments to the cores
+        if manage_resources and registry is None:
+            self.resources = plan_resources(
+                num_parallel, affinity=affinity, workspaces_per_jvm=workspaces_per_jvm
+            )
+            apply_agent_resources(self.resources["agent"])
+        else:
+            self.resources = None
+
+        # Run state of the agent checkpoint to resume from, read before the environments are
+        # created so they continue their seed sequences. Run states of agents with a saver belong
+        # to the agent checkpoint they were written with
+        self.run_state_prefix = f"run-state-{'eval' if self.eval else 'training'}"
+        # Agent checkpoint of the current run state
+        self.run_state_checkpoint = None
+        if self.resume_checkpoint:
+            self.run_state_checkpoint = latest_checkpoint(
+                self.outpath / "model-checkpoints"
+            )
+        self.run_state_path = self.get_run_state_path(self.run_state_checkpoint)
+        run_state = None
+        if self.resume_checkpoint and self.run_state_path.is_file():
+            with open(str(self.run_state_path), "rb") as fp:
+                run_state = pickle.load(fp)
+            if "episode_counts" in run_state:
+                self.episode_counts = list(run_state["episode_counts"])
+
         # Create appropriate number of environments
-        if num_parallel > 1:
+        if registry is not None:
+            # Environments run as persistent workers (possibly on other hosts), configured there
             self.runner = Runner(
                 agent=agent,
-                environment=CustomEnvironment,
+                remote="socket-client",
+                registry=registry,
+                evaluation=self.eval and num_parallel > 1,
+                num_parallel=num_parallel,
+            )
+            if num_parallel == 1:
+                self.batch_agent_calls = False
+                self.sync_episodes = False
+                self.batch_min_size = None
+                self.batch_max_wait = None
+        elif num_parallel > 1:
+            # Parallel environments take turns on the seed list and get their own resources
+            environments = []
+            for n in range(num_parallel):
+                environment = dict(environment=CustomEnvironment)
+                if seeds is not None or self.run_seed is not None:
+                    environment.update(
+                        seed_index=n + self.episode_counts[n] * num_parallel,
+                        seed_stride=num_parallel,
+                    )
+                if self.resources is not None:
+                    environment["resources"] = self.resources["environments"][n]
+                environments.append(environment)
+            self.runner = Runner(
+                agent=agent,
+                environments=environments,
                 remote="multiprocessing",
+                environments_per_process=workspaces_per_jvm,
                 evaluation=self.eval,
-                num_parallel=num_parallel,
-                max_episode_timesteps=24,
+                max_episode_timesteps=max_episode_timesteps,
+                seeds=seeds,
                 **env_kwargs,
             )
         else:
+            if self.resources is not None:
+                env_kwargs["resources"] = self.resources["environments"][0]
+            if seeds is not None or self.run_seed is not None:
+                env_kwargs["seed_index"] = self.episode_counts[0]
             self.runner = Runner(
                 agent=agent,
                 environment=CustomEnvironment,
-                max_episode_timesteps=24,
+                max_episode_timesteps=max_episode_timesteps,
+                seeds=seeds,
                 **env_kwargs,
             )
             self.batch_agent_calls = False
             self.sync_episodes = False
+            self.batch_min_size = None
+            self.batch_max_wait = None
+
+        # Initialize new agents from recorded traces before they interact with NetLogo
+        if pretrain_traces is not None and not self.resume_checkpoint:
+            if not hasattr(self.runner.agent, "pretrain"):
+                raise ValueError("Rule-based agents cannot be pretrained")
+            check_trace_spec(pretrain_traces, env_kwargs)
+            print(
+                f"Pretraining for {pretrain_iterations} iterations on traces in "
+                f"{pretrain_traces}"
+            )
+            self.runner.agent.pretrain(
+                directory=str(pretrain_traces), num_iterations=pretrain_iterations
+            )
+
+        # Append-only log of episode results, written after every episode
+        self.results_log = ResultsLog(self.outpath / "results_log.jsonl")
+        self.run_id = datetime.now().strftime("%y%m-%d-%H%M%S")
+        self.memory_interval = memory_interval
+        self.memory_ceiling = memory_ceiling
+        self.memory_snapshot = None
+        if self.resume_checkpoint and run_state is None:
+            print(
+                f"No run state of the restored agent checkpoint in {self.outpath}, "
+                "statistics restart"
+            )
+        if run_state is not None:
+            # Continue previous run (instead of restarting its statistics)
+            print(f"Resuming run state after {run_state['episodes']} episodes")
+            self.runner.set_run_state(run_state)
+            # Episodes documented after the run state was saved are repeated
+            delete_episodes_after(self.outpath, run_state["episode_index"])
+            if "episode_summaries_offset" in run_state:
+                truncate_jsonl(
+                    self.outpath / "episode_summaries.jsonl",
+                    run_state["episode_summaries_offset"],
+                )
+            if "results_log_offset" in run_state:
+                self.run_id = run_state["run_id"]
+                self.results_log.truncate(run_state["results_log_offset"])
 
     def run(self):
         """
@@ -123,16 +391,55 @@ class Experiment:
         :return:
         """
         print(f"Training for {self.num_episodes} episodes")
+        if self.archive is not None:
+            # Outputs of previous runs (e.g. training before evaluation) are compressed meanwhile
+            self.archive.scan()
+            self.archive_scan_time = time.time()
+        callback = [self.save_run_state]
+        if self.archive is not None:
+            callback.append(self.scan_archive)
+        if self.memory_interval is not None:
+            # Memory records are logged before the run state includes them
+            callback.insert(0, self.monitor_memory)
+            tracemalloc.start()
+            self.memory_snapshot = self.take_memory_snapshot()
         self.runner.run(
             num_episodes=self.num_episodes,
             batch_agent_calls=self.batch_agent_calls,
             sync_episodes=self.sync_episodes,
+            batch_min_size=self.batch_min_size,
+            batch_max_wait=self.batch_max_wait,
             evaluation=self.eval if self.num_parallel == 1 else False,
             save_best_agent=str(self.outpath / "best_agent"),
+            callback=callback,
+            terminal_callback=self.log_episode,
+            evaluation_callback=self.log_evaluation_episode,
         )
+        if self.memory_interval is not None:
+            tracemalloc.stop()
+            self.memory_snapshot = None
+        if self.batch_agent_calls:
+            batching_report = self.runner.batching_report()
+            print(f"Batch size histogram: {batching_report['batch_sizes']}")
+            print(
+                f"Batch wait histogram (upper bin edges {batching_report['wait_bins']}): "
+                f"{batching_report['wait_seconds']}"
+            )
+        retraces = self.runner.retrace_report()
+        if len(retraces) > 0:
+            print(f"Agent functions retraced during run: {retraces}")
+        if self.runner.checkpoint_manager is not None:
+            print(
+                f"Checkpointing: {self.runner.episode_saver_offloaded_seconds.sum:.2f}s "
+                f"written in background, {self.runner.episode_saver_seconds.sum:.2f}s "
+                f"spent on snapshots"
+            )
 
         # Saving results
+        self.results_log.close()
         self.save_results()
+        if self.archive is not None:
+            self.archive.scan()
         if self.eval:
             self.save_results(mode="eval")
 
@@ -140,27 +447,241 @@ class Experiment:
         if self.document:
             delete_unused_episodes(self.outpath)
 
+        # Index results of this experiment for cross-experiment analyses
+        warehouse = ResultsWarehouse(self.outpath.parent.parent / "results.sqlite")
+        warehouse.ingest_experiment(self.outpath)
+        warehouse.close()
+
         # Close runner
         self.runner.close()
 
+        # Finalize archive with the files written until the end (checkpoints, logs)
+        if self.archive is not None:
+            archive_path = self.archive.finalize()
+            print(f"directory archived to {archive_path}")
+
         # Zip experiment directory
         if self.zip:
             shutil.make_archive(str(self.outpath), "zip", self.outpath)
             print("directory zipped")
 
+    def episode_seed(self, parallel):
+        """
+        Seed of the episode just finished by an environment (as chosen in CustomEnvironment.reset).
+        :param parallel: Index of environment.
+        :return: Seed or None if episodes are unseeded.
+        """
+        if self.seeds is None and self.run_seed is None:
+            return None
+        episode = self.episode_counts[parallel]
+        self.episode_counts[parallel] += 1
+        if self.seeds is None:
+            return derive_seed(self.run_seed, EPISODE_SEEDS, parallel, episode)
+        seed_index = parallel + episode * self.num_parallel
+        return self.seeds[seed_index % len(self.seeds)]
+
+    def append_results_log(self, runner, mode, parallel):
+        """
+        Appends the results of the episode just finished to the results log.
+        :param runner: Runner of experiment.
+        :param mode: Either "training" or "eval".
+        :param parallel: Index of environment which finished its episode.
+        :return:
+        """
+        prefix = "episode" if mode == "training" else "evaluation"
+        returns = getattr(runner, f"{prefix}_returns")
+        record = {
+            "run": self.run_id,
+            "mode": mode,
+            "episode": len(returns) - 1,
+            "parallel": parallel,
+            "reward_key": self.reward_key,
+            "seed": self.episode_seed(parallel),
+            "rewards": float(returns[-1]),
+            "episode_length": int(getattr(runner, f"{prefix}_timesteps")[-1]),
+            "seconds": float(getattr(runner, f"{prefix}_seconds")[-1]),
+            "agent_seconds": float(getattr(runner, f"{prefix}_agent_seconds")[-1]),
+            "env_seconds": None,
+            "saver_seconds": None,
+            "time": time.time(),
+        }
+        if runner.is_environment_remote:
+            record["env_seconds"] = float(getattr(runner, f"{prefix}_env_seconds")[-1])
+        if mode == "training" and runner.checkpoint_manager is not None:
+            record["saver_seconds"] = float(runner.episode_saver_seconds[-1])
+        self.results_log.append(record)
+
+    def log_episode(self, runner, parallel):
+        """
+        Runner terminal callback logging the results of every training episode, including those
+        finished by parallel environments after the run was terminated.
+        :param runner: Runner of experiment.
+        :param parallel: Index of environment which finished its episode.
+        :return:
+        """
+        self.append_results_log(runner, "training", parallel)
+
+    def log_evaluation_episode(self, runner):
+        """
+        Runner evaluation callback logging the results of every evaluation episode.
+        :param runner: Runner of experiment.
+        :return: None, so the mean evaluation return determines the best agent.
+        """
+        self.append_results_log(runner, "eval", len(runner.environments) - 1)
+
+    @staticmethod
+    def take_memory_snapshot():
+        """
+        Takes a snapshot of the memory allocated in this process, without that of tracemalloc.
+        :return: tracemalloc.Snapshot.
+        """
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+
+    def scan_archive(self, runner, parallel):
+        """
+        Runner callback queueing the files written during the run (documented episodes, plots,
+        traces) for archiving, at most every ARCHIVE_SCAN_SECONDS.
+        :param runner: Runner of experiment.
+        :param parallel: Index of environment which finished its episode.
+        :return: True to continue the run.
+        """
+        if time.time() - self.archive_scan_time >= ARCHIVE_SCAN_SECONDS:
+            self.archive.scan()
+            self.archive_scan_time = time.time()
+        return True
+
+    def monitor_memory(self, runner, parallel):
+        """
+        Runner callback logging the memory of the environment process which finished its episode
+        and, every memory_interval episodes, the allocation sites of this process which grew the
+        most. Recycles the environment if it exceeds the memory ceiling.
+        :param runner: Runner of experiment.
+        :param parallel: Index of environment which finished its episode.
+        :return: True to continue the run.
+        """
+        record = {
+            "run": self.run_id,
+            "mode": "memory",
+            "episode": runner.episodes - 1,
+            "parallel": parallel,
+            "time": time.time(),
+            "rss_mb": process_rss(os.getpid()),
+            "environment": runner.environments[parallel].memory_usage(),
+            "recycled": False,
+        }
+        if runner.episodes % self.memory_interval == 0:
+            snapshot = self.take_memory_snapshot()
+            stats = snapshot.compare_to(self.memory_snapshot, "lineno")
+            self.memory_snapshot = snapshot
+            record["traced_mb"] = tracemalloc.get_traced_memory()[0] / 2**20
+            record["top_allocations"] = [
+                {
+                    "location": str(stat.traceback),
+                    "size_diff_kb": stat.size_diff / 1024,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:MEMORY_TOP_ALLOCATIONS]
+            ]
+        if (
+            self.memory_ceiling is not None
+            and record["environment"]["rss_mb"] > self.memory_ceiling
+            and runner.episodes < runner.num_episodes
+        ):
+            index = parallel % len(runner.environments)
+            kwargs = dict()
+            if self.seeds is not None or self.run_seed is not None:
+                # New environment continues with the seed of its next episode
+                kwargs["seed_index"] = (
+                    index + self.episode_counts[index] * self.num_parallel
+                )
+            print(
+                f"Recycling environment {index} at "
+                f"{record['environment']['rss_mb']:.0f} MB resident memory"
+            )
+            runner.recycle_environment(index, **kwargs)
+            record["recycled"] = True
+        self.results_log.append(record)
+        return True
+
+    def get_run_state_path(self, checkpoint: str = None) -> Path:
+        """
+        Path of the run state belonging to an agent checkpoint.
+        :param checkpoint: Name of agent checkpoint (without suffix), None for agents without
+        saver.
+        :return:
+        """
+        if checkpoint is None:
+            return self.outpath / "model-checkpoints" / f"{self.run_state_prefix}.pkl"
+        return (
+            self.outpath
+            / "model-checkpoints"
+            / f"{self.run_state_prefix}-{checkpoint}.pkl"
+        )
+
+    def save_run_state(self, runner, parallel):
+        """
+        Runner callback writing the run state alongside the agent checkpoints. Agents with a saver
+        (asynchronous or TensorFlow) checkpoint themselves at the frequency of their saver, and the
+        run state is written after the first episode following a new checkpoint, for that
+        checkpoint, so resuming from a checkpoint restores the run state of the same episode.
+        Agents without saver get a run state after every episode.
+        :param runner: Runner of experiment.
+        :param parallel: Index of environment which finished its episode.
+        :return: True to continue the run.
+        """
+        saver = agent_saver(runner)
+        if saver is not None:
+            checkpoint = saver_checkpoint(saver)
+            if checkpoint is None or checkpoint == self.run_state_checkpoint:
+                # No new checkpoint since the last run state
+                return True
+            # Run state of the previous checkpoint is kept until that one is written or rotated
+            previous = self.run_state_checkpoint
+            self.run_state_checkpoint = checkpoint
+            self.run_state_path = self.get_run_state_path(self.run_state_checkpoint)
+            # Run states of rotated checkpoints are removed
+            checkpoints = {Path(name).stem for name in list(saver.checkpoints)}
+            checkpoints.update({previous, self.run_state_checkpoint})
+            for run_state_path in self.run_state_path.parent.glob(
+                f"{self.run_state_prefix}-*.pkl"
+            ):
+                checkpoint = run_state_path.stem[len(self.run_state_prefix) + 1 :]
+                if checkpoint not in checkpoints:
+                    run_state_path.unlink()
+        run_state = runner.get_run_state()
+        run_state["episode_index"] = get_episode_index(self.outpath)
+        run_state["run_id"] = self.run_id
+        run_state["episode_counts"] = list(self.episode_counts)
+        run_state["results_log_offset"] = self.results_log.offset()
+        # Summaries are appended by the environments when they document their episodes
+        summaries_path = self.outpath / "episode_summaries.jsonl"
+        run_state["episode_summaries_offset"] = (
+            summaries_path.stat().st_size if summaries_path.is_file() else 0
+        )
+        self.run_state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = str(self.run_state_path) + ".tmp"
+        with open(tmp_path, "wb") as fp:
+            pickle.dump(run_state, fp)
+        os.replace(tmp_path, str(self.run_state_path))
+        return True
+
     def save_results(self, mode="training"):
         """
         Saves results, result plots and, possibly, episode results of experiment.
         :param mode: Either "training" or "evaluation".
         :return:
         """
-        # Accessing the appropriate metrics from runner
-        if mode == "training":
-            rewards = np.asarray(self.runner.episode_returns)
-            episode_length = np.asarray(self.runner.episode_timesteps)
-        elif mode == "eval":
-            rewards = np.asarray(self.runner.evaluation_returns)
-            episode_length = np.asarray(self.runner.evaluation_timesteps)
+        # Summaries are materialized from the results log of this run
+        log_df = read_results_log(
+            self.outpath / "results_log.jsonl", mode=mode, run=self.run_id
+        )
+        if len(log_df) == 0:
+            print(f"No {mode} episodes logged")
+            return
+        rewards = log_df.rewards.values
+        episode_length = log_df.episode_length.values
 
         mean_reward = rewards / episode_length
         metrics_df = pd.DataFrame.from_dict(
@@ -361,6 +361,16 @@ class Agent(Recorder):
         """
         return self.model.initial_internals.to_dict()
 
+    def trace_counts(self):
+        """
+        Returns the number of TensorFlow graph traces per model API function, which are all traced
+        once as part of initialization, so higher counts indicate retracing during a run.
+
+        Returns:
+            dict[int]: Dictionary containing the number of traces per function.
+        """
+        return self.model.trace_counts()
+
     def tracked_tensors(self):
         """
         Returns the current value of all tracked tensors (as specified by "tracking" agent
@@ -151,6 +151,9 @@ class Recorder(object):
     def initial_internals(self):
         return OrderedDict()
 
+    def trace_counts(self):
+        return OrderedDict()
+
     def act(
         self, states, internals=None, parallel=0, independent=False, deterministic=True, **kwargs
     ):
@@ -236,7 +236,10 @@ class TensorforceAgent(Agent):
             keep (<span style="color:#00C000"><b>default</b></span>: 10).</li>
             <li><b>max_hour_frequency</b> (<i>int > 0</i>) &ndash; ignoring max-checkpoints,
             definitely keep a checkpoint in given hour frequency
-            (<span style="color:#00C000"><b>default</b></span>: none).</li>
+            (<span style="color:#00C000"><b>default</b></span>: none, invalid if asynchronous).</li>
+            <li><b>asynchronous</b> (<i>bool</i>) &ndash; whether to snapshot variables in memory
+            and write/rotate NumPy checkpoints on a background thread, using atomic renames
+            (<span style="color:#00C000"><b>default</b></span>: false).</li>
             </ul>
         summarizer (path | specification): TensorBoard summaries directory, or summarizer
             configuration with the following attributes
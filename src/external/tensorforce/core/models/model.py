@@ -23,8 +23,8 @@ import numpy as np
 import tensorflow as tf
 
 from tensorforce import TensorforceError
-from tensorforce.core import ArrayDict, Module, SignatureDict, TensorDict, TensorSpec, \
-    TensorsSpec, tf_function, tf_util, VariableDict
+from tensorforce.core import ArrayDict, AsyncCheckpointManager, Module, SignatureDict, \
+    TensorDict, TensorSpec, TensorsSpec, tf_function, tf_util, VariableDict
 from tensorforce.core.layers import Layer
 
 
@@ -146,14 +146,19 @@ class Model(Module):
         if saver is None:
             self.saver = None
         elif not all(key in (
-            'directory', 'filename', 'frequency', 'load', 'max_checkpoints', 'max_hour_frequency',
-            'unit'
+            'asynchronous', 'directory', 'filename', 'frequency', 'load', 'max_checkpoints',
+            'max_hour_frequency', 'unit'
         ) for key in saver):
             raise TensorforceError.value(
                 name='agent', argument='saver', value=list(saver),
-                hint='not from {directory,filename,frequency,load,max_checkpoints,'
+                hint='not from {asynchronous,directory,filename,frequency,load,max_checkpoints,'
                      'max_hour_frequency,unit}'
             )
+        elif saver.get('asynchronous', False) and saver.get('max_hour_frequency') is not None:
+            raise TensorforceError.invalid(
+                name='agent', argument='saver[max_hour_frequency]',
+                condition='saver[asynchronous] is true'
+            )
         elif 'directory' not in saver:
             raise TensorforceError.required(name='agent', argument='saver[directory]')
         else:
@@ -200,6 +205,16 @@ class Model(Module):
     def get_architecture(self):
         raise NotImplementedError
 
+    def trace_counts(self):
+        """
+        Returns the number of graph traces per API function (one each after initialization, more
+        indicates retracing).
+        """
+        return OrderedDict(
+            (name[1:-len('_traces')], count) for name, count in sorted(vars(self).items())
+            if name.startswith('_') and name.endswith('_traces') and isinstance(count, int)
+        )
+
     @property
     def root(self):
         return self
@@ -215,6 +230,8 @@ class Model(Module):
     def close(self):
         if self.saver is not None:
             self.save()
+            if isinstance(self.saver, AsyncCheckpointManager):
+                self.saver.close()
         if self.summarizer is not None:
             self.summarizer.close()
         delattr(Module, '_MODULE_STACK')
@@ -310,15 +327,23 @@ class Model(Module):
                 frequency = self.saver.get('frequency')
                 if frequency is None:
                     frequency = 10
-                # with tf.name_scope(name='saver'):
-                self.checkpoint = tf.train.Checkpoint(**{self.name: self})
-                self.saver = tf.train.CheckpointManager(
-                    checkpoint=self.checkpoint, directory=self.saver_directory,
-                    max_to_keep=max_checkpoints,
-                    keep_checkpoint_every_n_hours=self.saver.get('max_hour_frequency'),
-                    checkpoint_name=self.saver_filename, step_counter=self.units[unit],
-                    checkpoint_interval=frequency, init_fn=None
-                )
+                if self.saver.get('asynchronous', False):
+                    # Snapshot in memory, write and rotate NumPy checkpoints in background
+                    self.saver = AsyncCheckpointManager(
+                        model=self, directory=self.saver_directory,
+                        checkpoint_name=self.saver_filename, max_to_keep=max_checkpoints,
+                        step_counter=self.units[unit], checkpoint_interval=frequency
+                    )
+                else:
+                    # with tf.name_scope(name='saver'):
+                    self.checkpoint = tf.train.Checkpoint(**{self.name: self})
+                    self.saver = tf.train.CheckpointManager(
+                        checkpoint=self.checkpoint, directory=self.saver_directory,
+                        max_to_keep=max_checkpoints,
+                        keep_checkpoint_every_n_hours=self.saver.get('max_hour_frequency'),
+                        checkpoint_name=self.saver_filename, step_counter=self.units[unit],
+                        checkpoint_interval=frequency, init_fn=None
+                    )
 
         self.is_initialized = True
 
@@ -913,6 +938,16 @@ class Model(Module):
             raise TensorforceError.value(name='Model.save', argument='format', value=format)
 
     def restore(self, *, directory=None, filename=None, format='checkpoint'):
+        if format == 'checkpoint' and directory is None and filename is None and \
+                isinstance(self.saver, AsyncCheckpointManager):
+            # Asynchronous saver writes NumPy checkpoints, latest one given by index file
+            path = self.saver.latest_checkpoint
+            if path is None:
+                raise TensorforceError.exists_not(name='Checkpoint', value=self.saver_directory)
+            directory, filename = os.path.split(path)
+            filename = filename[:-4]
+            format = 'numpy'
+
         if format == 'checkpoint':
             if directory is None:
                 if self.saver is None:
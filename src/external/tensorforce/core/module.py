@@ -101,6 +101,9 @@ def tf_function(
                 assert not api_function or _initialize
 
                 def function_graph(*args):
+                    # Python function body is only executed when the graph is (re)traced
+                    traces = '_{name}_traces'.format(name=name)
+                    setattr(self, traces, getattr(self, traces, 0) + 1)
                     with self:
                         # TODO: tf.name_scope instead?
                         kwargs = input_signature.args_to_kwargs(args=args, from_dict=dict_interface)
@@ -119,8 +122,12 @@ def tf_function(
                     # experimental_relax_shapes=False, experimental_compile=None
                 )
 
-            # Do not call function if initialization
+            # Do not call function if initialization, but trace graph already, so no tracing
+            # happens during the first (or any later) calls of a run
             if _initialize:
+                function_graphs[str(graph_params)].get_concrete_function(
+                    *input_signature.to_list(to_dict=dict_interface)
+                )
                 return
 
             # Graph arguments
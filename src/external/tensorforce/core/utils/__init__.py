@@ -14,6 +14,7 @@
 # ==============================================================================
 
 from tensorforce.core.utils import tf_util
+from tensorforce.core.utils.checkpoint_manager import AsyncCheckpointManager
 from tensorforce.core.utils.nested_dict import NestedDict
 from tensorforce.core.utils.tensor_spec import TensorSpec
 
@@ -26,6 +27,6 @@ from tensorforce.core.utils.tensors_spec import TensorsSpec
 
 
 __all__ = [
-    'ArrayDict', 'ListDict', 'ModuleDict', 'NestedDict', 'SignatureDict', 'TensorDict',
-    'TensorSpec', 'TensorsSpec', 'tf_util', 'VariableDict'
+    'ArrayDict', 'AsyncCheckpointManager', 'ListDict', 'ModuleDict', 'NestedDict',
+    'SignatureDict', 'TensorDict', 'TensorSpec', 'TensorsSpec', 'tf_util', 'VariableDict'
 ]
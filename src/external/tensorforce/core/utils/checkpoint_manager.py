@@ -0,0 +1,223 @@
+# Copyright 2020 Tensorforce Team. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class AsyncCheckpointManager(object):
+    """
+    Checkpoint manager with the saving interface of `tf.train.CheckpointManager`, which snapshots
+    the saved variables in memory on the calling thread and writes/rotates NumPy checkpoint files
+    on a background thread.
+
+    Files are first written to a temporary path and atomically renamed, and the index file
+    pointing to the latest checkpoint is only updated afterwards, so a crash never leaves a
+    corrupt latest checkpoint. If a new snapshot arrives before the previous one was written, the
+    pending snapshot is replaced.
+
+    Args:
+        model (Model): Model whose saved variables are checkpointed.
+        directory (str): Checkpoint directory.
+        checkpoint_name (str): Checkpoint filename prefix.
+        max_to_keep (int > 0): Maximum number of checkpoints to keep.
+        step_counter (tf.Variable): Counter variable determining the checkpoint number.
+        checkpoint_interval (int > 0): Minimum step counter difference between checkpoints.
+    """
+
+    INDEX_FILENAME = 'checkpoint.json'
+
+    def __init__(
+        self, *, model, directory, checkpoint_name, max_to_keep, step_counter, checkpoint_interval
+    ):
+        self.model = model
+        self.directory = directory
+        self.checkpoint_name = checkpoint_name
+        self.max_to_keep = max_to_keep
+        self._step_counter = step_counter
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint_number = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        index = self.read_index()
+        self.checkpoints = list(index.get('checkpoints', ()))
+
+        # Statistics (snapshot on calling thread, write on background thread)
+        self.snapshot_seconds = 0.0
+        self.write_seconds = 0.0
+        self.num_written = 0
+        self.num_coalesced = 0
+
+        self.condition = threading.Condition()
+        self.pending = None
+        self.is_writing = False
+        self.is_closed = False
+        self.error = None
+        self.thread = threading.Thread(target=self.write_loop, name='checkpoint-writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def latest_checkpoint(self):
+        """
+        Path of the latest completely written checkpoint, or None.
+        """
+        index = self.read_index()
+        latest = index.get('latest')
+        if latest is None:
+            return None
+        path = os.path.join(self.directory, latest)
+        if not os.path.isfile(path):
+            return None
+        return path
+
+    def read_index(self):
+        path = os.path.join(self.directory, self.INDEX_FILENAME)
+        if not os.path.isfile(path):
+            return dict()
+        with open(path, 'r') as fp:
+            return json.load(fp=fp)
+
+    def save(self, checkpoint_number=None, check_interval=True):
+        """
+        Snapshots the saved variables and schedules them for writing.
+
+        Returns:
+            str: Path the checkpoint will be written to, or None if skipped due to the interval.
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if checkpoint_number is None:
+            checkpoint_number = self._step_counter
+        if hasattr(checkpoint_number, 'numpy'):
+            checkpoint_number = checkpoint_number.numpy().item()
+        checkpoint_number = int(checkpoint_number)
+
+        if check_interval and self.last_checkpoint_number is not None and \
+                checkpoint_number - self.last_checkpoint_number < self.checkpoint_interval:
+            return None
+        self.last_checkpoint_number = checkpoint_number
+
+        snapshot_start = time.time()
+        variables = OrderedDict()
+        for variable in self.model.saved_variables:
+            assert variable.name[-2] == ':'
+            if variable.name.startswith(self.model.name + '/'):
+                name = variable.name[len(self.model.name) + 1: -2]
+            else:
+                name = variable.name[:-2]
+            variables[name] = np.array(variable.numpy(), copy=True)
+        self.snapshot_seconds += time.time() - snapshot_start
+
+        filename = '{}-{}.npz'.format(self.checkpoint_name, checkpoint_number)
+        with self.condition:
+            if self.pending is not None:
+                self.num_coalesced += 1
+            self.pending = (filename, variables)
+            self.condition.notify_all()
+        return os.path.join(self.directory, filename)
+
+    def write_loop(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.is_closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                filename, variables = self.pending
+                self.pending = None
+                self.is_writing = True
+
+            write_start = time.time()
+            try:
+                self.write(filename=filename, variables=variables)
+            except BaseException as exc:
+                self.error = exc
+            write_second = time.time() - write_start
+
+            with self.condition:
+                self.write_seconds += write_second
+                self.num_written += 1
+                self.is_writing = False
+                self.condition.notify_all()
+
+    def write(self, *, filename, variables):
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fp:
+            np.savez(fp, **variables)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+
+        if filename in self.checkpoints:
+            self.checkpoints.remove(filename)
+        self.checkpoints.append(filename)
+        removed = self.checkpoints[:-self.max_to_keep]
+        self.checkpoints = self.checkpoints[-self.max_to_keep:]
+
+        # Index only points to fully written checkpoints
+        index_path = os.path.join(self.directory, self.INDEX_FILENAME)
+        with open(index_path + '.tmp', 'w') as fp:
+            json.dump(obj=dict(latest=filename, checkpoints=self.checkpoints), fp=fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(index_path + '.tmp', index_path)
+
+        for name in removed:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def pop_statistics(self):
+        """
+        Returns and resets the seconds spent snapshotting (critical path) and writing (background
+        thread) since the last call.
+        """
+        with self.condition:
+            statistics = dict(
+                snapshot_seconds=self.snapshot_seconds, write_seconds=self.write_seconds,
+                num_written=self.num_written, num_coalesced=self.num_coalesced
+            )
+            self.snapshot_seconds = 0.0
+            self.write_seconds = 0.0
+            self.num_written = 0
+            self.num_coalesced = 0
+        return statistics
+
+    def flush(self):
+        """
+        Blocks until all scheduled checkpoints are written.
+        """
+        with self.condition:
+            while self.pending is not None or self.is_writing:
+                self.condition.wait()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.is_closed = True
+            self.condition.notify_all()
+        self.thread.join()
@@ -17,6 +17,8 @@ from tensorforce.environments.environment import Environment, RemoteEnvironment
 
 from tensorforce.environments.multiprocessing_environment import MultiprocessingEnvironment
 from tensorforce.environments.socket_environment import SocketEnvironment
+from tensorforce.environments.environment_registry import EnvironmentRegistry, \
+    RegistryClient
 
 from tensorforce.environments.arcade_learning_environment import ArcadeLearningEnvironment
 from tensorforce.environments.openai_gym import OpenAIGym
@@ -43,7 +45,8 @@ environments = dict(
 
 
 __all__ = [
-    'ArcadeLearningEnvironment', 'Environment', 'MazeExplorer', 'MultiprocessingEnvironment',
-    'OpenAIGym', 'OpenAIRetro', 'OpenSim', 'PyGameLearningEnvironment', 'RemoteEnvironment',
-    'SocketEnvironment', 'ViZDoom', 'CARLAEnvironment'
+    'ArcadeLearningEnvironment', 'Environment', 'EnvironmentRegistry', 'MazeExplorer',
+    'MultiprocessingEnvironment', 'OpenAIGym', 'OpenAIRetro', 'OpenSim',
+    'PyGameLearningEnvironment', 'RegistryClient', 'RemoteEnvironment', 'SocketEnvironment',
+    'ViZDoom', 'CARLAEnvironment'
 ]
@@ -71,7 +71,10 @@ class Environment(object):
             port (int): Socket server port
                 (<span style="color:#C00000"><b>required</b></span> only for "socket-client/server"
                 remote mode).
-            kwargs: Additional arguments.
+            kwargs: Additional arguments, for "socket-client/server" remote mode only `persistent`
+                (bool) to keep the connection pooled on the client and the environment alive
+                across connections on the server
+                (<span style="color:#00C000"><b>default</b></span>: false).
         """
         if remote not in ('multiprocessing', 'socket-client'):
             if blocking:
@@ -98,6 +101,7 @@ class Environment(object):
             return environment
 
         elif remote == 'socket-client':
+            persistent = kwargs.pop('persistent', False)
             if environment is not None:
                 raise TensorforceError.invalid(
                     name='Environment.create', argument='environment',
@@ -114,7 +118,9 @@ class Environment(object):
                     condition='socket-client instance'
                 )
             from tensorforce.environments import SocketEnvironment
-            environment = SocketEnvironment(host=host, port=port, blocking=blocking)
+            environment = SocketEnvironment(
+                host=host, port=port, blocking=blocking, persistent=persistent
+            )
             return environment
 
         elif remote == 'socket-server':
@@ -658,37 +664,7 @@ class RemoteEnvironment(Environment):
 
             while True:
                 attribute, kwargs = cls.remote_receive(connection=connection)
-
-                if attribute in ('reset', 'execute'):
-                    environment_start = time.time()
-
-                try:
-                    result = getattr(env, attribute)
-                    if callable(result):
-                        if kwargs is None:
-                            result = None
-                        else:
-                            result = result(**kwargs)
-                    elif kwargs is None:
-                        pass
-                    elif len(kwargs) == 1 and 'value' in kwargs:
-                        setattr(env, attribute, kwargs['value'])
-                        result = None
-                    else:
-                        raise TensorforceError(message="Invalid remote attribute/function access.")
-                except AttributeError:
-                    if kwargs is None or len(kwargs) != 1 or 'value' not in kwargs:
-                        raise TensorforceError(message="Invalid remote attribute/function access.")
-                    setattr(env, attribute, kwargs['value'])
-                    result = None
-
-                if attribute in ('reset', 'execute'):
-                    seconds = time.time() - environment_start
-                    if attribute == 'reset':
-                        result = (result, seconds)
-                    else:
-                        result += (seconds,)
-
+                result = cls.remote_call(env=env, attribute=attribute, kwargs=kwargs)
                 cls.remote_send(connection=connection, success=True, result=result)
 
                 if attribute == 'close':
@@ -716,6 +692,40 @@ class RemoteEnvironment(Environment):
         finally:
             cls.remote_close(connection=connection)
 
+    @classmethod
+    def remote_call(cls, env, attribute, kwargs):
+        if attribute in ('reset', 'execute'):
+            environment_start = time.time()
+
+        try:
+            result = getattr(env, attribute)
+            if callable(result):
+                if kwargs is None:
+                    result = None
+                else:
+                    result = result(**kwargs)
+            elif kwargs is None:
+                pass
+            elif len(kwargs) == 1 and 'value' in kwargs:
+                setattr(env, attribute, kwargs['value'])
+                result = None
+            else:
+                raise TensorforceError(message="Invalid remote attribute/function access.")
+        except AttributeError:
+            if kwargs is None or len(kwargs) != 1 or 'value' not in kwargs:
+                raise TensorforceError(message="Invalid remote attribute/function access.")
+            setattr(env, attribute, kwargs['value'])
+            result = None
+
+        if attribute in ('reset', 'execute'):
+            seconds = time.time() - environment_start
+            if attribute == 'reset':
+                result = (result, seconds)
+            else:
+                result += (seconds,)
+
+        return result
+
     def __init__(self, connection, blocking=False):
         super().__init__()
         self._connection = connection
@@ -764,7 +774,7 @@ class RemoteEnvironment(Environment):
     ])
 
     def __getattr__(self, name):
-        if name in RemoteEnvironment._ATTRIBUTES:
+        if name in self._ATTRIBUTES:
             return super().__getattr__(name)
         else:
             self.send(function=name, kwargs=None)
@@ -782,7 +792,7 @@ class RemoteEnvironment(Environment):
                 return result
 
     def __setattr__(self, name, value):
-        if name in RemoteEnvironment._ATTRIBUTES:
+        if name in self._ATTRIBUTES:
             super().__setattr__(name, value)
         else:
             self.send(function=name, kwargs=dict(value=value))
@@ -0,0 +1,375 @@
+# Copyright 2020 Tensorforce Team. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import atexit
+import json
+import os
+from socket import create_connection, gethostname
+import socketserver
+import threading
+import time
+
+from tensorforce import TensorforceError
+
+
+class EnvironmentRegistry(socketserver.ThreadingTCPServer):
+    """
+    Registry of persistent socket-server environment workers (possibly on multiple hosts), which
+    hands out exclusive leases on workers to socket-client runners.
+
+    Workers are preferably leased again to the client which previously held them, so pooled
+    `SocketEnvironment` connections of the client are reused. Leases expire unless the client
+    renews them (`RegistryClient` does so in the background), so workers of killed clients are
+    leased again. Workers are probed before they are leased, and workers whose port refuses
+    connections (e.g. killed without unregistering) are dropped. Requests and responses are single
+    JSON lines with an "op" key: "register"/"unregister" (host, port), "list", "acquire" (num,
+    client, timeout), "renew" (workers, client) and "release" (workers, client).
+
+    Args:
+        port (int): Registry server port.
+        host (str): Registry server interface
+            (<span style="color:#00C000"><b>default</b></span>: all interfaces).
+        lease_ttl (float > 0.0): Seconds after which leases which were not renewed expire, larger
+            than `RegistryClient.HEARTBEAT_SECONDS`
+            (<span style="color:#00C000"><b>default</b></span>: 60 seconds).
+        probe_timeout (float > 0.0): Seconds to wait for a worker to accept the connection probing
+            it before it is leased
+            (<span style="color:#00C000"><b>default</b></span>: 5 seconds).
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port, host='', lease_ttl=60.0, probe_timeout=5.0):
+        super().__init__((host, port), EnvironmentRegistryHandler)
+        self.lease_ttl = lease_ttl
+        self.probe_timeout = probe_timeout
+        self.condition = threading.Condition()
+        # Worker (host, port) -> leasing client or None, in registration order
+        self.workers = dict()
+        # Leased worker -> time its lease expires unless renewed
+        self.expiries = dict()
+        # Client -> workers last leased by client
+        self.last_leases = dict()
+
+    def register(self, host, port):
+        with self.condition:
+            self.workers.setdefault((host, port), None)
+            self.condition.notify_all()
+
+    def unregister(self, host, port):
+        with self.condition:
+            self.workers.pop((host, port), None)
+            self.expiries.pop((host, port), None)
+
+    def expire(self):
+        # Requires condition
+        now = time.time()
+        for worker, client in self.workers.items():
+            if client is not None and self.expiries.get(worker, now) <= now:
+                self.workers[worker] = None
+                self.expiries.pop(worker, None)
+                self.condition.notify_all()
+
+    def probe(self, worker):
+        try:
+            with create_connection(worker, timeout=self.probe_timeout):
+                return True
+        except OSError:
+            return False
+
+    def acquire(self, num, client, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        workers = list()
+        candidates = list()
+        try:
+            while len(workers) < num:
+                with self.condition:
+                    self.expire()
+                    needed = num - len(workers)
+                    while sum(lease is None for lease in self.workers.values()) < needed:
+                        remaining = None if deadline is None else deadline - time.time()
+                        if remaining is not None and remaining <= 0.0:
+                            raise TensorforceError(
+                                message="Environment registry has less than {} free workers."
+                                .format(num)
+                            )
+                        # Woken up in time for expiring leases
+                        if remaining is None or remaining > self.lease_ttl:
+                            remaining = self.lease_ttl
+                        self.condition.wait(timeout=remaining)
+                        self.expire()
+
+                    previous = self.last_leases.get(client, ())
+                    free = [worker for worker, lease in self.workers.items() if lease is None]
+                    free.sort(key=(lambda worker: worker not in previous))
+                    candidates = free[:needed]
+                    for worker in candidates:
+                        self.workers[worker] = client
+                        self.expiries[worker] = time.time() + self.lease_ttl
+
+                # Probed outside of the condition, workers which died without unregistering are
+                # dropped and replaced
+                for worker in candidates:
+                    if self.probe(worker):
+                        workers.append(worker)
+                    else:
+                        self.unregister(*worker)
+        except BaseException:
+            self.release(workers=(workers + candidates), client=client)
+            raise
+
+        with self.condition:
+            self.last_leases[client] = set(workers)
+        return workers
+
+    def renew(self, workers, client):
+        with self.condition:
+            expiry = time.time() + self.lease_ttl
+            for worker in workers:
+                if self.workers.get(worker) == client:
+                    self.expiries[worker] = expiry
+
+    def release(self, workers, client):
+        with self.condition:
+            for worker in workers:
+                if self.workers.get(worker) == client:
+                    self.workers[worker] = None
+                    self.expiries.pop(worker, None)
+            self.condition.notify_all()
+
+    def list(self):
+        with self.condition:
+            self.expire()
+            return [
+                dict(host=host, port=port, client=client)
+                for (host, port), client in self.workers.items()
+            ]
+
+
+class EnvironmentRegistryHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+                op = request.pop('op')
+                if op == 'register':
+                    result = self.server.register(host=request['host'], port=request['port'])
+                elif op == 'unregister':
+                    result = self.server.unregister(host=request['host'], port=request['port'])
+                elif op == 'acquire':
+                    result = self.server.acquire(**request)
+                elif op == 'renew':
+                    result = self.server.renew(
+                        workers=[tuple(worker) for worker in request['workers']],
+                        client=request['client']
+                    )
+                elif op == 'release':
+                    result = self.server.release(
+                        workers=[tuple(worker) for worker in request['workers']],
+                        client=request['client']
+                    )
+                elif op == 'list':
+                    result = self.server.list()
+                else:
+                    raise TensorforceError.value(name='EnvironmentRegistry', argument='op', value=op)
+                response = dict(success=True, result=result)
+            except BaseException as exc:
+                response = dict(success=False, result=str(exc))
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+class RegistryClient(object):
+    """
+    Client of an `EnvironmentRegistry`, leased workers are released on exit.
+
+    Leases of this process are renewed by a background thread every `HEARTBEAT_SECONDS`, so they
+    expire in the registry if the process is killed without releasing them.
+
+    Leases of workers whose persistent connection is pooled by `SocketEnvironment` are kept when
+    released (a persistent worker serves one connection at a time, so leasing it to another client
+    while the connection is pooled would block that client), and are reused by subsequent
+    `acquire()` calls of the process until `SocketEnvironment.close_pool()` or exit.
+
+    Args:
+        address (str | (str, int)): Registry address as "host:port" or tuple.
+        client (str): Client identifier for lease affinity
+            (<span style="color:#00C000"><b>default</b></span>: unique per process).
+    """
+
+    # Leased workers of this process and those among them with a pooled idle connection, per
+    # (registry address, client)
+    LEASES = dict()
+    IDLE = dict()
+    _is_exit_registered = False
+    # Seconds between lease renewals, smaller than the lease TTL of the registry
+    HEARTBEAT_SECONDS = 10.0
+    # Process whose leases are renewed by the heartbeat thread (threads do not survive forks)
+    _heartbeat_pid = None
+
+    def __init__(self, address, client=None):
+        if isinstance(address, str):
+            host, port = address.rsplit(':', 1)
+            address = (host, int(port))
+        self.address = tuple(address)
+        if client is None:
+            client = '{}-{}'.format(gethostname(), os.getpid())
+        self.client = client
+        # Shared by the clients of the same registry in this process
+        self.leases = self.__class__.LEASES.setdefault((self.address, client), set())
+        self.idle = self.__class__.IDLE.setdefault((self.address, client), list())
+        if not RegistryClient._is_exit_registered:
+            atexit.register(RegistryClient.release_process)
+            RegistryClient._is_exit_registered = True
+
+    def request(self, op, **kwargs):
+        with create_connection(self.address) as connection:
+            connection.sendall((json.dumps(dict(op=op, **kwargs)) + '\n').encode())
+            with connection.makefile('rb') as fp:
+                line = fp.readline()
+        if len(line) == 0:
+            raise TensorforceError(message="Environment registry closed connection.")
+        response = json.loads(line.decode())
+        if not response['success']:
+            raise TensorforceError(message=response['result'])
+        return response['result']
+
+    def register(self, host, port):
+        return self.request(op='register', host=host, port=port)
+
+    def unregister(self, host, port):
+        return self.request(op='unregister', host=host, port=port)
+
+    def list(self):
+        return self.request(op='list')
+
+    def acquire(self, num, timeout=None):
+        """
+        Returns a list of `num` exclusively leased worker (host, port) tuples, preferably workers
+        with a pooled connection still leased by this process.
+        """
+        workers = self.idle[:num]
+        del self.idle[:num]
+        if len(workers) < num:
+            leased = [
+                tuple(worker) for worker in self.request(
+                    op='acquire', num=(num - len(workers)), client=self.client, timeout=timeout
+                )
+            ]
+            self.leases.update(leased)
+            workers.extend(leased)
+            self.__class__.start_heartbeat()
+        return workers
+
+    def release(self, workers):
+        """
+        Releases leased workers, except for workers with a pooled connection, which stay leased
+        by this process until the pool is closed.
+        """
+        from tensorforce.environments import SocketEnvironment
+
+        workers = [tuple(worker) for worker in workers]
+        released = list()
+        for worker in workers:
+            if worker in SocketEnvironment.POOL:
+                if worker not in self.idle:
+                    self.idle.append(worker)
+            else:
+                released.append(worker)
+        if len(released) > 0:
+            self.request(op='release', workers=released, client=self.client)
+            self.leases.difference_update(released)
+
+    def release_idle(self):
+        """
+        Closes the pooled connections of the workers kept leased by `release()` and releases them.
+        """
+        from tensorforce.environments import SocketEnvironment
+
+        idle = list(self.idle)
+        del self.idle[:]
+        for worker in idle:
+            connection = SocketEnvironment.POOL.pop(worker, None)
+            if connection is not None:
+                try:
+                    SocketEnvironment.proxy_close(connection=connection)
+                except OSError:
+                    pass
+        if len(idle) > 0:
+            try:
+                self.request(op='release', workers=idle, client=self.client)
+                self.leases.difference_update(idle)
+            except OSError:
+                pass
+
+    def release_all(self):
+        """
+        Releases all leases of this client, including those kept for pooled connections.
+        """
+        self.release_idle()
+        if len(self.leases) > 0:
+            try:
+                self.request(op='release', workers=list(self.leases), client=self.client)
+                self.leases.clear()
+            except OSError:
+                pass
+
+    @classmethod
+    def release_process(cls, idle_only=False):
+        """
+        Releases the leases of all clients of this process, registered once per process to run on
+        exit.
+
+        Args:
+            idle_only (bool): Whether only the leases kept for pooled connections are released
+                (<span style="color:#00C000"><b>default</b></span>: all leases).
+        """
+        for address, client in list(cls.LEASES):
+            registry_client = cls(address=address, client=client)
+            if idle_only:
+                registry_client.release_idle()
+            else:
+                registry_client.release_all()
+
+    @classmethod
+    def start_heartbeat(cls):
+        """
+        Starts the thread renewing the leases of all clients of this process, once per process.
+        """
+        if cls._heartbeat_pid == os.getpid():
+            return
+        cls._heartbeat_pid = os.getpid()
+        thread = threading.Thread(target=cls.heartbeat, name='registry-heartbeat')
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def heartbeat(cls):
+        while True:
+            time.sleep(cls.HEARTBEAT_SECONDS)
+            for (address, client), leases in list(cls.LEASES.items()):
+                # Copied atomically, leases are updated by other threads
+                workers = leases.copy()
+                if len(workers) == 0:
+                    continue
+                try:
+                    cls(address=address, client=client).request(
+                        op='renew', workers=list(workers), client=client
+                    )
+                except (OSError, TensorforceError):
+                    # Registry temporarily unreachable, renewed with the next heartbeat
+                    pass
@@ -15,9 +15,11 @@
 
 from multiprocessing import Pipe, Process
 import multiprocessing as mp
+import sys
+from threading import Thread
+from traceback import format_tb
 
-
-from tensorforce.environments import RemoteEnvironment
+from tensorforce.environments import Environment, RemoteEnvironment
 
 
 class MultiprocessingEnvironment(RemoteEnvironment):
@@ -36,7 +38,9 @@ class MultiprocessingEnvironment(RemoteEnvironment):
     @classmethod
     def proxy_close(cls, connection):
         connection[0].close()
-        connection[1].join()
+        # Process of an environment group exits once all environments of the group are closed
+        if len(connection) < 3 or all(proxy.closed for proxy in connection[2]):
+            connection[1].join()
 
     @classmethod
     def remote_send(cls, connection, success, result):
@@ -64,3 +68,87 @@ class MultiprocessingEnvironment(RemoteEnvironment):
         )
         process.start()
         super().__init__(connection=(proxy_connection, process), blocking=blocking)
+
+    @classmethod
+    def remote_group(
+        cls, connections, environments, max_episode_timesteps=None, reward_shaping=None,
+        **kwargs
+    ):
+        envs = list()
+        try:
+            # Created one after another, since the first may start a runtime shared by the group
+            # (e.g. the JVM of NetLogo workspaces)
+            for environment in environments:
+                envs.append(Environment.create(
+                    environment=environment, max_episode_timesteps=max_episode_timesteps,
+                    reward_shaping=reward_shaping, **kwargs
+                ))
+
+        except BaseException:
+            etype, value, traceback = sys.exc_info()
+            for env in envs:
+                try:
+                    env.close()
+                except BaseException:
+                    pass
+            for connection in connections:
+                cls.remote_send(
+                    connection=connection, success=False,
+                    result=(str(etype), str(value), format_tb(traceback))
+                )
+                cls.remote_close(connection=connection)
+            return
+
+        # Environments are served concurrently, one thread per connection
+        threads = [
+            Thread(target=cls.remote, kwargs=dict(connection=connection, environment=env))
+            for connection, env in zip(connections, envs)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    @classmethod
+    def create_group(
+        cls, environments, blocking=False, max_episode_timesteps=None, reward_shaping=None,
+        **kwargs
+    ):
+        """
+        Creates environments which run in one shared process, so they share process-level
+        resources like an embedded runtime, but are otherwise independent remote environments.
+
+        Args:
+            environments (list[specification]): Environment specifications of the group
+                (<span style="color:#C00000"><b>required</b></span>).
+            blocking (bool): Whether remote environment calls should be blocking
+                (<span style="color:#00C000"><b>default</b></span>: not blocking).
+            max_episode_timesteps (int > 0): Maximum number of timesteps per episode
+                (<span style="color:#00C000"><b>default</b></span>: environment default).
+            reward_shaping (callable | str): Reward shaping function or expression
+                (<span style="color:#00C000"><b>default</b></span>: no reward shaping).
+            kwargs: Additional arguments shared by the environments of the group.
+
+        Returns:
+            list[MultiprocessingEnvironment]: One environment per specification.
+        """
+        ctx = mp.get_context('spawn')
+        pipes = [ctx.Pipe(duplex=True) for _ in environments]
+        proxy_connections = [proxy_connection for proxy_connection, _ in pipes]
+        process = ctx.Process(
+            target=cls.remote_group, kwargs=dict(
+                connections=[remote_connection for _, remote_connection in pipes],
+                environments=environments, max_episode_timesteps=max_episode_timesteps,
+                reward_shaping=reward_shaping, **kwargs
+            )
+        )
+        process.start()
+        group = list()
+        for proxy_connection in proxy_connections:
+            environment = cls.__new__(cls)
+            RemoteEnvironment.__init__(
+                environment, connection=(proxy_connection, process, proxy_connections),
+                blocking=blocking
+            )
+            group.append(environment)
+        return group
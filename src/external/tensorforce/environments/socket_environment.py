@@ -13,14 +13,16 @@
 # limitations under the License.
 # ==============================================================================
 
-from socket import SHUT_RDWR, socket as Socket
+from socket import SHUT_RDWR, SOL_SOCKET, SO_REUSEADDR, socket as Socket
+import sys
 import time
+from traceback import format_tb
 
 import msgpack
 import msgpack_numpy
 
 from tensorforce import TensorforceError
-from tensorforce.environments import RemoteEnvironment
+from tensorforce.environments import Environment, RemoteEnvironment
 
 
 msgpack_numpy.patch()
@@ -32,59 +34,122 @@ class SocketEnvironment(RemoteEnvironment):
 
     Rabault, J., Kuhnle, A (2019). Accelerating Deep Reinforcement Leaning strategies of Flow
     Control through a multi-environment approach. Physics of Fluids.
+
+    Persistent environments keep their connection in a process-wide pool when closed, so that
+    subsequent instances for the same host and port (e.g. of later runners) reuse it, and
+    persistent servers keep their environment alive across client connections.
     """
 
-    MAX_BYTES = 4096
+    # Open connections of closed persistent environments, by (host, port)
+    POOL = dict()
+
+    _ATTRIBUTES = RemoteEnvironment._ATTRIBUTES | frozenset(['_address', '_persistent'])
 
     @classmethod
-    def remote(cls, port, environment, max_episode_timesteps=None, reward_shaping=None, **kwargs):
+    def remote(
+        cls, port, environment, max_episode_timesteps=None, reward_shaping=None,
+        persistent=False, **kwargs
+    ):
         socket = Socket()
+        if persistent:
+            socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
         socket.bind(('', port))
         socket.listen(1)
-        connection, address = socket.accept()
-        socket.close()
-        super().remote(
-            connection=connection, environment=environment,
-            max_episode_timesteps=max_episode_timesteps, reward_shaping=reward_shaping, **kwargs
-        )
+        if not persistent:
+            connection, address = socket.accept()
+            socket.close()
+            super().remote(
+                connection=connection, environment=environment,
+                max_episode_timesteps=max_episode_timesteps, reward_shaping=reward_shaping,
+                **kwargs
+            )
+            return
+
+        # Persistent server: environment is created once and serves one client at a time until
+        # a client explicitly closes it
+        env = None
+        closed = False
+        try:
+            env = Environment.create(
+                environment=environment, max_episode_timesteps=max_episode_timesteps,
+                reward_shaping=reward_shaping, **kwargs
+            )
+            while not closed:
+                connection, address = socket.accept()
+                closed = cls.remote_session(connection=connection, env=env)
+        finally:
+            socket.close()
+            if env is not None and not closed:
+                env.close()
 
     @classmethod
-    def proxy_send(cls, connection, function, kwargs):
-        str_function = function.encode()
-        num_bytes = len(str_function)
-        str_num_bytes = '{:08d}'.format(num_bytes).encode()
-        bytes_sent = connection.send(str_num_bytes + str_function)
-        if bytes_sent != num_bytes + 8:
-            raise TensorforceError.unexpected()
+    def remote_session(cls, connection, env):
+        """
+        Serves calls of one client connection, returns whether the environment was closed.
+        """
+        try:
+            while True:
+                try:
+                    attribute, kwargs = cls.remote_receive(connection=connection)
+                except (ConnectionError, OSError):
+                    # Client disconnected, environment is kept for the next client
+                    return False
+
+                try:
+                    result = cls.remote_call(env=env, attribute=attribute, kwargs=kwargs)
+                except BaseException:
+                    etype, value, traceback = sys.exc_info()
+                    cls.remote_send(
+                        connection=connection, success=False,
+                        result=(str(etype), str(value), format_tb(traceback))
+                    )
+                    return False
+
+                cls.remote_send(connection=connection, success=True, result=result)
+                if attribute == 'close':
+                    return True
+
+        finally:
+            try:
+                cls.remote_close(connection=connection)
+            except OSError:
+                pass
 
-        str_kwargs = msgpack.packb(o=kwargs)
-        num_bytes = len(str_kwargs)
-        str_num_bytes = '{:08d}'.format(num_bytes).encode()
-        bytes_sent = connection.send(str_num_bytes + str_kwargs)
-        if bytes_sent != num_bytes + 8:
-            raise TensorforceError.unexpected()
+    @classmethod
+    def receive_bytes(cls, connection, num_bytes):
+        # Receive into preallocated buffer instead of repeated bytes concatenation
+        buffer = bytearray(num_bytes)
+        view = memoryview(buffer)
+        offset = 0
+        while offset < num_bytes:
+            num_received = connection.recv_into(view[offset:], num_bytes - offset)
+            if num_received == 0:
+                raise ConnectionError("Remote socket connection closed.")
+            offset += num_received
+        return buffer
+
+    @classmethod
+    def receive_message(cls, connection):
+        num_bytes = int(cls.receive_bytes(connection=connection, num_bytes=8).decode())
+        return cls.receive_bytes(connection=connection, num_bytes=num_bytes)
+
+    @classmethod
+    def send_message(cls, connection, message):
+        str_num_bytes = '{:08d}'.format(len(message)).encode()
+        connection.sendall(str_num_bytes + message)
+
+    @classmethod
+    def proxy_send(cls, connection, function, kwargs):
+        cls.send_message(connection=connection, message=function.encode())
+        cls.send_message(connection=connection, message=msgpack.packb(o=kwargs))
 
     @classmethod
     def proxy_receive(cls, connection):
-        str_success = connection.recv(1)
-        if len(str_success) != 1 or (str_success != b'0' and str_success != b'1'):
+        str_success = cls.receive_bytes(connection=connection, num_bytes=1)
+        if str_success != b'0' and str_success != b'1':
             raise TensorforceError.unexpected()
         success = (str_success == b'1')
-
-        str_num_bytes = connection.recv(8)
-        if len(str_num_bytes) != 8:
-            raise TensorforceError.unexpected()
-        num_bytes = int(str_num_bytes.decode())
-        str_result = b''
-        for n in range(num_bytes // cls.MAX_BYTES):
-            str_result += connection.recv(cls.MAX_BYTES)
-            if len(str_result) != n * cls.MAX_BYTES:
-                raise TensorforceError.unexpected()
-        str_result += connection.recv(num_bytes % cls.MAX_BYTES)
-        if len(str_result) != num_bytes:
-            raise TensorforceError.unexpected()
-        result = msgpack.unpackb(packed=str_result)
-
+        result = msgpack.unpackb(packed=cls.receive_message(connection=connection))
         return success, result
 
     @classmethod
@@ -94,48 +159,13 @@ class SocketEnvironment(RemoteEnvironment):
 
     @classmethod
     def remote_send(cls, connection, success, result):
-        str_success = b'1' if success else b'0'
-        bytes_sent = connection.send(str_success)
-        if bytes_sent != 1:
-            raise TensorforceError.unexpected()
-
-        str_result = msgpack.packb(o=result)
-        num_bytes = len(str_result)
-        str_num_bytes = '{:08d}'.format(num_bytes).encode()
-        bytes_sent = connection.send(str_num_bytes + str_result)
-        if bytes_sent != num_bytes + 8:
-            raise TensorforceError.unexpected()
+        connection.sendall(b'1' if success else b'0')
+        cls.send_message(connection=connection, message=msgpack.packb(o=result))
 
     @classmethod
     def remote_receive(cls, connection):
-        str_num_bytes = connection.recv(8)
-        if len(str_num_bytes) != 8:
-            raise TensorforceError.unexpected()
-        num_bytes = int(str_num_bytes.decode())
-        str_function = b''
-        for n in range(num_bytes // cls.MAX_BYTES):
-            str_function += connection.recv(cls.MAX_BYTES)
-            if len(str_function) != n * cls.MAX_BYTES:
-                raise TensorforceError.unexpected()
-        str_function += connection.recv(num_bytes % cls.MAX_BYTES)
-        if len(str_function) != num_bytes:
-            raise TensorforceError.unexpected()
-        function = str_function.decode()
-
-        str_num_bytes = connection.recv(8)
-        if len(str_num_bytes) != 8:
-            raise TensorforceError.unexpected()
-        num_bytes = int(str_num_bytes.decode())
-        str_kwargs = b''
-        for n in range(num_bytes // cls.MAX_BYTES):
-            str_kwargs += connection.recv(cls.MAX_BYTES)
-            if len(str_kwargs) != n * cls.MAX_BYTES:
-                raise TensorforceError.unexpected()
-        str_kwargs += connection.recv(num_bytes % cls.MAX_BYTES)
-        if len(str_kwargs) != num_bytes:
-            raise TensorforceError.unexpected()
-        kwargs = msgpack.unpackb(packed=str_kwargs)
-
+        function = cls.receive_message(connection=connection).decode()
+        kwargs = msgpack.unpackb(packed=cls.receive_message(connection=connection))
         return function, kwargs
 
     @classmethod
@@ -143,14 +173,49 @@ class SocketEnvironment(RemoteEnvironment):
         connection.shutdown(SHUT_RDWR)
         connection.close()
 
-    def __init__(self, host, port, blocking=False):
-        socket = Socket()
-        for _ in range(100):  # TODO: 10sec timeout, not configurable
+    @classmethod
+    def close_pool(cls):
+        """
+        Closes all pooled connections and releases the registry leases kept for them, persistent
+        servers keep running for other clients.
+        """
+        for connection in cls.POOL.values():
             try:
-                socket.connect((host, port))
-                break
-            except ConnectionRefusedError:
-                time.sleep(0.1)
+                cls.proxy_close(connection=connection)
+            except OSError:
+                pass
+        cls.POOL.clear()
+        from tensorforce.environments import RegistryClient
+        RegistryClient.release_process(idle_only=True)
+
+    def __init__(self, host, port, blocking=False, persistent=False):
+        if persistent and (host, port) in self.__class__.POOL:
+            socket = self.__class__.POOL.pop((host, port))
         else:
-            raise TensorforceError("Remote socket connection could not be established.")
+            socket = Socket()
+            for _ in range(100):  # TODO: 10sec timeout, not configurable
+                try:
+                    socket.connect((host, port))
+                    break
+                except ConnectionRefusedError:
+                    time.sleep(0.1)
+            else:
+                raise TensorforceError("Remote socket connection could not be established.")
         super().__init__(connection=socket, blocking=blocking)
+        self._address = (host, port)
+        self._persistent = persistent
+
+    def close(self):
+        if not self._persistent:
+            super().close()
+            return
+
+        # Finish pending call and return connection to pool instead of closing the environment
+        if self._thread is not None:
+            self._thread.join()
+        if self._expect_receive is not None:
+            self.receive(function=self._expect_receive)
+        self.__class__.POOL[self._address] = self._connection
+        self._connection = None
+        self._observation = None
+        self._thread = None
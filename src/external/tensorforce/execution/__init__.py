@@ -13,7 +13,8 @@
 # limitations under the License.
 # ==============================================================================
 
+from tensorforce.execution.episode_series import EpisodeSeries
 from tensorforce.execution.runner import Runner
 
 
-__all__ = ['Runner']
+__all__ = ['EpisodeSeries', 'Runner']
@@ -0,0 +1,190 @@
+# Copyright 2020 Tensorforce Team. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from bisect import bisect_left, insort
+from collections import deque
+import math
+
+import numpy as np
+
+
+class RollingWindow(object):
+    """
+    Incremental aggregates over the last `horizon` values of a series: running sum for the mean,
+    monotonic deques for min/max and a sorted window for quantiles.
+    """
+
+    def __init__(self, horizon):
+        assert isinstance(horizon, int) and horizon >= 1
+        self.horizon = horizon
+        self.sum = 0.0
+        self.min_indices = deque()
+        self.max_indices = deque()
+        self.sorted_window = list()
+
+    def append(self, values, index):
+        value = values[index].item()
+        self.sum += value
+        insort(self.sorted_window, value)
+        if index >= self.horizon:
+            dropped = values[index - self.horizon].item()
+            self.sum -= dropped
+            del self.sorted_window[bisect_left(self.sorted_window, dropped)]
+
+        while len(self.min_indices) > 0 and values[self.min_indices[-1]] >= value:
+            self.min_indices.pop()
+        self.min_indices.append(index)
+        if self.min_indices[0] <= index - self.horizon:
+            self.min_indices.popleft()
+
+        while len(self.max_indices) > 0 and values[self.max_indices[-1]] <= value:
+            self.max_indices.pop()
+        self.max_indices.append(index)
+        if self.max_indices[0] <= index - self.horizon:
+            self.max_indices.popleft()
+
+    def quantile(self, q):
+        # Linear interpolation, as np.quantile default
+        position = q * (len(self.sorted_window) - 1)
+        lower = math.floor(position)
+        upper = min(lower + 1, len(self.sorted_window) - 1)
+        fraction = position - lower
+        return self.sorted_window[lower] * (1.0 - fraction) + self.sorted_window[upper] * fraction
+
+
+class EpisodeSeries(object):
+    """
+    Preallocated, growable NumPy-backed series of per-episode values (returns, timesteps, seconds)
+    with incremental rolling aggregates over the registered horizons, and list-like read access
+    (`len`, indexing/slicing, iteration, `np.asarray`) to the recorded values.
+
+    Aggregates over unregistered horizons are computed on a view of the underlying array.
+
+    Args:
+        horizons (iter[int > 0]): Horizons to maintain incremental rolling aggregates for
+            (<span style="color:#00C000"><b>default</b></span>: none).
+        dtype (type): NumPy dtype of values
+            (<span style="color:#00C000"><b>default</b></span>: float64).
+        capacity (int > 0): Initially preallocated number of values, doubled when exceeded
+            (<span style="color:#00C000"><b>default</b></span>: 1024).
+    """
+
+    def __init__(self, horizons=(), dtype=np.float64, capacity=1024):
+        self._values = np.empty(shape=(capacity,), dtype=dtype)
+        self._size = 0
+        self.sum = 0.0
+        self.windows = {
+            horizon: RollingWindow(horizon=horizon) for horizon in set(horizons)
+            if horizon is not None
+        }
+
+    @property
+    def values(self):
+        """
+        Read-only view of the recorded values.
+        """
+        view = self._values[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def append(self, value):
+        if self._size == self._values.shape[0]:
+            values = np.empty(shape=(2 * self._size,), dtype=self._values.dtype)
+            values[:self._size] = self._values[:self._size]
+            self._values = values
+        self._values[self._size] = value
+        value = self._values[self._size].item()
+        self.sum += value
+        for window in self.windows.values():
+            window.append(values=self._values, index=self._size)
+        self._size += 1
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def tolist(self):
+        return self.values.tolist()
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.values
+        return self.values.astype(dtype)
+
+    def window(self, horizon=None):
+        """
+        Returns the registered rolling window for the horizon, or None if not registered or if
+        the horizon covers the entire series.
+        """
+        if horizon is None or horizon >= self._size:
+            return None
+        return self.windows.get(horizon)
+
+    def mean(self, horizon=None):
+        """
+        Mean of the last `horizon` values (default: all values).
+        """
+        assert self._size > 0
+        if horizon is None or horizon >= self._size:
+            return self.sum / self._size
+        window = self.windows.get(horizon)
+        if window is None:
+            return float(np.mean(self._values[self._size - horizon: self._size]))
+        return window.sum / horizon
+
+    def min(self, horizon=None):
+        """
+        Minimum of the last `horizon` values (default: all values).
+        """
+        assert self._size > 0
+        window = self.window(horizon=horizon)
+        if window is None:
+            start = 0 if horizon is None else max(self._size - horizon, 0)
+            return self._values[start: self._size].min().item()
+        return self._values[window.min_indices[0]].item()
+
+    def max(self, horizon=None):
+        """
+        Maximum of the last `horizon` values (default: all values).
+        """
+        assert self._size > 0
+        window = self.window(horizon=horizon)
+        if window is None:
+            start = 0 if horizon is None else max(self._size - horizon, 0)
+            return self._values[start: self._size].max().item()
+        return self._values[window.max_indices[0]].item()
+
+    def quantile(self, q, horizon=None):
+        """
+        Quantile `q` in [0, 1] of the last `horizon` values (default: all values).
+        """
+        assert self._size > 0 and 0.0 <= q <= 1.0
+        window = self.window(horizon=horizon)
+        if window is None:
+            start = 0 if horizon is None else max(self._size - horizon, 0)
+            return float(np.quantile(self._values[start: self._size], q))
+        return float(window.quantile(q=q))
+
+    def __repr__(self):
+        return 'EpisodeSeries({})'.format(self.tolist())
@@ -13,13 +13,17 @@
 # limitations under the License.
 # ==============================================================================
 
+from bisect import bisect_right
+import random
 import time
 
 import numpy as np
 from tqdm.auto import tqdm
 
 from tensorforce import Agent, Environment, TensorforceError, util
+from tensorforce.core.utils import AsyncCheckpointManager
 from tensorforce.environments import RemoteEnvironment
+from tensorforce.execution.episode_series import EpisodeSeries
 
 
 class Runner(object):
@@ -72,7 +76,17 @@ class Runner(object):
         port (int, iter[int]): Socket server port(s), increasing sequence if single host and port
             given
             (<span style="color:#C00000"><b>required</b></span> only for "socket-client" remote
-            mode).
+            mode, unless `registry` is given).
+        registry (str): Address "host:port" of an `EnvironmentRegistry` to lease `num_parallel`
+            persistent socket-server workers from instead of specifying `host` and `port`, whose
+            connections are pooled and reused by subsequent runners of the same process
+            (<span style="color:#00C000"><b>default</b></span>: none, only valid for
+            "socket-client" remote mode).
+        environments_per_process (int > 0): Number of environments sharing one process in
+            "multiprocessing" remote mode, e.g. to share one embedded runtime (JVM) between
+            several simulation instances, otherwise independent environments
+            (<span style="color:#00C000"><b>default</b></span>: one process per environment,
+            only valid for "multiprocessing" remote mode).
     """
 
     def __init__(
@@ -87,6 +101,8 @@ class Runner(object):
         blocking=False,
         host=None,
         port=None,
+        registry=None,
+        environments_per_process=1,
         **env_kwargs
     ):
         if environment is None and environments is None:
@@ -167,6 +183,24 @@ class Runner(object):
                 )
             environments = [environment for _ in range(num_parallel)]
 
+        self.registry_client = None
+        self.registry_workers = None
+        if registry is not None:
+            if remote != "socket-client":
+                raise TensorforceError.invalid(
+                    name="Runner", argument="registry", condition="no socket-client remote mode"
+                )
+            elif host is not None or port is not None:
+                raise TensorforceError.invalid(
+                    name="Runner", argument="host/port", condition="registry is specified"
+                )
+            from tensorforce.environments import RegistryClient
+            self.registry_client = RegistryClient(address=registry)
+            self.registry_workers = self.registry_client.acquire(num=num_parallel)
+            host = [worker[0] for worker in self.registry_workers]
+            port = [worker[1] for worker in self.registry_workers]
+            env_kwargs["persistent"] = True
+
         if port is None or isinstance(port, int):
             if isinstance(host, str):
                 port = [port + n for n in range(num_parallel)]
@@ -193,19 +227,53 @@ class Runner(object):
 
         self.environments = list()
         self.is_environment_external = isinstance(environments[0], Environment)
-        environment = Environment.create(
-            environment=environments[0],
+        # Specifications to recreate environments from, see recycle_environment()
+        self.environment_specs = list(zip(environments, host, port))
+        self.environment_kwargs = dict(
             max_episode_timesteps=max_episode_timesteps,
             remote=remote,
             blocking=blocking,
-            host=host[0],
-            port=port[0],
             **env_kwargs
         )
+        self.environments_per_process = environments_per_process
+        if environments_per_process > 1:
+            if remote != "multiprocessing":
+                raise TensorforceError.invalid(
+                    name="Runner",
+                    argument="environments_per_process",
+                    condition="no multiprocessing remote mode",
+                )
+            elif self.is_environment_external:
+                raise TensorforceError.invalid(
+                    name="Runner",
+                    argument="environments_per_process",
+                    condition="Environment objects",
+                )
+            from tensorforce.environments import MultiprocessingEnvironment
+            for n in range(0, num_parallel, environments_per_process):
+                self.environments.extend(
+                    MultiprocessingEnvironment.create_group(
+                        environments=environments[n : n + environments_per_process],
+                        blocking=blocking,
+                        max_episode_timesteps=max_episode_timesteps,
+                        **env_kwargs
+                    )
+                )
+            environment = self.environments[0]
+        else:
+            environment = Environment.create(
+                environment=environments[0],
+                max_episode_timesteps=max_episode_timesteps,
+                remote=remote,
+                blocking=blocking,
+                host=host[0],
+                port=port[0],
+                **env_kwargs
+            )
+            self.environments.append(environment)
         self.is_environment_remote = isinstance(environment, RemoteEnvironment)
         states = environment.states()
         actions = environment.actions()
-        self.environments.append(environment)
         if remote is None and len(environments) > 1 and environment.is_vectorizable():
             self.num_vectorized = num_parallel
             environments = environments[:1]
@@ -218,6 +286,12 @@ class Runner(object):
         else:
             self.num_vectorized = None
 
+        if environments_per_process > 1:
+            for environment in self.environments[1:]:
+                assert util.is_equal(x=environment.states(), y=states)
+                assert util.is_equal(x=environment.actions(), y=actions)
+            environments = environments[:1]
+
         for n, environment in enumerate(environments[1:], start=1):
             assert isinstance(environment, Environment) == self.is_environment_external
             environment = Environment.create(
@@ -254,6 +328,156 @@ class Runner(object):
         else:
             self.agent = Agent.create(agent=agent, environment=environment)
 
+        # Asynchronous checkpoint manager, if agent saver is asynchronous
+        saver = getattr(getattr(self.agent, "model", None), "saver", None)
+        if isinstance(saver, AsyncCheckpointManager):
+            self.checkpoint_manager = saver
+        else:
+            self.checkpoint_manager = None
+
+        # Run state to continue from at the next run() call
+        self.run_state = None
+
+    # Upper bin edges (seconds) of batch wait histogram, last bin unbounded
+    BATCH_WAIT_BINS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+    STATISTICS = (
+        "episode_returns",
+        "episode_timesteps",
+        "episode_seconds",
+        "episode_agent_seconds",
+        "episode_env_seconds",
+        "episode_saver_seconds",
+        "episode_saver_offloaded_seconds",
+        "evaluation_returns",
+        "evaluation_timesteps",
+        "evaluation_seconds",
+        "evaluation_agent_seconds",
+        "evaluation_env_seconds",
+    )
+
+    def get_run_state(self):
+        """
+        Returns a snapshot of the runner counters, experiment statistics, best evaluation score and
+        random number generator states of the current run, which can be passed to
+        `set_run_state()` to continue the run later on (episodes in progress are not included).
+
+        Returns:
+            dict: Run state.
+        """
+        statistics = dict()
+        recorded = set()
+        for name in self.STATISTICS:
+            series = getattr(self, name, None)
+            # Skip aliased statistics, restored via the first name
+            if series is None or id(series) in recorded:
+                continue
+            recorded.add(id(series))
+            statistics[name] = series.tolist()
+        return dict(
+            timesteps=self.timesteps,
+            episodes=self.episodes,
+            updates=self.updates,
+            statistics=statistics,
+            best_evaluation_score=getattr(self, "best_evaluation_score", None),
+            python_random_state=random.getstate(),
+            numpy_random_state=np.random.get_state(),
+        )
+
+    def set_run_state(self, run_state):
+        """
+        Sets a run state obtained via `get_run_state()`, which the next call of `run()` continues
+        from instead of starting with empty statistics, where `num_episodes`/`num_timesteps`/
+        `num_updates` then refer to the total including the restored run.
+
+        Args:
+            run_state (dict): Run state
+                (<span style="color:#C00000"><b>required</b></span>).
+        """
+        self.run_state = run_state
+
+    def batching_report(self):
+        """
+        Returns histograms of batch sizes and seconds waited for observations of batched agent
+        calls in the last run.
+
+        Returns:
+            dict: Batch size counts indexed by batch size, and wait second counts per bin with
+            corresponding upper bin edges.
+        """
+        return dict(
+            batch_sizes=self.batch_size_counts.tolist(),
+            wait_seconds=self.batch_wait_counts.tolist(),
+            wait_bins=list(self.BATCH_WAIT_BINS) + [float("inf")],
+        )
+
+    def retrace_report(self):
+        """
+        Returns the number of TensorFlow graph retraces of agent functions during the last run,
+        which cause latency spikes (agent functions are traced when the agent is initialized).
+
+        Returns:
+            dict[int]: Number of retraces per agent function, only functions retraced.
+        """
+        retraces = dict()
+        for name, count in self.agent.trace_counts().items():
+            count -= self.run_trace_counts.get(name, 0)
+            if count > 0:
+                retraces[name] = count
+        return retraces
+
+    def recycle_environment(self, parallel, **kwargs):
+        """
+        Closes an environment and replaces it by a new instance of its specification, e.g. to
+        release memory accumulated by a long-running environment process. Only valid between
+        episodes of the environment, for instance within the run callback of its terminal episode
+        (the new environment is reset by the runner), and only for environments created by the
+        runner in local or "multiprocessing" remote mode, one per process.
+
+        Args:
+            parallel (int): Index of environment
+                (<span style="color:#C00000"><b>required</b></span>).
+            kwargs: Arguments overwriting those of the environment specification, e.g. to
+                continue a per-environment sequence
+                (<span style="color:#00C000"><b>default</b></span>: none).
+        """
+        if self.is_environment_external:
+            raise TensorforceError.invalid(
+                name="Runner.recycle_environment",
+                argument="parallel",
+                condition="Environment objects",
+            )
+        elif self.environment_kwargs["remote"] not in (None, "multiprocessing"):
+            raise TensorforceError.invalid(
+                name="Runner.recycle_environment",
+                argument="parallel",
+                condition="socket-client remote mode",
+            )
+        elif self.environments_per_process > 1:
+            raise TensorforceError.invalid(
+                name="Runner.recycle_environment",
+                argument="parallel",
+                condition="environments_per_process > 1",
+            )
+        elif self.num_vectorized is not None:
+            raise TensorforceError.invalid(
+                name="Runner.recycle_environment",
+                argument="parallel",
+                condition="vectorized environment",
+            )
+        environment, host, port = self.environment_specs[parallel]
+        env_kwargs = dict(self.environment_kwargs)
+        if isinstance(environment, dict):
+            environment = dict(environment, **kwargs)
+            for name in kwargs:
+                env_kwargs.pop(name, None)
+        else:
+            env_kwargs.update(kwargs)
+        self.environments[parallel].close()
+        self.environments[parallel] = Environment.create(
+            environment=environment, host=host, port=port, **env_kwargs
+        )
+
     def close(self):
         if hasattr(self, "tqdm"):
             self.tqdm.close()
@@ -262,6 +486,9 @@ class Runner(object):
         if not self.is_environment_external:
             for environment in self.environments:
                 environment.close()
+        if self.registry_client is not None:
+            self.registry_client.release(workers=self.registry_workers)
+            self.registry_workers = None
 
     # TODO: make average reward another possible criteria for runner-termination
     def run(
@@ -275,13 +502,17 @@ class Runner(object):
         sync_timesteps=False,
         sync_episodes=False,
         num_sleep_secs=0.001,
+        batch_min_size=None,
+        batch_max_wait=None,
         # Callback
         callback=None,
         callback_episode_frequency=None,
         callback_timestep_frequency=None,
+        terminal_callback=None,
         # Tqdm
         use_tqdm=True,
         mean_horizon=1,
+        statistics_horizons=(),
         # Evaluation
         evaluation=False,
         save_best_agent=None,
@@ -310,6 +541,14 @@ class Runner(object):
                 (<span style="color:#00C000"><b>default</b></span>: false).
             num_sleep_secs (float): Sleep duration if no environment is ready
                 (<span style="color:#00C000"><b>default</b></span>: one milliseconds).
+            batch_min_size (int > 0): Minimum number of ready environments for a batched agent
+                call once batch_max_wait has passed, environments not ready yet join a later
+                batch, only valid if batch_agent_calls
+                (<span style="color:#00C000"><b>default</b></span>: wait for all environments).
+            batch_max_wait (float >= 0): Seconds to wait for all environments before acting on
+                batch_min_size ready environments, only valid if batch_min_size
+                (<span style="color:#00C000"><b>default</b></span>: zero, act as soon as
+                batch_min_size environments are ready).
             callback (callable[(Runner, parallel) -> bool]): Callback function taking the runner
                 instance plus parallel index and returning a boolean value indicating whether
                 execution should continue
@@ -318,6 +557,10 @@ class Runner(object):
                 (<span style="color:#00C000"><b>default</b></span>: every episode).
             callback_timestep_frequency (int): Timestep interval between callbacks
                 (<span style="color:#00C000"><b>default</b></span>: not specified).
+            terminal_callback (callable[(Runner, parallel) -> None]): Callback function taking the
+                runner instance plus parallel index, called after every finished training episode,
+                including those which parallel environments finish after the run was terminated
+                (<span style="color:#00C000"><b>default</b></span>: none).
             use_tqdm (bool): Whether to display a tqdm progress bar for the experiment run
                 (<span style="color:#00C000"><b>default</b></span>: true), with the following
                 additional information (averaged over number of episodes given via mean_horizon):
@@ -332,6 +575,10 @@ class Runner(object):
                 </ul>
             mean_horizon (int): Number of episodes progress bar values and evaluation score are
                 averaged over (<span style="color:#00C000"><b>default</b></span>: not averaged).
+            statistics_horizons (iter[int]): Additional episode horizons for which the experiment
+                statistics (EpisodeSeries) maintain incremental rolling aggregates, besides
+                mean_horizon
+                (<span style="color:#00C000"><b>default</b></span>: none).
             evaluation (bool): Whether to run in evaluation mode, only valid if single environment
                 (<span style="color:#00C000"><b>default</b></span>: no evaluation).
             save_best_agent (string): Directory to save the best version of the agent according to
@@ -381,6 +628,29 @@ class Runner(object):
         self.sync_timesteps = sync_timesteps or self.batch_agent_calls
         self.sync_episodes = sync_episodes or (self.num_vectorized is not None)
         self.num_sleep_secs = num_sleep_secs
+        if batch_min_size is not None and (
+            not batch_agent_calls or self.num_vectorized is not None
+        ):
+            raise TensorforceError.invalid(
+                name="Runner.run",
+                argument="batch_min_size",
+                condition="batch_agent_calls is false",
+            )
+        elif batch_min_size is not None and batch_min_size < 1:
+            raise TensorforceError.value(
+                name="Runner.run",
+                argument="batch_min_size",
+                value=batch_min_size,
+                hint="< 1",
+            )
+        if batch_max_wait is not None and batch_min_size is None:
+            raise TensorforceError.invalid(
+                name="Runner.run",
+                argument="batch_max_wait",
+                condition="batch_min_size is not specified",
+            )
+        self.batch_min_size = batch_min_size
+        self.batch_max_wait = 0.0 if batch_max_wait is None else batch_max_wait
         if self.num_vectorized is None:
             self.num_environments = len(self.environments)
         else:
@@ -421,21 +691,31 @@ class Runner(object):
                     return True
 
             self.callback = boolean_callback
+        if terminal_callback is None:
+            self.terminal_callback = lambda r, p: None
+        else:
+            self.terminal_callback = terminal_callback
 
         # Experiment statistics
-        self.episode_returns = list()
-        self.episode_timesteps = list()
-        self.episode_seconds = list()
-        self.episode_agent_seconds = list()
+        horizons = (mean_horizon,) + tuple(statistics_horizons)
+        self.episode_returns = EpisodeSeries(horizons=horizons)
+        self.episode_timesteps = EpisodeSeries(horizons=horizons, dtype=np.int64)
+        self.episode_seconds = EpisodeSeries(horizons=horizons)
+        self.episode_agent_seconds = EpisodeSeries(horizons=horizons)
         if self.is_environment_remote:
-            self.episode_env_seconds = list()
+            self.episode_env_seconds = EpisodeSeries(horizons=horizons)
+        if self.checkpoint_manager is not None:
+            # Checkpoint snapshot seconds (critical path) and write seconds (background thread)
+            self.episode_saver_seconds = EpisodeSeries(horizons=horizons)
+            self.episode_saver_offloaded_seconds = EpisodeSeries(horizons=horizons)
+            self.checkpoint_manager.pop_statistics()
         if self.evaluation or evaluation:
-            self.evaluation_returns = list()
-            self.evaluation_timesteps = list()
-            self.evaluation_seconds = list()
-            self.evaluation_agent_seconds = list()
+            self.evaluation_returns = EpisodeSeries(horizons=horizons)
+            self.evaluation_timesteps = EpisodeSeries(horizons=horizons, dtype=np.int64)
+            self.evaluation_seconds = EpisodeSeries(horizons=horizons)
+            self.evaluation_agent_seconds = EpisodeSeries(horizons=horizons)
             if self.is_environment_remote:
-                self.evaluation_env_seconds = list()
+                self.evaluation_env_seconds = EpisodeSeries(horizons=horizons)
             if self.num_environments == 1:
                 # for tqdm
                 self.episode_returns = self.evaluation_returns
@@ -458,6 +738,25 @@ class Runner(object):
         self.episodes = 0
         self.updates = 0
 
+        # Agent graph traces before run, to detect retracing during run
+        self.run_trace_counts = self.agent.trace_counts()
+
+        # Continue from run state if given
+        run_state, self.run_state = self.run_state, None
+        if run_state is not None:
+            self.timesteps = run_state["timesteps"]
+            self.episodes = run_state["episodes"]
+            self.updates = run_state["updates"]
+            restored = set()
+            for name, values in run_state["statistics"].items():
+                series = getattr(self, name, None)
+                if series is None or id(series) in restored:
+                    continue
+                restored.add(id(series))
+                series.extend(values)
+            random.setstate(run_state["python_random_state"])
+            np.random.set_state(run_state["numpy_random_state"])
+
         # Tqdm
         if use_tqdm:
             if hasattr(self, "tqdm"):
@@ -492,19 +791,19 @@ class Runner(object):
 
                 def tqdm_callback(runner, parallel):
                     if len(runner.evaluation_returns) > 0:
-                        mean_return = float(
-                            np.mean(runner.evaluation_returns[-mean_horizon:])
+                        mean_return = runner.evaluation_returns.mean(
+                            horizon=mean_horizon
                         )
                         runner.tqdm.postfix[0] = mean_return
                     if len(runner.episode_timesteps) > 0:
                         mean_ts_per_ep = int(
-                            np.mean(runner.episode_timesteps[-mean_horizon:])
+                            runner.episode_timesteps.mean(horizon=mean_horizon)
                         )
-                        mean_sec_per_ep = float(
-                            np.mean(runner.episode_seconds[-mean_horizon:])
+                        mean_sec_per_ep = runner.episode_seconds.mean(
+                            horizon=mean_horizon
                         )
-                        mean_agent_sec = float(
-                            np.mean(runner.episode_agent_seconds[-mean_horizon:])
+                        mean_agent_sec = runner.episode_agent_seconds.mean(
+                            horizon=mean_horizon
                         )
                         mean_ms_per_ts = mean_sec_per_ep * 1000.0 / mean_ts_per_ep
                         mean_rel_agent = mean_agent_sec * 100.0 / mean_sec_per_ep
@@ -516,8 +815,8 @@ class Runner(object):
                         runner.is_environment_remote
                         and len(runner.episode_env_seconds) > 0
                     ):
-                        mean_env_sec = float(
-                            np.mean(runner.episode_env_seconds[-mean_horizon:])
+                        mean_env_sec = runner.episode_env_seconds.mean(
+                            horizon=mean_horizon
                         )
                         mean_rel_comm = (
                             (mean_agent_sec + mean_env_sec) * 100.0 / mean_sec_per_ep
@@ -568,12 +867,15 @@ class Runner(object):
             def mean_return_callback(runner):
                 result = inner_evaluation_callback(runner)
                 if result is None:
-                    return float(np.mean(runner.evaluation_returns[-mean_horizon:]))
+                    return runner.evaluation_returns.mean(horizon=mean_horizon)
                 else:
                     return result
 
             self.evaluation_callback = mean_return_callback
-            self.best_evaluation_score = None
+            if run_state is None:
+                self.best_evaluation_score = None
+            else:
+                self.best_evaluation_score = run_state["best_evaluation_score"]
 
         # Episode statistics
         self.episode_return = [0.0 for _ in range(self.num_environments)]
@@ -599,6 +901,22 @@ class Runner(object):
         if self.evaluation_run:
             self.evaluation_internals = self.agent.initial_internals()
 
+        # Batched agent call statistics (histograms of batch sizes and wait seconds)
+        self.batch_size_counts = np.zeros(
+            shape=(self.num_environments + 1,), dtype=np.int64
+        )
+        self.batch_wait_counts = np.zeros(
+            shape=(len(self.BATCH_WAIT_BINS) + 1,), dtype=np.int64
+        )
+
+        # Nothing left to do if restored run already finished
+        if (
+            self.episodes >= self.num_episodes
+            or self.timesteps >= self.num_timesteps
+            or self.updates >= self.num_updates
+        ):
+            return
+
         # Required if agent was previously stopped mid-episode
         self.agent.reset()
 
@@ -621,8 +939,17 @@ class Runner(object):
             if self.batch_agent_calls:
 
                 if self.num_vectorized is None:
-                    # Retrieve observations (only if not already terminated)
-                    while any(terminal is None for terminal in self.terminals):
+                    # Retrieve observations (only if not already terminated), environments not
+                    # ready after batch_max_wait join a later batch if batch_min_size is reached
+                    wait_start = time.time()
+                    num_active = sum(int(terminal <= 0) for terminal in self.prev_terminals)
+                    if self.batch_min_size is None:
+                        min_ready = num_active
+                    else:
+                        min_ready = min(self.batch_min_size, num_active)
+                    num_ready = 0
+                    while num_ready < num_active:
+                        any_received = False
                         for n in range(self.num_environments):
                             if self.terminals[n] is not None:
                                 # Already received
@@ -637,11 +964,25 @@ class Runner(object):
                                     self.terminals[n],
                                     self.rewards[n],
                                 ) = observation
+                                num_ready += 1
+                                any_received = True
                             else:
                                 # Terminal
                                 self.states[n] = None
                                 self.terminals[n] = self.prev_terminals[n]
                                 self.rewards[n] = None
+                        if (
+                            num_ready >= min_ready
+                            and time.time() - wait_start >= self.batch_max_wait
+                        ):
+                            break
+                        if not any_received:
+                            time.sleep(self.num_sleep_secs)
+                    if num_active > 0:
+                        self.batch_size_counts[num_ready] += 1
+                        self.batch_wait_counts[
+                            bisect_right(self.BATCH_WAIT_BINS, time.time() - wait_start)
+                        ] += 1
 
                 else:
                     # Vectorized environment execute
@@ -685,7 +1026,10 @@ class Runner(object):
 
                 elif self.batch_agent_calls:
                     # Handled before parallel environments loop
-                    pass
+                    if self.terminals[n] is None:
+                        # Not ready, joins a later batch
+                        self.terminals[n] = self.prev_terminals[n]
+                        continue
 
                 elif self.sync_timesteps:
                     # Wait until environment is ready
@@ -790,7 +1134,7 @@ class Runner(object):
         parallel = [
             n
             for n in range(self.num_environments - int(self.evaluation_run))
-            if self.terminals[n] <= 0
+            if self.terminals[n] is not None and self.terminals[n] <= 0
         ]
         if len(parallel) > 0:
             agent_start = time.time()
@@ -806,7 +1150,11 @@ class Runner(object):
                     for n in range(self.num_environments)
                 ]
 
-        if self.evaluation_run and self.terminals[-1] <= 0:
+        if (
+            self.evaluation_run
+            and self.terminals[-1] is not None
+            and self.terminals[-1] <= 0
+        ):
             assert self.num_vectorized is None
             agent_start = time.time()
             self.actions[-1], self.evaluation_internals = self.agent.act(
@@ -874,7 +1222,9 @@ class Runner(object):
         parallel = [
             n
             for n in range(self.num_environments - int(self.evaluation_run))
-            if self.prev_terminals[n] <= 0 and self.terminals[n] >= 0
+            if self.prev_terminals[n] <= 0
+            and self.terminals[n] is not None
+            and self.terminals[n] >= 0
         ]
         if len(parallel) > 0:
             agent_start = time.time()
@@ -916,9 +1266,14 @@ class Runner(object):
             self.episode_env_seconds.append(
                 self.environments[parallel]._episode_seconds
             )
+        if self.checkpoint_manager is not None:
+            statistics = self.checkpoint_manager.pop_statistics()
+            self.episode_saver_seconds.append(statistics["snapshot_seconds"])
+            self.episode_saver_offloaded_seconds.append(statistics["write_seconds"])
 
         # Maximum number of episodes or episode callback (after counter increment!)
         self.episodes += 1
+        self.terminal_callback(self, parallel)
         if self.terminate == 0 and (
             (
                 self.episodes % self.callback_episode_frequency == 0
@@ -0,0 +1,189 @@
+import cProfile
+import json
+import pstats
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.append("./external")
+
+from custom_environment import CustomEnvironment
+from experiment import baseline_env_kwargs
+from external.tensorforce.execution import Runner
+from util import episode_timesteps, read_results_log
+
+EXPERIMENTS_DIR = Path(".").absolute().parent / "Experiments"
+
+
+def episode_seed(outpath: Path, episode: int, mode: str = "eval") -> int:
+    """
+    Looks up the NetLogo seed of a logged episode.
+    :param outpath: Path of experiment (Experiments/<reward_key>/<timestamp>).
+    :param episode: Index of episode in the results log.
+    :param mode: Mode of episode ("training" or "eval").
+    :return: Seed of the episode (of the latest run, if the experiment was resumed).
+    """
+    log_df = read_results_log(outpath / "results_log.jsonl", mode=mode)
+    seeds = log_df.seed[log_df.episode == episode] if len(log_df) > 0 else []
+    if len(seeds) == 0 or seeds.isna().iloc[-1]:
+        raise ValueError(
+            f"No seed logged for {mode} episode {episode} of {outpath} "
+            "(experiment without seed file or run seed)"
+        )
+    return int(seeds.iloc[-1])
+
+
+def check_replay(outpath: Path, episode: int, mode: str = "eval", force: bool = False):
+    """
+    Checks whether the agent of a replay acted in the logged episode. Replays of RL agents use
+    the latest checkpoint, acting deterministically, which is not the agent of a training episode
+    (sampled actions, updated afterwards) nor of an evaluation episode if training continued.
+    :param outpath: Path of experiment (Experiments/<reward_key>/<timestamp>).
+    :param episode: Index of episode in the results log.
+    :param mode: Mode of episode ("training" or "eval").
+    :param force: Whether training episodes of RL agents are replayed anyway (with a warning).
+    :return:
+    """
+    with open(str(outpath / "config.txt"), "r") as fp:
+        config = json.load(fp=fp)
+    if config["agent"].get("agent") == "baseline_agent":
+        return
+    if mode == "training":
+        message = (
+            f"Training episode {episode} of {outpath} was played by the agent while it "
+            "was trained, a replay only reproduces the simulation seed"
+        )
+        if not force:
+            raise ValueError(message)
+        print(f"Warning: {message}")
+        return
+    log_df = read_results_log(outpath / "results_log.jsonl")
+    if len(log_df) == 0:
+        return
+    episode_rows = log_df.index[(log_df["mode"] == mode) & (log_df.episode == episode)]
+    if len(episode_rows) > 0 and (
+        log_df["mode"].loc[episode_rows[-1] :] == "training"
+    ).any():
+        print(
+            f"Warning: training continued after {mode} episode {episode} of {outpath}, "
+            "the latest checkpoint replays it with a different agent"
+        )
+
+
+def replay_episode(
+    outpath: Path,
+    seed: int,
+    profile: str = None,
+    nl_path: str = None,
+) -> float:
+    """
+    Replays one episode of an experiment in this process, e.g. for profiling. Only the simulation
+    seed of the logged episode is reproduced: the agent is the latest checkpoint (or rule-based
+    baseline) acting deterministically, so replays are exactly repeatable, but only reproduce the
+    logged episode for baseline agents and for evaluation episodes after training (see
+    check_replay).
+    :param outpath: Path of experiment (Experiments/<reward_key>/<timestamp>).
+    :param seed: NetLogo seed of the episode (see episode_seed).
+    :param profile: Path to write cProfile statistics of the episode to, not profiled if None.
+    :param nl_path: Path to NetLogo Installation (for Linux users), defaults to that of the experiment.
+    :return: Return of episode.
+    """
+    with open(str(outpath / "config.txt"), "r") as fp:
+        config = json.load(fp=fp)
+    # Environment as configured by run_experiments.py, without documenting the replay
+    env_kwargs = {
+        "timestamp": outpath.name,
+        "reward_key": config["reward_key"],
+        "document": False,
+        "adjust_free": config.get("adjust_free", True),
+        "model_size": config.get("model_size", "training"),
+        "nl_path": nl_path or config.get("nl_path"),
+        "seeds": [seed],
+        "decision_interval": config.get("decision_interval", 30),
+        "action_repeat": config.get("action_repeat", 1),
+    }
+    agent = config["agent"]
+    if agent.get("agent") == "baseline_agent":
+        env_kwargs.update(baseline_env_kwargs(agent))
+    else:
+        agent = {
+            "directory": str(outpath / "model-checkpoints"),
+            "format": "checkpoint",
+        }
+    runner = Runner(
+        agent=agent,
+        environment=CustomEnvironment,
+        max_episode_timesteps=episode_timesteps(
+            env_kwargs["decision_interval"], env_kwargs["action_repeat"]
+        ),
+        **env_kwargs,
+    )
+    profiler = None if profile is None else cProfile.Profile()
+    if profiler is not None:
+        profiler.enable()
+    runner.run(num_episodes=1, evaluation=True, use_tqdm=False)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    episode_return = float(runner.evaluation_returns[-1])
+    runner.close()
+    return episode_return
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "experiment",
+        type=str,
+        help="Experiment to replay an episode of (<reward_key>/<timestamp>)",
+    )
+    parser.add_argument("episode", type=int, help="Index of episode in results log")
+    parser.add_argument(
+        "-m",
+        "--mode",
+        type=str,
+        default="eval",
+        choices=["training", "eval"],
+        help="Mode of episode",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        default=None,
+        help="NetLogo seed to replay with, defaults to the logged seed of the episode",
+    )
+    parser.add_argument(
+        "-pr",
+        "--profile",
+        type=str,
+        default=None,
+        help="Path to write cProfile statistics of the episode to",
+    )
+    parser.add_argument(
+        "-np",
+        "--nl_path",
+        type=str,
+        default=None,
+        help="Path to NetLogo directory (for Linux Users)",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Replay training episodes of RL agents with the latest checkpoint anyway",
+    )
+    args = parser.parse_args()
+
+    outpath = EXPERIMENTS_DIR / args.experiment
+    check_replay(outpath, args.episode, mode=args.mode, force=args.force)
+    seed = args.seed
+    if seed is None:
+        seed = episode_seed(outpath, args.episode, mode=args.mode)
+    episode_return = replay_episode(
+        outpath, seed=seed, profile=args.profile, nl_path=args.nl_path
+    )
+    print(
+        f"Replayed {args.mode} episode {args.episode} (seed {seed}): {episode_return}"
+    )
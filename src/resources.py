@@ -0,0 +1,178 @@
+import os
+import platform
+import sys
+
+# Memory bounds of the heap of a NetLogo JVM (in MB)
+MIN_JVM_HEAP = 1024
+MAX_JVM_HEAP = 4096
+
+# Agent resources applied in this process (TensorFlow thread pools can only be sized once)
+applied_agent_resources = None
+
+
+def available_cores() -> list:
+    """
+    Returns the CPU cores the current process may run on.
+    :return: List of core indices.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def process_rss(pid: int) -> float:
+    """
+    Returns the resident memory of a process, read from /proc on Linux and via psutil (if
+    installed) on other platforms.
+    :param pid: Process id.
+    :return: Resident set size in MB.
+    """
+    if platform.system() == "Linux":
+        with open(f"/proc/{pid}/status", "r") as fp:
+            for line in fp:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+    try:
+        import psutil
+    except ImportError:
+        raise RuntimeError(
+            f"Resident memory of processes on {platform.system()} requires psutil"
+        )
+    return psutil.Process(pid).memory_info().rss / 2**20
+
+
+def check_process_rss():
+    """
+    Checks that the resident memory of processes can be read on this platform (see process_rss).
+    :return:
+    """
+    process_rss(os.getpid())
+
+
+def default_jvm_heap(num_jvms: int) -> int:
+    """
+    Splits the physical memory between the NetLogo JVMs (and the agent process).
+    :param num_jvms: Number of JVMs running on this host.
+    :return: Maximum heap size per JVM in MB.
+    """
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+    except (AttributeError, ValueError, OSError):
+        return MAX_JVM_HEAP
+    return int(min(MAX_JVM_HEAP, max(MIN_JVM_HEAP, memory // (num_jvms + 1))))
+
+
+def plan_resources(
+    num_parallel: int,
+    num_cores: int = None,
+    affinity: bool = False,
+    jvm_heap: int = None,
+    workspaces_per_jvm: int = 1,
+) -> dict:
+    """
+    Plans threads and cores of the agent (TensorFlow) and the NetLogo environments, so that
+    TensorFlow thread pools, JVM GC/JIT threads and simulations do not oversubscribe the cores.
+    Every environment process gets one core (NetLogo simulates on a single thread), the agent
+    the remaining cores (at least one).
+    :param num_parallel: Number of environments (1: environment runs in the agent process).
+    :param num_cores: Number of cores of the run (e.g. share of one of several concurrent runs),
+    defaults to all available cores.
+    :param affinity: Whether processes are pinned to their cores (only with all available cores).
+    :param jvm_heap: Maximum heap size per JVM in MB, defaults to a share of the physical memory.
+    :param workspaces_per_jvm: Number of environments (NetLogo workspaces) sharing one JVM process,
+    which get the cores of all its workspaces.
+    :return: Plan with "agent" resources and a list of "environments" resources.
+    """
+    cores = available_cores()
+    if num_cores is not None and num_cores < len(cores):
+        # Share of the cores, which concurrent runs would pin to the same cores
+        cores = cores[: max(1, num_cores)]
+        affinity = False
+    num_jvms = -(-num_parallel // workspaces_per_jvm)
+    if jvm_heap is None:
+        jvm_heap = default_jvm_heap(num_jvms=num_jvms)
+    pin = affinity and platform.system() == "Linux"
+
+    agent_cores = cores[num_parallel:] or cores[:1]
+    agent = {
+        "intra_op_threads": len(agent_cores),
+        "inter_op_threads": min(2, len(agent_cores)),
+        "cpus": agent_cores if pin else None,
+    }
+
+    environments = []
+    for n in range(num_parallel):
+        # Workspaces of a JVM simulate on one thread each
+        first = n - n % workspaces_per_jvm
+        jvm_cores = [
+            cores[m % len(cores)]
+            for m in range(first, min(first + workspaces_per_jvm, num_parallel))
+        ]
+        environments.append(
+            {
+                "jvm_options": [
+                    f"-Xmx{jvm_heap}m",
+                    "-XX:+UseSerialGC",
+                    f"-XX:ActiveProcessorCount={len(jvm_cores)}",
+                    "-XX:CICompilerCount=2",
+                ],
+                # In-process environment shares the thread settings of the agent
+                "threads": 1 if num_parallel > 1 else None,
+                "cpus": sorted(set(jvm_cores)) if pin and num_parallel > 1 else None,
+            }
+        )
+    return {"num_cores": len(cores), "agent": agent, "environments": environments}
+
+
+def apply_agent_resources(resources: dict):
+    """
+    Sizes the TensorFlow thread pools of the agent process and, possibly, pins it to its cores.
+    Has to be called before TensorFlow is initialized (i.e. before the agent is created).
+    :param resources: Agent resources of plan_resources.
+    :return:
+    """
+    global applied_agent_resources
+    import tensorflow as tf
+
+    if applied_agent_resources is not None:
+        # Sequential runs in the same process
+        return
+    applied_agent_resources = resources
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(
+            resources["intra_op_threads"]
+        )
+        tf.config.threading.set_inter_op_parallelism_threads(
+            resources["inter_op_threads"]
+        )
+    except RuntimeError:
+        # TensorFlow already initialized in this process (e.g. by a previous run)
+        print("TensorFlow thread pools already initialized, keeping their size")
+    if resources["cpus"] is not None:
+        os.sched_setaffinity(0, resources["cpus"])
+
+
+def apply_environment_resources(resources: dict):
+    """
+    Configures the process of an environment before its NetLogo JVM is started.
+    :param resources: Environment resources of plan_resources.
+    :return:
+    """
+    if "jpype" in sys.modules and sys.modules["jpype"].isJVMStarted():
+        # Further workspace of a shared JVM, which is already configured
+        return
+    # Options are picked up by the JVM started by pyNetLogo (independent of its version)
+    os.environ["JAVA_TOOL_OPTIONS"] = " ".join(
+        [os.environ.get("JAVA_TOOL_OPTIONS", "")] + resources["jvm_options"]
+    ).strip()
+    if resources["threads"] is not None:
+        # Environment processes import TensorFlow (via tensorforce) but do not compute with it
+        for variable in [
+            "OMP_NUM_THREADS",
+            "TF_NUM_INTRAOP_THREADS",
+            "TF_NUM_INTEROP_THREADS",
+        ]:
+            os.environ[variable] = str(resources["threads"])
+    if resources["cpus"] is not None:
+        os.sched_setaffinity(0, resources["cpus"])
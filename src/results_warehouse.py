@@ -0,0 +1,353 @@
+import hashlib
+import json
+import sqlite3
+from argparse import ArgumentParser
+from pathlib import Path
+
+import pandas as pd
+
+from util import plot_radar
+
+EXPERIMENTS_DIR = Path(".").absolute().parent / "Experiments"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    tail TEXT
+);
+CREATE TABLE IF NOT EXISTS experiments (
+    experiment TEXT PRIMARY KEY,
+    reward_key TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    experiment TEXT NOT NULL,
+    run TEXT,
+    mode TEXT,
+    episode INTEGER,
+    parallel INTEGER,
+    reward_key TEXT,
+    seed INTEGER,
+    rewards REAL,
+    episode_length INTEGER,
+    seconds REAL,
+    agent_seconds REAL,
+    env_seconds REAL,
+    saver_seconds REAL,
+    time REAL
+);
+CREATE INDEX IF NOT EXISTS episodes_experiment ON episodes (experiment, mode);
+CREATE INDEX IF NOT EXISTS episodes_reward_key ON episodes (reward_key, mode);
+CREATE TABLE IF NOT EXISTS episode_summaries (
+    experiment TEXT NOT NULL,
+    episode TEXT NOT NULL,
+    reward REAL,
+    occupancy REAL,
+    cars REAL,
+    speed REAL,
+    social REAL,
+    summary TEXT,
+    PRIMARY KEY (experiment, episode)
+);
+CREATE TABLE IF NOT EXISTS episode_labels (
+    experiment TEXT NOT NULL,
+    episode TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    PRIMARY KEY (experiment, mode, metric)
+);
+"""
+
+EPISODE_COLUMNS = [
+    "run",
+    "mode",
+    "episode",
+    "parallel",
+    "reward_key",
+    "seed",
+    "rewards",
+    "episode_length",
+    "seconds",
+    "agent_seconds",
+    "env_seconds",
+    "saver_seconds",
+    "time",
+]
+
+
+class ResultsWarehouse:
+    def __init__(self, path: Path = EXPERIMENTS_DIR / "results.sqlite"):
+        """
+        Indexed SQLite database of the results of all experiments (Experiments/<reward_key>/<timestamp>),
+        filled incrementally from their append-only logs, so analyses do not touch episode files.
+        :param path: Path of database file.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Concurrent experiments ingest into the same database
+        self.connection = sqlite3.connect(str(self.path), timeout=60.0)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def tail_fingerprint(data: bytes) -> str:
+        """
+        Fingerprint (length and hash) of the last line of data ending with a newline.
+        """
+        start = data.rfind(b"\n", 0, len(data) - 1) + 1
+        line = data[start:]
+        return f"{len(line)}:{hashlib.sha1(line).hexdigest()}"
+
+    def read_new_records(self, path: Path, table: str, experiment: str) -> list:
+        """
+        Reads the records appended to a JSONL file since its last ingestion. Files which were
+        rewritten (logs truncated when resuming experiments, possibly grown again since), i.e.
+        whose last ingested line changed, are ingested again from the start.
+        :param path: Path of JSONL file.
+        :param table: Table the records of the file are ingested into.
+        :param experiment: Experiment of the file.
+        :return: List of new records.
+        """
+        row = self.connection.execute(
+            "SELECT offset, tail FROM files WHERE path = ?", (str(path),)
+        ).fetchone()
+        offset, tail = (0, None) if row is None else row
+        with open(str(path), "rb") as fp:
+            if offset > 0:
+                valid = tail is not None and path.stat().st_size >= offset
+                if valid:
+                    length = int(tail.split(":")[0])
+                    fp.seek(offset - length)
+                    valid = self.tail_fingerprint(fp.read(length)) == tail
+                if not valid:
+                    self.connection.execute(
+                        f"DELETE FROM {table} WHERE experiment = ?", (experiment,)
+                    )
+                    offset, tail = 0, None
+            fp.seek(offset)
+            data = fp.read()
+        # Last line may still be written
+        complete = data[: data.rfind(b"\n") + 1]
+        if len(complete) > 0:
+            tail = self.tail_fingerprint(complete)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files (path, offset, tail) VALUES (?, ?, ?)",
+            (str(path), offset + len(complete), tail),
+        )
+        return [json.loads(line) for line in complete.decode().splitlines()]
+
+    def ingest_experiment(self, outpath: Path):
+        """
+        Ingests new results of one experiment directory.
+        :param outpath: Path of experiment (Experiments/<reward_key>/<timestamp>).
+        :return:
+        """
+        outpath = Path(outpath)
+        experiment = f"{outpath.parent.name}/{outpath.name}"
+        config = None
+        if (outpath / "config.txt").is_file():
+            with open(str(outpath / "config.txt"), "r") as fp:
+                config = fp.read()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO experiments VALUES (?, ?, ?, ?)",
+                (experiment, outpath.parent.name, outpath.name, config),
+            )
+            if (outpath / "results_log.jsonl").is_file():
+                records = self.read_new_records(
+                    outpath / "results_log.jsonl", "episodes", experiment
+                )
+                # Memory records of monitored runs are no episode results
+                records = [record for record in records if record["mode"] != "memory"]
+                placeholders = ", ".join(["?"] * (len(EPISODE_COLUMNS) + 1))
+                self.connection.executemany(
+                    f"INSERT INTO episodes VALUES ({placeholders})",
+                    [
+                        [experiment] + [record.get(col) for col in EPISODE_COLUMNS]
+                        for record in records
+                    ],
+                )
+            if (outpath / "episode_summaries.jsonl").is_file():
+                records = self.read_new_records(
+                    outpath / "episode_summaries.jsonl", "episode_summaries", experiment
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO episode_summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            experiment,
+                            record["episode"],
+                            record["reward"],
+                            record["occupancy"],
+                            record["cars"],
+                            record["speed"],
+                            record["social"],
+                            json.dumps(record["summary"]),
+                        )
+                        for record in records
+                    ],
+                )
+            if (outpath / "episode_labels.jsonl").is_file():
+                records = self.read_new_records(
+                    outpath / "episode_labels.jsonl", "episode_labels", experiment
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO episode_labels VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            experiment,
+                            record["episode"],
+                            record["mode"],
+                            record["metric"],
+                        )
+                        for record in records
+                    ],
+                )
+
+    def ingest(self, experiments_dir: Path = EXPERIMENTS_DIR):
+        """
+        Ingests new results of all experiment directories.
+        :param experiments_dir: Directory containing <reward_key>/<timestamp> experiment directories.
+        :return: Number of experiment directories.
+        """
+        outpaths = [
+            outpath
+            for outpath in sorted(Path(experiments_dir).glob("*/*"))
+            if outpath.is_dir()
+        ]
+        for outpath in outpaths:
+            self.ingest_experiment(outpath)
+        return len(outpaths)
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        """
+        Runs a query on the warehouse.
+        :param sql: SQL query.
+        :param params: Parameters of query.
+        :return: DataFrame with result.
+        """
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def radar_scores(
+        self,
+        modes: tuple = ("eval", "standard"),
+        metric: str = "median",
+        reward_keys: list = None,
+    ) -> dict:
+        """
+        Scores of the labelled (e.g. median) episode of the latest experiment per reward key.
+        :param modes: Modes of labelled episodes ("training", "eval" or baseline modes such as
+        "standard"), so RL and baseline experiments can be compared.
+        :param metric: Label of episodes ("min", "median" or "max").
+        :param reward_keys: Reward keys to include, all if None.
+        :return: Scores (occupancy, cars, speed, social) per reward key, as used by util.plot_radar.
+        """
+        placeholders = ", ".join(["?"] * len(modes))
+        df = self.query(
+            f"""
+            SELECT e.reward_key, e.timestamp, s.occupancy, s.cars, s.speed, s.social
+            FROM episode_labels l
+            JOIN episode_summaries s ON s.experiment = l.experiment AND s.episode = l.episode
+            JOIN experiments e ON e.experiment = l.experiment
+            WHERE l.mode IN ({placeholders}) AND l.metric = ?
+            ORDER BY e.timestamp
+            """,
+            (*modes, metric),
+        )
+        if reward_keys is not None:
+            df = df[df.reward_key.isin(reward_keys)]
+        df = df.groupby("reward_key").last()
+        return {
+            reward_key: row[["occupancy", "cars", "speed", "social"]].to_dict()
+            for reward_key, row in df.iterrows()
+        }
+
+    def compare_reward_keys(self, mode: str = "eval") -> pd.DataFrame:
+        """
+        Compares the logged episode returns and documented episode scores of all reward keys.
+        :param mode: Mode of episodes ("training" or "eval").
+        :return: DataFrame with one row per reward key.
+        """
+        returns = self.query(
+            """
+            SELECT reward_key, COUNT(*) AS episodes, COUNT(DISTINCT experiment) AS experiments,
+                AVG(rewards) AS mean_reward, MIN(rewards) AS min_reward,
+                MAX(rewards) AS max_reward, AVG(episode_length) AS mean_episode_length
+            FROM episodes WHERE mode = ? GROUP BY reward_key
+            """,
+            (mode,),
+        )
+        scores = self.query(
+            """
+            SELECT e.reward_key, COUNT(*) AS documented, AVG(s.occupancy) AS occupancy,
+                AVG(s.cars) AS cars, AVG(s.speed) AS speed, AVG(s.social) AS social
+            FROM episode_summaries s JOIN experiments e ON e.experiment = s.experiment
+            GROUP BY e.reward_key
+            """
+        )
+        return returns.merge(scores, on="reward_key", how="outer")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "command",
+        type=str,
+        choices=["ingest", "radar", "compare"],
+        help="Ingest experiments, draw radar plot or compare reward keys",
+    )
+    parser.add_argument(
+        "-d",
+        "--database",
+        type=str,
+        default=str(EXPERIMENTS_DIR / "results.sqlite"),
+        help="Path of warehouse database",
+    )
+    parser.add_argument(
+        "-m", "--mode", type=str, default="eval", help="Mode of episodes to analyse"
+    )
+    parser.add_argument(
+        "-ms",
+        "--modes",
+        type=str,
+        default="eval,standard",
+        help="Comma-separated modes of labelled episodes in radar plot (baselines: standard)",
+    )
+    parser.add_argument(
+        "-mt",
+        "--metric",
+        type=str,
+        default="median",
+        choices=["min", "median", "max"],
+        help="Label of episodes in radar plot",
+    )
+    parser.add_argument(
+        "-rk",
+        "--reward_keys",
+        type=str,
+        default=None,
+        help="Comma-separated reward keys in radar plot, defaults to all",
+    )
+    args = parser.parse_args()
+
+    warehouse = ResultsWarehouse(args.database)
+    if args.command == "ingest":
+        num_experiments = warehouse.ingest()
+        print(f"Ingested {num_experiments} experiments into {args.database}")
+    elif args.command == "radar":
+        plot_radar(
+            warehouse.radar_scores(
+                modes=tuple(args.modes.split(",")),
+                metric=args.metric,
+                reward_keys=None
+                if args.reward_keys is None
+                else args.reward_keys.split(","),
+            )
+        )
+    else:
+        print(warehouse.compare_reward_keys(mode=args.mode).to_string(index=False))
+    warehouse.close()
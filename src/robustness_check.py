@@ -3,6 +3,7 @@ import platform
 import os
 from argparse import ArgumentParser
 from datetime import datetime
+from multiprocessing import Pool
 from pathlib import Path
 from glob import glob
 
@@ -10,19 +11,102 @@ import wandb
 import pandas as pd
 import numpy as np
 import pyNetLogo
-from tqdm import tqdm, trange
+from tqdm import tqdm
 from sklearn.model_selection import ParameterSampler
 
+from run_baseline import METRIC_COLUMNS, collect_metrics
 from util import (
     add_bool_arg,
+    append_jsonl,
     document_episode,
-    delete_unused_episodes,
-    get_data_from_run,
+    load_episode_summary,
+    summary_scores,
 )
 
 COLOURS = ["yellow", "green", "teal", "blue"]
 Z = [-5.58662028e-04, 2.76514862e-02, -4.09343614e-01, 2.31844786e00]
 
+LOW_INCOME_REPORTER = (
+    "ifelse-value (count cars with [income-grade = 0] != 0) "
+    "[(count cars with [income-grade = 0] / count cars) * 100] [0]"
+)
+
+# NetLogo workspace of the current worker process
+nl = None
+
+
+def init_worker(nl_path: str, gui: bool, max_x_cor: int, max_y_cor: int):
+    """
+    Starts the NetLogo workspace of a worker process, which is kept warm across episode jobs.
+    :param nl_path: Path to NetLogo Installation (for Linux users)
+    :param gui: Whether or not NetLogo UI is shown during episodes.
+    :param max_x_cor: Maximum x coordinate of the world.
+    :param max_y_cor: Maximum y coordinate of the world.
+    :return:
+    """
+    global nl
+    if platform.system() == "Linux":
+        nl = pyNetLogo.NetLogoLink(gui=gui, netlogo_home=nl_path, netlogo_version="6.2")
+    else:
+        nl = pyNetLogo.NetLogoLink(gui=gui)
+    nl.load_model("Model.nlogo")
+    nl.command(f"resize-world {-max_x_cor} {max_x_cor} {-max_y_cor} {max_y_cor}")
+
+
+def run_episode(job: tuple):
+    """
+    Runs one seeded episode of a parameter setting and collects its metrics in memory.
+    :param job: Tuple of configuration index, configuration, seed and output path (None if the
+        episode is not exported).
+    :return: Tuple of configuration index, seed and dictionary of episode metrics.
+    """
+    config_index, config, seed, outpath = job
+    p = np.poly1d(Z)
+    nl.command(f"set num-cars {config['num_cars']}")
+    nl.command(f"set lot-distribution-percentage {config['lot_distribution_percentage']}")
+    nl.command(f"set target-start-occupancy {config['target_start_occupancy']}")
+    nl.command(f"set num-garages {config['num_garages']}")
+
+    # Seeded setup, so the median episode can be reproduced for export
+    nl.command(f"random-seed {seed}")
+    nl.command("setup")
+    # Disable rendering of view
+    nl.command("no-display")
+    nl.command("ask one-of cars [record-data]")
+    nl.command("set dynamic-pricing-baseline false")
+    # Accumulate the per-tick metrics in the model, fetched once after the episode
+    nl.command("set collect-metrics? true")
+    for c in COLOURS:
+        if c in ["yellow", "green"]:
+            nl.command(f"change-fee-free {c}-lot 3.6")
+        else:
+            nl.command(f"change-fee-free {c}-lot 1.8")
+
+    episode_cruising = []
+    for j in range(24):
+        nl.command(
+            f"set parking-cars-percentage {(p(j / 2 + 8) + config['parking_cars_percentage_increment']) * 100}"
+        )
+        nl.repeat_command("go", 900)
+        episode_cruising.append(nl.report("share-cruising"))
+    series = collect_metrics(nl)
+
+    occup_score = 0
+    for c in COLOURS:
+        occupancy = series[:, METRIC_COLUMNS.index(f"{c}_lot_occup")]
+        occup_score += np.mean((occupancy > 0.75) & (occupancy < 0.9)) * 0.25
+    metrics = {
+        "Occupancy": occup_score,
+        "Cars": 1 - nl.report("n-cars"),
+        "Speed": series[:, METRIC_COLUMNS.index("mean_speed")].mean(),
+        "Social": nl.report(LOW_INCOME_REPORTER) / 100,
+        "Traffic Count": nl.report("traffic-counter"),
+        "Share Cruising": np.mean(episode_cruising),
+    }
+    if outpath is not None:
+        document_episode(nl=nl, path=outpath, reward_sum=metrics["Traffic Count"])
+    return config_index, seed, metrics
+
 
 def run_robustness_check(
     num_episodes: int,
@@ -31,31 +115,26 @@ def run_robustness_check(
     nl_path: str = None,
     gui: bool = False,
     paper_config: bool = False,
+    num_parallel: int = None,
 ):
     """
-    Runs baseline experiments and save results.
-    :param num_episodes: Number of episodes to run.
+    Runs robustness experiments on a pool of NetLogo worker processes and logs results.
+    :param num_episodes: Number of episodes (seeds) to run per parameter setting.
+    :param n_params: Number of parameter settings to sample.
+    :param param_grid: Grid to sample parameter settings from.
     :param nl_path: Path to NetLogo Installation (for Linux users)
     :param gui: Whether or not NetLogo UI is shown during episodes.
+    :param paper_config: Whether to only run the parameter setting used in the paper.
+    :param num_parallel: Number of NetLogo worker processes (defaults to number of cores).
     :return:
-
-
     """
-    # Connect to NetLogo
-    if platform.system() == "Linux":
-        nl = pyNetLogo.NetLogoLink(gui=gui, netlogo_home=nl_path, netlogo_version="6.2")
-    else:
-        nl = pyNetLogo.NetLogoLink(gui=gui)
-    nl.load_model("Model.nlogo")
     # Load model parameters
     with open("model_config.json", "r") as fp:
         model_config = json.load(fp=fp)
 
-    p = np.poly1d(Z)
     print(f"Configuring model size for evaluation")
     max_x_cor = model_config["evaluation"]["max_x_cor"]
     max_y_cor = model_config["evaluation"]["max_y_cor"]
-    nl.command(f"resize-world {-max_x_cor} {max_x_cor} {-max_y_cor} {max_y_cor}")
 
     if paper_config:
         param_list = [
@@ -70,89 +149,71 @@ def run_robustness_check(
     else:
         param_list = list(ParameterSampler(param_grid, n_iter=n_params))
     print(param_list)
-    for config in tqdm(param_list, desc="Parameter Settings"):
-        timestamp = datetime.now().strftime("%y%m-%d-%H%M")
-        outpath = (
-            Path(".").absolute().parent / f"Experiments/robustness_check" / timestamp
-        )
-        config["model_size"] = (max_x_cor, max_y_cor)
 
+    timestamp = datetime.now().strftime("%y%m-%d-%H%M")
+    outpath = Path(".").absolute().parent / f"Experiments/robustness_check" / timestamp
+    jobs = [
+        (i, config, seed, None)
+        for i, config in enumerate(param_list)
+        for seed in range(num_episodes)
+    ]
+    results = [dict() for _ in param_list]
+
+    num_parallel = min(num_parallel or os.cpu_count() or 1, len(jobs))
+    with Pool(
+        processes=num_parallel,
+        initializer=init_worker,
+        initargs=(nl_path, gui, max_x_cor, max_y_cor),
+    ) as pool:
+        for config_index, seed, metrics in tqdm(
+            pool.imap_unordered(run_episode, jobs), total=len(jobs), desc="Episodes"
+        ):
+            results[config_index][seed] = metrics
+
+        # Only the median episode (by traffic count) of each setting is exported
+        median_jobs = list()
+        median_seeds = list()
+        for i, config in enumerate(param_list):
+            seeds = sorted(results[i], key=lambda x: results[i][x]["Traffic Count"])
+            median_seed = seeds[int(np.ceil(len(seeds) / 2)) - 1]
+            median_seeds.append(median_seed)
+            median_jobs.append(
+                (i, config, median_seed, outpath / f"config_{i}" / "standard" / "median")
+            )
+        pool.map(run_episode, median_jobs)
+
+    for i, config in enumerate(param_list):
+        config["model_size"] = (max_x_cor, max_y_cor)
         run = wandb.init(
             project="model_robustness", entity="jfrang", config=config, reinit=True
         )
-        nl.command(f"set num-cars {wandb.config.num_cars}")
-        nl.command(
-            f"set lot-distribution-percentage {run.config.lot_distribution_percentage}"
-        )
-        nl.command(f"set target-start-occupancy {run.config.target_start_occupancy}")
-        nl.command(f"set num-garages {run.config.num_garages}")
-
-        scores = [0] * num_episodes
-        traffic_counter = []
-        share_cruising_counter = []
-
-        for i in trange(num_episodes):
-            episode_cruising = []
-            nl.command("setup")
-            # nl.command('set target-start-occupancy 0.5')
-            # Disable rendering of view
-            nl.command("no-display")
-            nl.command("ask one-of cars [record-data]")
-            nl.command("set dynamic-pricing-baseline false")
-            for c in COLOURS:
-                if c in ["yellow", "green"]:
-                    nl.command(f"change-fee-free {c}-lot 3.6")
-                else:
-                    nl.command(f"change-fee-free {c}-lot 1.8")
-
-            for j in range(24):
-                nl.command(
-                    f"set parking-cars-percentage {(p(j / 2 + 8) + wandb.config.parking_cars_percentage_increment) * 100}"
-                )
-                nl.repeat_command("go", 900)
-                episode_cruising.append(nl.report("share-cruising"))
-            traffic_counter.append(nl.report("traffic-counter"))
-            scores[i] = traffic_counter[i]
-            document_episode(nl=nl, path=outpath, reward_sum=scores[i])
-            share_cruising_counter.append(np.mean(episode_cruising))
-
-        metrics_df = pd.DataFrame(scores, columns=["rewards"])
-        df = get_median_performance(outpath, metrics_df, "standard")
-        occup_score = 0
-        for c in ["yellow", "green", "teal", "blue"]:
-            occup_score += (
-                len(df[(df[f"{c}_lot_occup"] > 75) & (df[f"{c}_lot_occup"] < 90)])
-                / len(df)
-            ) * 0.25
-        n_cars_score = 1 - df["cars_overall"].iloc[-1] / 100
-        speed_score = df.average_speed.mean()
-        social_score = df.low_income.iloc[-1] / 100
+        median_metrics = results[i][median_seeds[i]]
+        traffic_count = np.mean([m["Traffic Count"] for m in results[i].values()])
+        share_cruising = np.mean([m["Share Cruising"] for m in results[i].values()])
         wandb.log(
             {
-                "Occupancy": occup_score,
-                "Cars": n_cars_score,
-                "Speed": speed_score,
-                "Social": social_score,
-                "Traffic Count": np.mean(traffic_counter),
-                "Share Cruising": np.mean(share_cruising_counter),
-                "target_function": (1 - (abs(np.mean(traffic_counter) - 8400) / 8400))
-                * 1000
-                + ((1 - (abs(np.mean(share_cruising_counter) - 0.35) / 0.35)) * 250),
+                "Occupancy": median_metrics["Occupancy"],
+                "Cars": median_metrics["Cars"],
+                "Speed": median_metrics["Speed"],
+                "Social": median_metrics["Social"],
+                "Traffic Count": traffic_count,
+                "Share Cruising": share_cruising,
+                "target_function": (1 - (abs(traffic_count - 8400) / 8400)) * 1000
+                + ((1 - (abs(share_cruising - 0.35) / 0.35)) * 250),
             }
         )
-        delete_unused_episodes(outpath)
-    nl.kill_workspace()
+        run.finish()
 
 
 def get_median_performance(path: Path, df: pd.DataFrame, mode: str):
     """
-    Identifies worst, median and best episode of run. Renames them and saves plots.
+    Identifies median episode of run and moves it to the median directory.
     :param path: Path of current Experiment.
     :param df: DataFrame containing the results.
     :param mode: Usually either "training" or "evaluation".
-    :return:
+    :return: Summary scalars of median episode (see util.episode_summary).
     """
-    episode_files = glob(str(path) + "/E*.csv")
+    episode_files = glob(str(path) + "/E*.pkl")
     print(episode_files)
     median_performance = np.around(
         df.rewards.sort_values(ignore_index=True)[np.ceil(len(df) / 2) - 1], 8
@@ -165,10 +226,10 @@ def get_median_performance(path: Path, df: pd.DataFrame, mode: str):
         median_performance = 0
     found = False
     for episode in episode_files:
-        print(episode.split("_")[-1].split(".csv")[0])
+        print(episode.split("_")[-1].split(".pkl")[0])
         # Baseline
         if mode not in ["training", "eval"]:
-            if str(median_performance) == episode.split("_")[-1].split(".csv")[0]:
+            if str(median_performance) == episode.split("_")[-1].split(".pkl")[0]:
                 found = True
         elif str(median_performance) in episode:
             found = True
@@ -176,17 +237,44 @@ def get_median_performance(path: Path, df: pd.DataFrame, mode: str):
             new_path = path / mode / "median"
             new_path.mkdir(parents=True, exist_ok=True)
             print(episode)
-            data_df = get_data_from_run(episode)
+            summary = load_episode_summary(episode)
 
+            for extension in ["pkl", "levels"]:
+                if os.path.isfile(episode.replace("pkl", extension)):
+                    os.rename(
+                        episode.replace("pkl", extension),
+                        str(new_path / f"{mode}_median_{median_performance}.{extension}"),
+                    )
             os.rename(
-                episode, str(new_path / f"{mode}_median_{median_performance}.csv")
-            )
-            os.rename(
-                episode.replace("csv", "png"),
+                episode.replace("pkl", "png"),
                 str(new_path / f"view_{mode}_median_{median_performance}.png"),
             )
+            append_jsonl(
+                path / "episode_labels.jsonl",
+                {
+                    "episode": os.path.splitext(os.path.basename(episode))[0],
+                    "mode": mode,
+                    "metric": "median",
+                },
+            )
             episode_files.remove(episode)
-            return data_df
+            return summary
+
+
+def get_median_scores(path: Path, df: pd.DataFrame, mode: str):
+    """
+    Identifies median episode of run (see get_median_performance) and scores it.
+    :param path: Path of current Experiment.
+    :param df: DataFrame containing the results.
+    :param mode: Usually either "training" or "evaluation".
+    :return: Scores of median episode (see util.summary_scores), None if no documented episode is
+    named after the rounded median return.
+    """
+    summary = get_median_performance(path, df, mode)
+    if summary is None:
+        print(f"Median episode of {path} not found")
+        return None
+    return summary_scores(summary)
 
 
 if __name__ == "__main__":
@@ -202,6 +290,13 @@ if __name__ == "__main__":
         default=None,
         help="Path to NetLogo directory (for Linux Users)",
     )
+    parser.add_argument(
+        "-p",
+        "--num_parallel",
+        type=int,
+        default=None,
+        help="NetLogo worker processes to use, defaults to number of cores",
+    )
     add_bool_arg(parser, "gui", default=False)
     add_bool_arg(parser, "paper_config", default=False)
 
@@ -212,7 +307,9 @@ if __name__ == "__main__":
         "num_cars": list(range(300, 600, 25)),
         "lot_distribution_percentage": list(np.round(np.linspace(0.3, 1, 8), 2)),
         "target_start_occupancy": list(np.round(np.linspace(0.3, 1, 8), 2)),
-        "parking_cars_percentage": list(np.round(np.linspace(0.3, 1, 8), 2)),
+        "parking_cars_percentage_increment": list(
+            np.round(np.linspace(0.3, 1, 8), 2)
+        ),
         "num_garages": list(range(1, 4, 1)),
     }
 
@@ -223,4 +320,5 @@ if __name__ == "__main__":
         nl_path=args.nl_path,
         gui=args.gui,
         paper_config=args.paper_config,
+        num_parallel=args.num_parallel,
     )
@@ -2,40 +2,116 @@ import json
 import platform
 from argparse import ArgumentParser
 from datetime import datetime
+from multiprocessing import Pool
 from pathlib import Path
 
 import pandas as pd
 import numpy as np
 import pyNetLogo
-from tqdm import trange
+from tqdm import tqdm
 
-from util import add_bool_arg, document_episode, label_episodes, delete_unused_episodes
+from util import (
+    add_bool_arg,
+    document_episode,
+    label_episodes,
+    delete_unused_episodes,
+    load_seeds,
+)
 
 COLOURS = ["yellow", "green", "teal", "blue"]
 
+# NetLogo workspace of the current (worker) process
+nl = None
+# Columns of the rows recorded by record-metrics in Model.nlogo
+METRIC_COLUMNS = (
+    ["ticks"]
+    + [f"{c}_lot_fee" for c in COLOURS]
+    + [f"{c}_lot_occup" for c in COLOURS]
+    + ["overall_occup", "n_cars", "mean_speed", "normalized_share_low", "share_cruising"]
+)
 
-def run_baseline(
-    num_episodes: int,
-    model_size: str = "evaluation",
-    nl_path: str = None,
-    gui: bool = False,
-    static: bool = False,
-):
+
+def collect_metrics(nl):
     """
-    Runs baseline experiments and save results.
-    :param num_episodes: Number of episodes to run.
+    Fetches the per-tick metrics accumulated by the model with a single report call.
+    :param nl: NetLogo-Session of the episode.
+    :return: Array of shape (ticks, len(METRIC_COLUMNS)).
+    """
+    series = nl.report("reduce sentence metric-series")
+    return np.asarray(series, dtype=np.float64).reshape(-1, len(METRIC_COLUMNS))
+
+
+def summarize_metrics(series: np.ndarray):
+    """
+    Summarizes the per-tick metrics of an episode.
+    :param series: Array returned by collect_metrics.
+    :return: Dictionary of episode metrics.
+    """
+    columns = {name: series[:, i] for i, name in enumerate(METRIC_COLUMNS)}
+    summary = dict()
+    for c in COLOURS:
+        occup = columns[f"{c}_lot_occup"]
+        summary[f"{c}_lot_occup_mean"] = occup.mean()
+        summary[f"{c}_lot_in_target"] = np.mean((occup > 0.75) & (occup < 0.9))
+        summary[f"{c}_lot_fee_mean"] = columns[f"{c}_lot_fee"].mean()
+    summary["overall_occup_mean"] = columns["overall_occup"].mean()
+    summary["n_cars_final"] = columns["n_cars"][-1]
+    summary["mean_speed"] = columns["mean_speed"].mean()
+    summary["normalized_share_low_final"] = columns["normalized_share_low"][-1]
+    return summary
+
+
+def run_episode(nl, seed: int, gui: bool, static: bool, collect: bool):
+    """
+    Runs one seeded baseline episode.
+    :param nl: NetLogo-Session.
+    :param seed: Seed of the NetLogo random number generator.
+    :param gui: Whether or not NetLogo UI is shown during episodes.
+    :param static: Use static baseline.
+    :param collect: Whether per-tick metrics are accumulated in the model.
+    :return: Score, share cruising per hour, traffic counter and, if collected, per-tick metrics.
+    """
+    score = 0
+    episode_cruising = []
+    nl.command(f"random-seed {seed}")
+    nl.command("setup")
+    if collect:
+        nl.command("set collect-metrics? true")
+    # nl.command(f'set parking-cars-percentage {p(8) * 100}')
+    # Disable rendering of view
+    if not gui:
+        nl.command("no-display")
+    if static:
+        # Turn dynamic baseline pricing mechanism off
+        nl.command("set dynamic-pricing-baseline false")
+        for c in COLOURS:
+            if c in ["yellow", "green"]:
+                nl.command(f"change-fee-free {c}-lot 3.6")
+            else:
+                nl.command(f"change-fee-free {c}-lot 1.8")
+    nl.command("ask one-of cars [record-data]")
+    for _ in range(24):
+        nl.repeat_command("go", 900)
+        episode_cruising.append(nl.report("share-cruising"))
+        for c in COLOURS:
+            occup = nl.report(f"{c}-lot-current-occup")
+            if 0.75 < occup < 0.9:
+                score += 0.25
+    traffic = nl.report("traffic-counter")
+    if collect:
+        return score, episode_cruising, traffic, collect_metrics(nl)
+    return score, episode_cruising, traffic
+
+
+def init_worker(model_size: str, nl_path: str = None, gui: bool = False):
+    """
+    Starts and configures the NetLogo workspace of the current (worker) process.
     :param model_size: Model size to run experiments with, either "training" or "evaluation".
     :param nl_path: Path to NetLogo Installation (for Linux users)
     :param gui: Whether or not NetLogo UI is shown during episodes.
-    :param static: Use static baseline.
     :return:
     """
-    timestamp = datetime.now().strftime("%y%m-%d-%H%M")
-    outpath = (
-        Path(".").absolute().parent
-        / f"Experiments/baseline {'static' if static else 'dynamic'}"
-        / timestamp
-    )
+    global nl
     # Connect to NetLogo
     if platform.system() == "Linux":
         nl = pyNetLogo.NetLogoLink(gui=gui, netlogo_home=nl_path, netlogo_version="6.2")
@@ -62,41 +138,139 @@ def run_baseline(
         f'set target-start-occupancy {model_config[model_size]["target_start_occupancy"]}'
     )
 
-    traffic_counter = []
-    share_cruising_counter = []
+
+def run_seeded_episode(job: tuple):
+    """
+    Runs one seeded episode in the workspace of the current process.
+    :param job: Tuple of episode index, seed, static, collect, gui and output path (None if the
+        episode is not exported).
+    :return: Tuple of episode index, seed, score, mean share cruising, traffic counter and metric
+        summary (None if not collected).
+    """
+    index, seed, static, collect, gui, outpath = job
+    episode = run_episode(nl, seed=seed, gui=gui, static=static, collect=collect)
+    score, episode_cruising, traffic = episode[:3]
+    if outpath is not None:
+        document_episode(nl=nl, path=outpath, reward_sum=score)
+    summary = summarize_metrics(episode[3]) if collect else None
+    return index, seed, score, np.mean(episode_cruising), traffic, summary
+
+
+def map_episodes(pool, jobs: list):
+    """
+    Runs seeded episode jobs on the worker pool, or in this process if there is none.
+    :param pool: Pool of NetLogo worker processes, None to run in this process.
+    :param jobs: Jobs of run_seeded_episode.
+    :return: Iterator over the results of the jobs (unordered on a pool).
+    """
+    if pool is None:
+        return map(run_seeded_episode, jobs)
+    return pool.imap_unordered(run_seeded_episode, jobs)
+
+
+def run_baseline(
+    num_episodes: int,
+    model_size: str = "evaluation",
+    nl_path: str = None,
+    gui: bool = False,
+    static: bool = False,
+    collect: bool = True,
+    seed: int = 0,
+    seeds: list = None,
+    num_parallel: int = 1,
+):
+    """
+    Runs baseline experiments and save results.
+    :param num_episodes: Number of episodes to run.
+    :param model_size: Model size to run experiments with, either "training" or "evaluation".
+    :param nl_path: Path to NetLogo Installation (for Linux users)
+    :param gui: Whether or not NetLogo UI is shown during episodes.
+    :param static: Use static baseline.
+    :param collect: Collect metrics in memory and only export the min, median and max episodes
+        (re-run from their seeds) instead of exporting every episode.
+    :param seed: Seed of the first episode (episode i uses seed + i), unless seeds are given.
+    :param seeds: Explicit per-episode seeds (e.g. shared with RL evaluation runs).
+    :param num_parallel: Number of NetLogo worker processes to fan episodes out over.
+    :return:
+    """
+    assert collect or num_parallel == 1, "Exporting every episode requires num_parallel 1"
+    if seeds is None:
+        seeds = [seed + i for i in range(num_episodes)]
+    else:
+        seeds = list(seeds)[:num_episodes]
+        num_episodes = len(seeds)
+
+    timestamp = datetime.now().strftime("%y%m-%d-%H%M")
+    outpath = (
+        Path(".").absolute().parent
+        / f"Experiments/baseline {'static' if static else 'dynamic'}"
+        / timestamp
+    )
+
+    # Episodes are fanned out over worker processes with warm NetLogo workspaces
+    pool = None
+    if num_parallel > 1:
+        pool = Pool(
+            processes=num_parallel,
+            initializer=init_worker,
+            initargs=(model_size, nl_path, gui),
+        )
+    else:
+        init_worker(model_size, nl_path, gui)
+
+    traffic_counter = [0] * num_episodes
+    share_cruising_counter = [0] * num_episodes
     scores = [0] * num_episodes
+    summaries = [None] * num_episodes
+
+    try:
+        jobs = [
+            (i, seeds[i], static, collect, gui, None if collect else outpath)
+            for i in range(num_episodes)
+        ]
+        for i, _, score, share_cruising, traffic, summary in tqdm(
+            map_episodes(pool, jobs), total=num_episodes
+        ):
+            scores[i] = score
+            share_cruising_counter[i] = share_cruising
+            traffic_counter[i] = traffic
+            summaries[i] = summary
+
+        if collect:
+            # Export only the episodes labelled below, reproduced from their seeds
+            ranking = np.argsort(scores, kind="stable")
+            labelled = {
+                ranking[0],
+                ranking[-1],
+                ranking[int(np.ceil(num_episodes / 2)) - 1],
+            }
+            label_jobs = [
+                (i, seeds[i], static, False, gui, outpath) for i in sorted(labelled)
+            ]
+            list(map_episodes(pool, label_jobs))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        else:
+            nl.kill_workspace()
+
+    # One consolidated table with per-seed metrics, and the seeds for RL evaluation runs
+    outpath.mkdir(parents=True, exist_ok=True)
+    results_df = pd.DataFrame(
+        {
+            "seed": seeds,
+            "rewards": scores,
+            "traffic_counter": traffic_counter,
+            "share_cruising": share_cruising_counter,
+        }
+    )
+    if collect:
+        results_df = results_df.join(pd.DataFrame(summaries))
+    results_df.to_csv(outpath / "results.csv", index_label="episode")
+    with open(outpath / "seeds.json", "w") as fp:
+        json.dump(seeds, fp)
 
-    for i in trange(num_episodes):
-        episode_cruising = []
-        nl.command("setup")
-        # nl.command(f'set parking-cars-percentage {p(8) * 100}')
-        # Disable rendering of view
-        if not gui:
-            nl.command("no-display")
-        if static:
-            # Turn dynamic baseline pricing mechanism off
-            nl.command("set dynamic-pricing-baseline false")
-            for c in COLOURS:
-                if c in ["yellow", "green"]:
-                    nl.command(f"change-fee-free {c}-lot 3.6")
-                else:
-                    nl.command(f"change-fee-free {c}-lot 1.8")
-        nl.command("ask one-of cars [record-data]")
-        for _ in range(24):
-            nl.repeat_command("go", 900)
-            episode_cruising.append(nl.report("share-cruising"))
-            for c in COLOURS:
-                occup = nl.report(f"{c}-lot-current-occup")
-                if 0.75 < occup < 0.9:
-                    scores[i] += 0.25
-        document_episode(nl=nl, path=outpath, reward_sum=scores[i])
-        traffic_counter.append(nl.report("traffic-counter"))
-        share_cruising_counter.append(np.mean(episode_cruising))
-        print(i)
-        print(share_cruising_counter)
-        print(traffic_counter)
-
-    nl.kill_workspace()
     metrics_df = pd.DataFrame(scores, columns=["rewards"])
     label_episodes(outpath, metrics_df, "standard")
     delete_unused_episodes(outpath)
@@ -124,7 +298,21 @@ if __name__ == "__main__":
         help="Path to NetLogo directory (for Linux Users)",
     )
     add_bool_arg(parser, "gui", default=False)
+    parser.add_argument(
+        "-s", "--seed", type=int, default=0, help="Seed of the first episode"
+    )
+    parser.add_argument(
+        "-sf",
+        "--seed_file",
+        type=str,
+        default=None,
+        help="JSON file with per-episode seeds (e.g. seeds.json of a previous baseline)",
+    )
+    parser.add_argument(
+        "-p", "--num_parallel", type=int, default=1, help="CPU cores to use"
+    )
     add_bool_arg(parser, "static", default=False)
+    add_bool_arg(parser, "collect", default=True)
 
     args = parser.parse_args()
     print(f" Baseline called with arguments: {vars(args)}")
@@ -135,4 +323,8 @@ if __name__ == "__main__":
         nl_path=args.nl_path,
         gui=args.gui,
         static=args.static,
+        collect=args.collect,
+        seed=args.seed,
+        seeds=None if args.seed_file is None else load_seeds(args.seed_file),
+        num_parallel=args.num_parallel,
     )
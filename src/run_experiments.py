@@ -1,7 +1,7 @@
 import sys
 from argparse import ArgumentParser
 
-from util import add_bool_arg
+from util import add_bool_arg, load_seeds
 
 sys.path.append("./external")
 
@@ -39,13 +39,102 @@ if __name__ == "__main__":
         default=None,
         help="Path to NetLogo directory (for Linux Users)",
     )
+    parser.add_argument(
+        "-bs",
+        "--batch_min_size",
+        type=int,
+        default=None,
+        help="Minimum number of ready environments per batched agent call",
+    )
+    parser.add_argument(
+        "-bw",
+        "--batch_max_wait",
+        type=float,
+        default=None,
+        help="Seconds to wait for all environments before acting on a minimum batch",
+    )
+    parser.add_argument(
+        "-rg",
+        "--registry",
+        type=str,
+        default=None,
+        help="Address (host:port) of environment registry to lease remote environments from",
+    )
+    parser.add_argument(
+        "-sf",
+        "--seed_file",
+        type=str,
+        default=None,
+        help="JSON file with per-episode seeds (e.g. seeds.json of a baseline run)",
+    )
+    parser.add_argument(
+        "-rs",
+        "--run_seed",
+        type=int,
+        default=None,
+        help="Seed of run to derive agent, process and episode seeds from",
+    )
+    parser.add_argument(
+        "-wj",
+        "--workspaces_per_jvm",
+        type=int,
+        default=1,
+        help="Parallel environments running as NetLogo workspaces in one JVM process",
+    )
+    parser.add_argument(
+        "-di",
+        "--decision_interval",
+        type=int,
+        default=30,
+        help="Simulated minutes between fee adjustments (e.g. 15, 30, 60 or 120)",
+    )
+    parser.add_argument(
+        "-ar",
+        "--action_repeat",
+        type=int,
+        default=1,
+        help="Number of decision intervals the fees of an action are kept for",
+    )
+    parser.add_argument(
+        "-mi",
+        "--memory_interval",
+        type=int,
+        default=None,
+        help="Episodes between allocation diffs of memory records, not monitored by default",
+    )
+    parser.add_argument(
+        "-mc",
+        "--memory_ceiling",
+        type=float,
+        default=None,
+        help="Resident memory (MB) above which an environment process is recycled",
+    )
+    parser.add_argument(
+        "-pt",
+        "--pretrain_traces",
+        type=str,
+        default=None,
+        help="Directory of trace shards (e.g. of a baseline run) to pretrain a new agent on",
+    )
+    parser.add_argument(
+        "-pi",
+        "--pretrain_iterations",
+        type=int,
+        default=100,
+        help="Number of pretraining iterations (one update per trace shard)",
+    )
     add_bool_arg(parser, "batch_agent_calls")
     add_bool_arg(parser, "sync_episodes")
     add_bool_arg(parser, "document", default=True)
     add_bool_arg(parser, "adjust_free", default=True)
     add_bool_arg(parser, "eval", default=False)
     add_bool_arg(parser, "zip", default=False)
+    add_bool_arg(parser, "archive", default=False)
+    add_bool_arg(parser, "recompress", default=False)
     add_bool_arg(parser, "gui", default=False)
+    add_bool_arg(parser, "manage_resources", default=True)
+    add_bool_arg(parser, "affinity", default=False)
+    add_bool_arg(parser, "record_traces", default=False)
 
     args = parser.parse_args()
     print(f" Experiment called with arguments: {vars(args)}")
@@ -55,6 +144,8 @@ if __name__ == "__main__":
         num_episodes=args.episodes,
         batch_agent_calls=args.batch_agent_calls,
         sync_episodes=args.sync_episodes,
+        batch_min_size=args.batch_min_size,
+        batch_max_wait=args.batch_max_wait,
         num_parallel=args.num_parallel,
         reward_key=args.reward_key,
         document=args.document,
@@ -62,9 +153,24 @@ if __name__ == "__main__":
         checkpoint=args.checkpoint,
         eval=args.eval,
         zip=args.zip,
+        archive=args.archive,
+        recompress=args.recompress,
         model_size=args.model_size,
         nl_path=args.nl_path,
         gui=args.gui,
+        registry=args.registry,
+        seeds=None if args.seed_file is None else load_seeds(args.seed_file),
+        run_seed=args.run_seed,
+        manage_resources=args.manage_resources,
+        affinity=args.affinity,
+        workspaces_per_jvm=args.workspaces_per_jvm,
+        decision_interval=args.decision_interval,
+        action_repeat=args.action_repeat,
+        memory_interval=args.memory_interval,
+        memory_ceiling=args.memory_ceiling,
+        record_traces=args.record_traces,
+        pretrain_traces=args.pretrain_traces,
+        pretrain_iterations=args.pretrain_iterations,
         args=vars(args),
     )
     experiment.run()
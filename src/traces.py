@@ -0,0 +1,136 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Environment settings of the traces in a directory, which pretrained agents have to match
+TRACE_SPEC = "trace-spec.json"
+TRACE_SPEC_KEYS = ["reward_key", "adjust_free", "decision_interval", "action_repeat"]
+
+
+class TraceWriter:
+    def __init__(self, directory: Path, episodes_per_shard: int = 10):
+        """
+        Records the episodes of an environment as experience traces in the format of Tensorforce's
+        Recorder (compressed .npz shards of several episodes), which Agent.pretrain reads.
+        Environments of the same run write into one directory, each with its own shard prefix.
+        States with action masks (incremental fee actions) are written as states/state and
+        auxiliaries/<colour>/mask, which Agent.pretrain turns into the <colour>_mask states.
+        :param directory: Directory of trace shards.
+        :param episodes_per_shard: Number of episodes per shard.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.episodes_per_shard = episodes_per_shard
+        self.prefix = f"trace-{uuid.uuid4().hex[:8]}"
+        self.num_shards = 0
+        # Steps (state, actions, reward, terminal) of finished episodes and the current one
+        self.episodes = []
+        self.steps = []
+        self.state = None
+
+    def reset(self, state):
+        """
+        Starts a new episode, dropping the steps of an unfinished one.
+        :param state: Initial state of episode (array, or dict of state and action masks).
+        :return:
+        """
+        self.steps = []
+        self.state = state
+
+    def record(self, actions: dict, reward: float, terminal: bool, next_state):
+        """
+        Records one timestep, i.e. the actions taken in the current state and their outcome.
+        :param actions: Actions per colour.
+        :param reward: Reward of timestep.
+        :param terminal: Whether the episode ended.
+        :param next_state: State after timestep.
+        :return:
+        """
+        self.steps.append((self.state, actions, reward, terminal))
+        self.state = next_state
+        if terminal:
+            self.episodes.append(self.steps)
+            self.steps = []
+            if len(self.episodes) >= self.episodes_per_shard:
+                self.write()
+
+    def write(self):
+        """
+        Writes the finished episodes to a new shard.
+        :return:
+        """
+        if len(self.episodes) == 0:
+            return
+        steps = [step for episode in self.episodes for step in episode]
+        arrays = {
+            "terminal": np.asarray([int(step[3]) for step in steps], dtype=np.int64),
+            "reward": np.asarray([step[2] for step in steps], dtype=np.float32),
+        }
+        if isinstance(steps[0][0], dict):
+            # Pretraining adds the masks to a states dict, so the state is named
+            arrays["states/state"] = np.asarray(
+                [step[0]["state"] for step in steps], dtype=np.float32
+            )
+            for name in steps[0][0]:
+                if name.endswith("_mask"):
+                    arrays[f"auxiliaries/{name[:-5]}/mask"] = np.asarray(
+                        [step[0][name] for step in steps], dtype=bool
+                    )
+        else:
+            arrays["states"] = np.asarray([step[0] for step in steps], dtype=np.float32)
+        for name in steps[0][1]:
+            arrays[f"actions/{name}"] = np.asarray(
+                [int(step[1][name]) for step in steps], dtype=np.int64
+            )
+        path = self.directory / f"{self.prefix}-{self.num_shards:06d}.npz"
+        # Shards appear complete to pretraining and archiving
+        tmp_path = path.with_suffix(".tmp")
+        with open(str(tmp_path), "wb") as fp:
+            np.savez_compressed(fp, **arrays)
+        os.replace(str(tmp_path), str(path))
+        self.num_shards += 1
+        self.episodes = []
+
+    def close(self):
+        self.write()
+
+
+def write_trace_spec(directory: Path, env_kwargs: dict):
+    """
+    Writes the environment settings of the traces of a directory.
+    :param directory: Directory of trace shards.
+    :param env_kwargs: Arguments of the recording environments.
+    :return:
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(str(directory / TRACE_SPEC), "w") as fp:
+        json.dump({key: env_kwargs[key] for key in TRACE_SPEC_KEYS}, fp)
+
+
+def check_trace_spec(directory: Path, env_kwargs: dict):
+    """
+    Checks that the traces of a directory were recorded with the states, actions, episode length
+    and reward of the environments of an agent to pretrain.
+    :param directory: Directory of trace shards.
+    :param env_kwargs: Arguments of the environments of the agent.
+    :return:
+    """
+    directory = Path(directory)
+    if not any(directory.glob("*.npz")):
+        raise ValueError(f"No trace shards in {directory}")
+    if not (directory / TRACE_SPEC).is_file():
+        print(f"No {TRACE_SPEC} in {directory}, environment settings are not checked")
+        return
+    with open(str(directory / TRACE_SPEC), "r") as fp:
+        spec = json.load(fp=fp)
+    for key in TRACE_SPEC_KEYS:
+        if key in spec and spec[key] != env_kwargs[key]:
+            raise ValueError(
+                f"Traces in {directory} were recorded with {key}={spec[key]}, "
+                f"not {env_kwargs[key]}"
+            )
+
@@ -19,7 +19,7 @@ from util import (
     delete_unused_episodes,
     get_data_from_run,
 )
-from robustness_check import get_median_performance
+from robustness_check import get_median_scores
 
 Z = [-5.58662028e-04, 2.76514862e-02, -4.09343614e-01, 2.31844786e00]
 COLOURS = ["yellow", "green", "teal", "blue"]
@@ -80,15 +80,21 @@ def train():
         share_cruising_counter.append(np.mean(episode_cruising))
 
     metrics_df = pd.DataFrame(scores, columns=["rewards"])
-    df = get_median_performance(outpath, metrics_df, "standard")
-    occup_score = 0
-    for c in ["yellow", "green", "teal", "blue"]:
-        occup_score += (
-            len(df[(df[f"{c}_lot_occup"] > 75) & (df[f"{c}_lot_occup"] < 90)]) / len(df)
-        ) * 0.25
-    n_cars_score = 1 - df["cars_overall"].iloc[-1] / 100
-    speed_score = df.average_speed.mean()
-    social_score = df.low_income.iloc[-1] / 100
+    scores = get_median_scores(outpath, metrics_df, "standard")
+    if scores is None:
+        wandb.log(
+            {
+                "Traffic Count": np.mean(traffic_counter),
+                "Share Cruising": np.mean(share_cruising_counter),
+            }
+        )
+        delete_unused_episodes(outpath)
+        nl.kill_workspace()
+        return
+    occup_score = scores["occupancy"]
+    n_cars_score = scores["cars"]
+    speed_score = scores["speed"]
+    social_score = scores["social"] / 100
     wandb.log(
         {
             "Occupancy": occup_score,
@@ -5,12 +5,16 @@ from argparse import ArgumentParser
 from datetime import datetime
 from pathlib import Path
 from glob import glob
+from multiprocessing import Pool
 
 import wandb
 import pandas as pd
 import numpy as np
 import pyNetLogo
 from tqdm import tqdm, trange
+from scipy.stats import norm
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
 from sklearn.metrics.pairwise import euclidean_distances
 
 from util import (
@@ -19,11 +23,31 @@ from util import (
     delete_unused_episodes,
     get_data_from_run,
 )
-from robustness_check import get_median_performance
+from robustness_check import get_median_scores, init_worker, run_episode
 
 Z = [-5.58662028e-04, 2.76514862e-02, -4.09343614e-01, 2.31844786e00]
 COLOURS = ["yellow", "green", "teal", "blue"]
 
+# Target metrics (cars, occupancy, share cruising, social, speed) of the calibration
+EVAL_VEC = np.array(
+    [
+        0.019966722129783676,
+        0.0600087958890792,
+        0.5635815586761667,
+        0.22410865874363328,
+        0.1665297264211474,
+    ]
+).reshape(1, -1)
+
+# Search space of the calibration (lower, upper, integer)
+CALIBRATION_BOUNDS = {
+    "num_cars": (200, 600, True),
+    "target_start_occupancy": (0.3, 1.0, False),
+    "num_garages": (1, 3, True),
+    "lot_distribution_percentage": (0.3, 1.0, False),
+    "parking_cars_percentage_increment": (0.0, 1.0, False),
+}
+
 
 def train():
     # Connect to NetLogo
@@ -98,24 +122,22 @@ def train():
         share_cruising_counter.append(np.mean(episode_cruising))
 
     metrics_df = pd.DataFrame(scores, columns=["rewards"])
-    df = get_median_performance(outpath, metrics_df, "standard")
-    occup_score = 0
-    for c in ["yellow", "green", "teal", "blue"]:
-        occup_score += (
-            len(df[(df[f"{c}_lot_occup"] > 75) & (df[f"{c}_lot_occup"] < 90)]) / len(df)
-        ) * 0.25
-    n_cars_score = 1 - df["cars_overall"].iloc[-1] / 100
-    speed_score = df.average_speed.mean()
-    social_score = df.low_income.iloc[-1] / 100
-    eval_vec = np.array(
-        [
-            0.019966722129783676,
-            0.0600087958890792,
-            0.5635815586761667,
-            0.22410865874363328,
-            0.1665297264211474,
-        ]
-    ).reshape(1, -1)
+    scores = get_median_scores(outpath, metrics_df, "standard")
+    if scores is None:
+        wandb.log(
+            {
+                "Traffic Count": np.mean(traffic_counter),
+                "Share Cruising": np.mean(share_cruising_counter),
+            }
+        )
+        delete_unused_episodes(outpath)
+        nl.kill_workspace()
+        return
+    occup_score = scores["occupancy"]
+    n_cars_score = scores["cars"]
+    speed_score = scores["speed"]
+    social_score = scores["social"] / 100
+    eval_vec = EVAL_VEC
     train_vec = np.array(
         [
             n_cars_score,
@@ -143,5 +165,209 @@ def train():
     nl.kill_workspace()
 
 
+def to_config(x: np.ndarray):
+    """
+    Maps a point of the unit cube to a model configuration.
+    :param x: Point in [0, 1]^d, ordered as CALIBRATION_BOUNDS.
+    :return: Configuration dictionary.
+    """
+    config = dict()
+    for value, (name, (lower, upper, integer)) in zip(x, CALIBRATION_BOUNDS.items()):
+        value = lower + value * (upper - lower)
+        config[name] = int(round(value)) if integer else float(value)
+    return config
+
+
+def expected_improvement(gp, candidates: np.ndarray, best: float, xi: float = 0.01):
+    """
+    Expected improvement (for minimization) of the candidates under the surrogate.
+    :param gp: Fitted GaussianProcessRegressor.
+    :param candidates: Candidate points.
+    :param best: Lowest distance observed so far.
+    :param xi: Exploration margin.
+    :return: Expected improvement per candidate.
+    """
+    mean, std = gp.predict(candidates, return_std=True)
+    std = np.maximum(std, 1e-9)
+    z = (best - mean - xi) / std
+    return (best - mean - xi) * norm.cdf(z) + std * norm.pdf(z)
+
+
+def calibrate(
+    num_episodes: int = 5,
+    num_initial: int = 8,
+    num_iterations: int = 10,
+    batch_size: int = None,
+    target_distance: float = None,
+    nl_path: str = None,
+    num_parallel: int = None,
+    seed: int = 0,
+):
+    """
+    Calibrates the model to EVAL_VEC by Bayesian optimization with a Gaussian process surrogate,
+    proposing batches by expected improvement and evaluating their episodes in parallel (runs
+    without wandb).
+    :param num_episodes: Number of episodes (seeds) per evaluated configuration.
+    :param num_initial: Number of random configurations before fitting the surrogate.
+    :param num_iterations: Number of proposed batches.
+    :param batch_size: Configurations per batch (defaults to as many as fill the workers).
+    :param target_distance: Stop once the (scaled) target distance falls below this value.
+    :param nl_path: Path to NetLogo Installation (for Linux users)
+    :param num_parallel: Number of NetLogo worker processes (defaults to number of cores).
+    :param seed: Seed of the candidate sampling.
+    :return: Best configuration and its distance.
+    """
+    with open("model_config.json", "r") as fp:
+        model_config = json.load(fp=fp)
+    max_x_cor = model_config["training"]["max_x_cor"]
+    max_y_cor = model_config["training"]["max_y_cor"]
+
+    num_parallel = num_parallel or os.cpu_count() or 1
+    if batch_size is None:
+        batch_size = max(1, num_parallel // num_episodes)
+    rng = np.random.default_rng(seed)
+    dims = len(CALIBRATION_BOUNDS)
+
+    timestamp = datetime.now().strftime("%y%m-%d-%H%M")
+    outpath = Path(".").absolute().parent / "Experiments/calibration" / timestamp
+    outpath.mkdir(parents=True, exist_ok=True)
+
+    points = list()
+    distances = list()
+    history = list()
+
+    with Pool(
+        processes=num_parallel,
+        initializer=init_worker,
+        initargs=(nl_path, False, max_x_cor, max_y_cor),
+    ) as pool:
+
+        def evaluate(batch: np.ndarray):
+            configs = [to_config(x) for x in batch]
+            jobs = [
+                (i, config, episode, None)
+                for i, config in enumerate(configs)
+                for episode in range(num_episodes)
+            ]
+            results = [dict() for _ in configs]
+            for i, episode, metrics in pool.imap_unordered(run_episode, jobs):
+                results[i][episode] = metrics
+            for x, config, result in zip(batch, configs, results):
+                # Median episode by traffic count, as in train()
+                episodes = sorted(result, key=lambda e: result[e]["Traffic Count"])
+                median = result[episodes[int(np.ceil(len(episodes) / 2)) - 1]]
+                train_vec = np.array(
+                    [
+                        median["Cars"],
+                        median["Occupancy"],
+                        np.mean([m["Share Cruising"] for m in result.values()]),
+                        median["Social"],
+                        median["Speed"],
+                    ]
+                ).reshape(1, -1)
+                distance = float(euclidean_distances(EVAL_VEC, train_vec)[0, 0] * 1000)
+                points.append(x)
+                distances.append(distance)
+                history.append(dict(config=config, distance=distance))
+                print(f"{config}: {distance:.2f}")
+
+        evaluate(rng.random((num_initial, dims)))
+        for _ in trange(num_iterations, desc="Calibration batches"):
+            if target_distance is not None and min(distances) <= target_distance:
+                break
+            gp = GaussianProcessRegressor(
+                kernel=ConstantKernel() * Matern(nu=2.5, length_scale=np.ones(dims))
+                + WhiteKernel(),
+                normalize_y=True,
+                n_restarts_optimizer=2,
+                random_state=seed,
+            )
+            # Batch by kriging believer: proposed points count as observed at their mean
+            batch = list()
+            X = np.array(points)
+            y = np.array(distances)
+            for _ in range(batch_size):
+                gp.fit(X, y)
+                candidates = rng.random((2048, dims))
+                ei = expected_improvement(gp, candidates, best=y.min())
+                x = candidates[np.argmax(ei)]
+                batch.append(x)
+                X = np.vstack([X, x])
+                y = np.append(y, gp.predict(x.reshape(1, -1))[0])
+            evaluate(np.array(batch))
+
+    best = int(np.argmin(distances))
+    with open(outpath / "calibration.json", "w") as fp:
+        json.dump(
+            dict(
+                history=history,
+                best=history[best],
+                num_simulated_episodes=len(history) * num_episodes,
+            ),
+            fp,
+        )
+    print(f"Best configuration: {history[best]['config']}")
+    print(f"Target distance: {distances[best]:.2f}")
+    print(f"Simulated episodes: {len(history) * num_episodes}")
+    return history[best]["config"], distances[best]
+
+
 if __name__ == "__main__":
-    train()
+    parser = ArgumentParser()
+    add_bool_arg(parser, "calibrate", default=False)
+    parser.add_argument(
+        "-e", "--episodes", type=int, default=5, help="Episodes per configuration"
+    )
+    parser.add_argument(
+        "-ni",
+        "--num_initial",
+        type=int,
+        default=8,
+        help="Random configurations before fitting the surrogate",
+    )
+    parser.add_argument(
+        "-i", "--iterations", type=int, default=10, help="Number of proposed batches"
+    )
+    parser.add_argument(
+        "-b",
+        "--batch_size",
+        type=int,
+        default=None,
+        help="Configurations per batch, defaults to as many as fill the workers",
+    )
+    parser.add_argument(
+        "-t",
+        "--target_distance",
+        type=float,
+        default=None,
+        help="Stop once the target distance falls below this value",
+    )
+    parser.add_argument(
+        "-p",
+        "--num_parallel",
+        type=int,
+        default=None,
+        help="NetLogo worker processes to use, defaults to number of cores",
+    )
+    parser.add_argument(
+        "-np",
+        "--nl_path",
+        type=str,
+        default=None,
+        help="Path to NetLogo directory (for Linux Users)",
+    )
+    # Sweep agents pass the sampled configuration as further arguments
+    args, _ = parser.parse_known_args()
+
+    if args.calibrate:
+        calibrate(
+            num_episodes=args.episodes,
+            num_initial=args.num_initial,
+            num_iterations=args.iterations,
+            batch_size=args.batch_size,
+            target_distance=args.target_distance,
+            nl_path=args.nl_path,
+            num_parallel=args.num_parallel,
+        )
+    else:
+        train()
@@ -14,13 +14,18 @@
 # ==============================================================================
 
 import argparse
+import hashlib
 import importlib
 import json
 import math
 import os
 import pickle
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
 
 sys.path.append("./external")
 
@@ -32,8 +37,10 @@ from hpbandster.core.worker import Worker
 from hpbandster.optimizers import BOHB
 
 from external.tensorforce import Runner, util
+from external.tensorforce.environments import SocketEnvironment
 
-from util import add_bool_arg
+from resources import apply_agent_resources, plan_resources
+from util import add_bool_arg, episode_timesteps
 
 
 class TensorforceWorker(Worker):
@@ -51,6 +58,15 @@ class TensorforceWorker(Worker):
         num_parallel=None,
         nl_path: str = None,
         adjust_free=False,
+        registry: str = None,
+        concurrent_runs: int = 1,
+        pruning: dict = None,
+        continuation: bool = False,
+        model_size: str = "training",
+        cache_dir: str = None,
+        run_cores: int = None,
+        decision_interval: int = 30,
+        action_repeat: int = 1,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -65,6 +81,15 @@ class TensorforceWorker(Worker):
         self.timestamp = timestamp
         self.nl_path = nl_path
         self.adjust_free = adjust_free
+        self.registry = registry
+        self.concurrent_runs = concurrent_runs
+        self.pruning = pruning
+        self.continuation = continuation
+        self.model_size = model_size
+        self.cache = None if cache_dir is None else ResultCache(directory=cache_dir)
+        self.run_cores = run_cores
+        self.decision_interval = decision_interval
+        self.action_repeat = action_repeat
 
     def compute(self, config_id, config, budget, working_directory):
         budget = math.log(budget, self.base)
@@ -79,54 +104,137 @@ class TensorforceWorker(Worker):
         else:
             entropy_regularization = config["entropy_regularization"]
         agent = config
-        average_reward = list()
-        final_reward = list()
-        rewards = list()
 
         env_kwargs = {
             "timestamp": self.timestamp,
             "reward_key": self.reward_key,
             "document": False,
             "adjust_free": self.adjust_free,
+            "model_size": self.model_size,
             "nl_path": self.nl_path,
+            "decision_interval": self.decision_interval,
+            "action_repeat": self.action_repeat,
         }
         print(f"Model Config: {env_kwargs}")
 
-        for n in range(num_runs):
-            if self.num_parallel is None:
-                runner = Runner(
-                    agent=agent,
+        if self.cache is not None:
+            cache_key = self.cache.key(
+                config=config,
+                budget=budget,
+                settings=dict(
                     environment=self.environment,
                     max_episode_timesteps=self.max_episode_timesteps,
-                    **env_kwargs,
-                )
-                runner.run(num_episodes=self.num_episodes, use_tqdm=True)
-            else:
-                runner = Runner(
-                    agent=agent,
-                    environment=self.environment,
-                    max_episode_timesteps=self.max_episode_timesteps,
-                    num_parallel=min(self.num_parallel, config["batch_size"]),
-                    remote="multiprocessing",
-                    **env_kwargs,
-                )
-                runner.run(
                     num_episodes=self.num_episodes,
-                    batch_agent_calls=True,
-                    sync_episodes=True,
-                    use_tqdm=True,
-                )
-            runner.close()
-
-            average_reward.append(float(np.mean(runner.episode_returns, axis=0)))
-            final_reward.append(float(np.mean(runner.episode_returns[-20:], axis=0)))
-            rewards.append(list(runner.episode_returns))
+                    runs_per_round=self.runs_per_round,
+                    reward_key=self.reward_key,
+                    adjust_free=self.adjust_free,
+                    model_size=self.model_size,
+                    decision_interval=self.decision_interval,
+                    action_repeat=self.action_repeat,
+                    pruning=self.pruning,
+                    num_parallel=self.num_parallel,
+                    registry=self.registry,
+                ),
+            )
+            cached = self.cache.get(key=cache_key)
+            if cached is not None:
+                print(f"Cached result for configuration {config_id}")
+                # Nothing simulated or scheduled for this evaluation
+                info = {
+                    name: value
+                    for name, value in cached["info"].items()
+                    if name not in ("schedule", "pruned_runs", "episodes_saved")
+                }
+                info.update(cached=True, simulated_episodes=0, reused_episodes=0)
+                return dict(loss=cached["loss"], info=info)
+
+        num_parallel = self.num_parallel
+        if num_parallel is not None:
+            num_parallel = min(num_parallel, config["batch_size"])
+        trial_kwargs = dict(
+            agent=agent,
+            environment=self.environment,
+            max_episode_timesteps=self.max_episode_timesteps,
+            num_episodes=self.num_episodes,
+            num_parallel=num_parallel,
+            registry=self.registry,
+            env_kwargs=env_kwargs,
+        )
+        if self.run_cores is not None and self.registry is None:
+            # Thread pools and JVMs of each concurrent run sized to its share of the cores
+            trial_kwargs["resources"] = plan_resources(
+                num_parallel or 1, num_cores=self.run_cores
+            )
+        if self.pruning is not None:
+            trial_kwargs["pruning"] = dict(
+                self.pruning,
+                curves_path=os.path.join(working_directory, "learning_curves.jsonl"),
+            )
+
+        if self.continuation:
+            config_dir = os.path.join(
+                working_directory,
+                "continuation",
+                "config-" + "_".join(str(x) for x in config_id),
+            )
+            trial_kwargs_list = [
+                dict(trial_kwargs, continuation_dir=os.path.join(config_dir, f"run-{n}"))
+                for n in range(num_runs)
+            ]
+        else:
+            trial_kwargs_list = [trial_kwargs for _ in range(num_runs)]
+
+        # Independent runs of a budget are fanned out over concurrent processes
+        compute_start = time.time()
+        num_concurrent = min(self.concurrent_runs, num_runs)
+        if num_concurrent > 1:
+            with ProcessPoolExecutor(
+                max_workers=num_concurrent, mp_context=get_context("spawn")
+            ) as executor:
+                futures = [
+                    executor.submit(run_trial, **kwargs) for kwargs in trial_kwargs_list
+                ]
+                trials = [future.result() for future in futures]
+        else:
+            trials = [run_trial(**kwargs) for kwargs in trial_kwargs_list]
+
+        average_reward = [trial["average_reward"] for trial in trials]
+        final_reward = [trial["final_reward"] for trial in trials]
+        rewards = [trial["rewards"] for trial in trials]
+        num_pruned = sum(trial["pruned"] for trial in trials)
+        episodes_saved = sum(self.num_episodes - trial["episodes"] for trial in trials)
+        simulated_episodes = sum(trial["simulated_episodes"] for trial in trials)
+        reused_episodes = sum(trial["reused_episodes"] for trial in trials)
+        if num_pruned > 0:
+            print(
+                f"Pruned {num_pruned} of {num_runs} runs, "
+                f"saving {episodes_saved} simulator episodes"
+            )
 
         mean_average_reward = float(np.mean(average_reward, axis=0))
         mean_final_reward = float(np.mean(final_reward, axis=0))
         loss = -(mean_average_reward + mean_final_reward)
 
-        return dict(loss=loss, info=dict(rewards=rewards))
+        schedule = dict(
+            worker=self.worker_id,
+            num_cores=num_concurrent * (num_parallel or 1),
+            compute_seconds=time.time() - compute_start,
+            run_seconds=[trial["seconds"] for trial in trials],
+        )
+        result = dict(
+            loss=loss,
+            info=dict(
+                rewards=rewards,
+                schedule=schedule,
+                pruned_runs=num_pruned,
+                episodes_saved=episodes_saved,
+                simulated_episodes=simulated_episodes,
+                reused_episodes=reused_episodes,
+            ),
+        )
+        if self.cache is not None:
+            self.cache.put(key=cache_key, result=result)
+        return result
 
     def get_configspace(self):
         """
@@ -158,6 +266,327 @@ class TensorforceWorker(Worker):
         return configspace
 
 
+class ResultCache:
+    # Files and packages (all Python files) whose content determines evaluation results
+    CODE_FILES = (
+        "tune.py",
+        "custom_environment.py",
+        "experiment.py",
+        "baseline_agent.py",
+        "util.py",
+        "Model.nlogo",
+    )
+    CODE_PACKAGES = ("external/tensorforce",)
+
+    def __init__(self, directory: str):
+        """
+        Content-addressed on-disk cache of evaluation results, keyed by the canonicalized
+        configuration, budget, evaluation settings and code version.
+        :param directory: Cache directory (shared across tuning sessions).
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        src_dir = Path(__file__).parent
+        paths = [src_dir / filename for filename in self.CODE_FILES]
+        for package in self.CODE_PACKAGES:
+            paths.extend(sorted((src_dir / package).rglob("*.py")))
+        code_hash = hashlib.sha256()
+        for path in paths:
+            if path.is_file():
+                code_hash.update(str(path.relative_to(src_dir)).encode())
+                code_hash.update(path.read_bytes())
+        self.code_version = code_hash.hexdigest()
+
+    def key(self, config: dict, budget: float, settings: dict) -> str:
+        """
+        Returns the cache key of a configuration and budget under the given evaluation settings.
+        """
+        content = dict(
+            config={name: canonicalize(value) for name, value in config.items()},
+            budget=float(budget),
+            settings={name: canonicalize(value) for name, value in settings.items()},
+            code_version=self.code_version,
+        )
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True).encode()
+        ).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached result for the key, or None.
+        """
+        path = self.directory / f"{key}.json"
+        if not path.is_file():
+            return None
+        with open(path, "r") as fp:
+            return json.load(fp=fp)
+
+    def put(self, key: str, result: dict):
+        """
+        Writes the result for the key atomically.
+        """
+        path = self.directory / f"{key}.json"
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as fp:
+            json.dump(result, fp=fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+
+
+def canonicalize(value):
+    """
+    Converts NumPy scalars and containers to plain JSON values, so equal configurations hash equally.
+    :param value: Value to convert.
+    :return: Canonical value.
+    """
+    if isinstance(value, dict):
+        return {str(name): canonicalize(x) for name, x in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [canonicalize(x) for x in value]
+    elif isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class LearningCurvePruner:
+    def __init__(
+        self,
+        curves_path: str,
+        quantile: float = 0.25,
+        grace_episodes: int = 100,
+        interval: int = 10,
+        min_runs: int = 5,
+    ):
+        """
+        Runner callback which stops a run once its running mean return falls below the given
+        quantile of previously completed runs at the same episode count.
+        :param curves_path: JSON-lines file of episode returns of completed runs (shared by workers).
+        :param quantile: Quantile of completed runs a run has to reach to continue.
+        :param grace_episodes: Number of episodes before a run can be pruned.
+        :param interval: Episode interval between checks.
+        :param min_runs: Minimum number of completed runs before pruning.
+        """
+        self.curves_path = curves_path
+        self.quantile = quantile
+        self.grace_episodes = grace_episodes
+        self.interval = interval
+        self.min_runs = min_runs
+        self.pruned_at = None
+
+        # Running mean returns of completed runs, snapshot at start of run
+        self.reference_curves = list()
+        if os.path.isfile(curves_path):
+            with open(curves_path, "r") as fp:
+                for line in fp:
+                    returns = np.asarray(json.loads(line), dtype=np.float64)
+                    self.reference_curves.append(
+                        np.cumsum(returns) / np.arange(1, len(returns) + 1)
+                    )
+
+    def __call__(self, runner, parallel) -> bool:
+        num_episodes = len(runner.episode_returns)
+        if num_episodes < self.grace_episodes or num_episodes % self.interval != 0:
+            return True
+        references = [
+            curve[num_episodes - 1]
+            for curve in self.reference_curves
+            if len(curve) >= num_episodes
+        ]
+        if len(references) < self.min_runs:
+            return True
+        threshold = np.quantile(references, self.quantile)
+        if runner.episode_returns.mean() < threshold:
+            self.pruned_at = num_episodes
+            return False
+        return True
+
+    def record(self, returns: list):
+        """
+        Appends the episode returns of a completed run to the shared learning curves.
+        """
+        with open(self.curves_path, "a") as fp:
+            fp.write(json.dumps(returns) + "\n")
+
+
+def run_trial(
+    agent,
+    environment,
+    num_episodes,
+    env_kwargs,
+    max_episode_timesteps=None,
+    num_parallel=None,
+    registry=None,
+    pruning=None,
+    continuation_dir=None,
+    resources=None,
+):
+    """
+    Trains one agent configuration for one run (module-level to be picklable for concurrent runs).
+    :param agent: Agent configuration.
+    :param environment: Environment specification.
+    :param num_episodes: Number of episodes to train.
+    :param env_kwargs: Keyword arguments of the environment.
+    :param max_episode_timesteps: Maximum number of timesteps per episode.
+    :param num_parallel: Number of parallel environments (None for a single local environment).
+    :param registry: Address (host:port) of environment registry to lease remote environments from.
+    :param pruning: Keyword arguments of LearningCurvePruner (None to train all episodes).
+    :param continuation_dir: Directory of this configuration and run index, whose result is reused
+        by higher budgets, which add runs of num_episodes each (None to always train).
+    :param resources: Plan of resources.plan_resources for agent and environments (None for defaults).
+    :return: Dictionary with average and final reward, episode returns, run seconds, pruning and
+        number of simulated and reused episodes.
+    """
+    start = time.time()
+    if continuation_dir is not None:
+        result_path = os.path.join(continuation_dir, "result.json")
+        if os.path.isfile(result_path):
+            # Run finished (or was pruned) in a lower budget round already
+            with open(result_path, "r") as fp:
+                result = json.load(fp=fp)
+            return dict(
+                result, seconds=0.0, simulated_episodes=0, reused_episodes=result["episodes"]
+            )
+
+    if resources is not None:
+        apply_agent_resources(resources["agent"])
+        if num_parallel is None:
+            env_kwargs = dict(env_kwargs, resources=resources["environments"][0])
+    pruner = None if pruning is None else LearningCurvePruner(**pruning)
+    run_kwargs = dict(
+        num_episodes=num_episodes,
+        use_tqdm=True,
+        statistics_horizons=(20,),
+        callback=pruner,
+    )
+    if registry is not None:
+        # Pooled connections to leased workers are reused across runs and configurations
+        num_parallel = num_parallel or 1
+        runner = Runner(
+            agent=agent,
+            remote="socket-client",
+            registry=registry,
+            num_parallel=num_parallel,
+        )
+        run_kwargs.update(
+            batch_agent_calls=num_parallel > 1, sync_episodes=num_parallel > 1
+        )
+    elif num_parallel is None:
+        runner = Runner(
+            agent=agent,
+            environment=environment,
+            max_episode_timesteps=max_episode_timesteps,
+            **env_kwargs,
+        )
+    elif resources is not None:
+        runner = Runner(
+            agent=agent,
+            environments=[
+                dict(environment, resources=environment_resources)
+                for environment_resources in resources["environments"]
+            ],
+            max_episode_timesteps=max_episode_timesteps,
+            remote="multiprocessing",
+            **env_kwargs,
+        )
+        run_kwargs.update(batch_agent_calls=True, sync_episodes=True)
+    else:
+        runner = Runner(
+            agent=agent,
+            environment=environment,
+            max_episode_timesteps=max_episode_timesteps,
+            num_parallel=num_parallel,
+            remote="multiprocessing",
+            **env_kwargs,
+        )
+        run_kwargs.update(batch_agent_calls=True, sync_episodes=True)
+    runner.run(**run_kwargs)
+
+    # Pruned runs report the loss of their partial learning curve
+    pruned = pruner is not None and pruner.pruned_at is not None
+    if pruner is not None and not pruned:
+        pruner.record(returns=runner.episode_returns.tolist())
+
+    result = dict(
+        average_reward=runner.episode_returns.mean(),
+        final_reward=runner.episode_returns.mean(horizon=20),
+        rewards=runner.episode_returns.tolist(),
+        pruned=pruned,
+        episodes=len(runner.episode_returns),
+    )
+    if continuation_dir is not None:
+        # Result is kept for promotion to a higher budget
+        os.makedirs(continuation_dir, exist_ok=True)
+        with open(result_path, "w") as fp:
+            json.dump(result, fp=fp)
+    runner.close()
+
+    return dict(
+        result,
+        seconds=time.time() - start,
+        simulated_episodes=result["episodes"],
+        reused_episodes=0,
+    )
+
+
+def run_worker(worker_kwargs: dict):
+    """
+    Runs an additional TensorforceWorker (in its own process) until the optimizer shuts it down.
+    :param worker_kwargs: Keyword arguments of TensorforceWorker.
+    """
+    worker = TensorforceWorker(**worker_kwargs)
+    try:
+        worker.run(background=False)
+    finally:
+        # Child processes exit without atexit handlers, which would release the registry leases
+        SocketEnvironment.close_pool()
+
+
+def scheduling_report(results, num_cores: int, session_seconds: float):
+    """
+    Prints how busy workers and cores were over the tuning session.
+    :param results: hpbandster Result of the tuning session.
+    :param num_cores: Number of available CPU cores.
+    :param session_seconds: Wall-clock duration of the tuning session.
+    """
+    runs = [
+        run
+        for run in results.get_all_runs()
+        if run.info is not None and "schedule" in run.info
+    ]
+    if len(runs) == 0 or session_seconds <= 0.0:
+        return
+
+    worker_seconds = dict()
+    core_seconds = 0.0
+    queue_seconds = list()
+    budget_seconds = dict()
+    for run in runs:
+        schedule = run.info["schedule"]
+        seconds = run.time_stamps["finished"] - run.time_stamps["started"]
+        worker_seconds[schedule["worker"]] = (
+            worker_seconds.get(schedule["worker"], 0.0) + seconds
+        )
+        core_seconds += schedule["compute_seconds"] * schedule["num_cores"]
+        queue_seconds.append(run.time_stamps["started"] - run.time_stamps["submitted"])
+        budget_seconds.setdefault(run.budget, list()).append(seconds)
+
+    print("Scheduling report:")
+    print(
+        f"{len(runs)} evaluations on {len(worker_seconds)} workers in {session_seconds:.0f}s, "
+        f"core utilisation {100.0 * core_seconds / (num_cores * session_seconds):.1f}% "
+        f"of {num_cores} cores"
+    )
+    print(f"Mean queueing delay: {np.mean(queue_seconds):.1f}s")
+    for worker, seconds in sorted(worker_seconds.items()):
+        print(f"Worker {worker}: busy {100.0 * seconds / session_seconds:.1f}%")
+    for budget, seconds in sorted(budget_seconds.items()):
+        print(
+            f"Budget {budget:g}: {len(seconds)} evaluations, "
+            f"mean {np.mean(seconds):.0f}s, max {np.max(seconds):.0f}s"
+        )
+
+
 def read_config_file(config):
     """
 
@@ -249,6 +678,46 @@ def main():
         "--restore", type=str, default=None, help="Restore from given directory"
     )
     parser.add_argument("--id", type=str, default="worker", help="Unique worker id")
+    parser.add_argument(
+        "-w",
+        "--num-workers",
+        type=int,
+        default=None,
+        help="Number of concurrent BOHB workers, defaults to as many as cores allow",
+    )
+    parser.add_argument(
+        "-pq",
+        "--prune-quantile",
+        type=float,
+        default=None,
+        help="Stop runs whose running mean return falls below this quantile of completed runs "
+        "at the same episode, defaults to no pruning",
+    )
+    parser.add_argument(
+        "--prune-grace",
+        type=int,
+        default=100,
+        help="Number of episodes before a run can be pruned",
+    )
+    parser.add_argument(
+        "--prune-interval",
+        type=int,
+        default=10,
+        help="Episode interval between pruning checks",
+    )
+    parser.add_argument(
+        "--prune-min-runs",
+        type=int,
+        default=5,
+        help="Minimum number of completed runs before pruning",
+    )
+    parser.add_argument(
+        "-cr",
+        "--concurrent-runs",
+        type=int,
+        default=1,
+        help="Number of runs of a configuration each worker executes concurrently",
+    )
 
     parser.add_argument(
         "-rk",
@@ -258,7 +727,44 @@ def main():
         help="Reward function to use",
     )
 
+    parser.add_argument(
+        "-rg",
+        "--registry",
+        type=str,
+        default=None,
+        help="Address (host:port) of environment registry to lease remote environments from",
+    )
+
+    parser.add_argument(
+        "--model_size",
+        type=str,
+        default="training",
+        choices=["training", "evaluation"],
+        help="Control which model size to size",
+    )
+    parser.add_argument(
+        "--decision-interval",
+        type=int,
+        default=30,
+        help="Simulated minutes between fee adjustments, coarse intervals cut agent calls",
+    )
+    parser.add_argument(
+        "--action-repeat",
+        type=int,
+        default=1,
+        help="Number of decision intervals the fees of an action are kept for",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default="tuner/cache",
+        help="Directory of evaluation results cached across tuning sessions",
+    )
+
     add_bool_arg(parser, "adjust_free", default=True)
+    add_bool_arg(parser, "cache", default=True)
+    add_bool_arg(parser, "continuation", default=False)
+    add_bool_arg(parser, "manage_resources", default=True)
 
     args = parser.parse_args()
 
@@ -293,9 +799,22 @@ def main():
     )
     nameserver, nameserver_port = server.start()
 
-    worker = TensorforceWorker(
+    # Size workers so concurrent evaluations (and their fanned-out runs) keep all cores busy
+    num_cores = os.cpu_count() or 1
+    cores_per_run = 1 if args.registry is not None else (args.num_parallel or 1)
+    if args.num_workers is None:
+        num_workers = max(1, num_cores // (cores_per_run * args.concurrent_runs))
+    else:
+        num_workers = args.num_workers
+    print(
+        f"{num_workers} workers, each {args.concurrent_runs} concurrent runs "
+        f"with {cores_per_run} cores, on {num_cores} cores"
+    )
+
+    worker_kwargs = dict(
         environment=environment,
-        max_episode_timesteps=args.max_episode_timesteps,
+        max_episode_timesteps=args.max_episode_timesteps
+        or episode_timesteps(args.decision_interval, args.action_repeat),
         num_episodes=args.episodes,
         base=args.selection_factor,
         runs_per_round=runs_per_round,
@@ -309,8 +828,35 @@ def main():
         timestamp=timestamp,
         nl_path=args.nl_path,
         adjust_free=args.adjust_free,
+        registry=args.registry,
+        concurrent_runs=args.concurrent_runs,
+        pruning=None
+        if args.prune_quantile is None
+        else dict(
+            quantile=args.prune_quantile,
+            grace_episodes=args.prune_grace,
+            interval=args.prune_interval,
+            min_runs=args.prune_min_runs,
+        ),
+        continuation=args.continuation,
+        model_size=args.model_size,
+        cache_dir=args.cache_dir if args.cache else None,
+        run_cores=max(1, num_cores // (num_workers * args.concurrent_runs))
+        if args.manage_resources
+        else None,
+        decision_interval=args.decision_interval,
+        action_repeat=args.action_repeat,
     )
+    worker = TensorforceWorker(**worker_kwargs, id=0)
     worker.run(background=True)
+    worker_processes = [
+        get_context("spawn").Process(
+            target=run_worker, args=(dict(worker_kwargs, id=n),)
+        )
+        for n in range(1, num_workers)
+    ]
+    for process in worker_processes:
+        process.start()
 
     if args.restore is None:
         previous_result = None
@@ -342,12 +888,17 @@ def main():
     # logger: logging.logger like object, the logger to output some (more or less meaningful)
     # information
 
-    results = optimizer.run(n_iterations=args.num_iterations)
+    session_start = time.time()
+    results = optimizer.run(n_iterations=args.num_iterations, min_n_workers=num_workers)
     # optimizer.run(n_iterations=1, min_n_workers=1, iteration_kwargs={})
     # min_n_workers: int, minimum number of workers before starting the run
+    session_seconds = time.time() - session_start
 
     optimizer.shutdown(shutdown_workers=True)
+    for process in worker_processes:
+        process.join()
     server.shutdown()
+    SocketEnvironment.close_pool()
 
     with open(os.path.join(directory, "results.pkl"), "wb") as filehandle:
         pickle.dump(results, filehandle)
@@ -364,6 +915,30 @@ def main():
         )
     )
     print("A total of {} runs where executed.".format(len(results.get_all_runs())))
+    infos = [run.info for run in results.get_all_runs() if run.info is not None]
+    print(
+        "A total of {} runs where pruned, saving {} simulator episodes.".format(
+            sum(info.get("pruned_runs", 0) for info in infos),
+            sum(info.get("episodes_saved", 0) for info in infos),
+        )
+    )
+    print(
+        "A total of {} runs where served from the result cache.".format(
+            sum(info.get("cached", False) for info in infos)
+        )
+    )
+    simulated_episodes = sum(info.get("simulated_episodes", 0) for info in infos)
+    reused_episodes = sum(info.get("reused_episodes", 0) for info in infos)
+    if reused_episodes > 0:
+        print(
+            "Budget continuation reused {} episodes, {:.1f}% of {} episodes otherwise "
+            "simulated.".format(
+                reused_episodes,
+                100.0 * reused_episodes / (simulated_episodes + reused_episodes),
+                simulated_episodes + reused_episodes,
+            )
+        )
+    scheduling_report(results, num_cores=num_cores, session_seconds=session_seconds)
 
 
 if __name__ == "__main__":
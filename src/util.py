@@ -2,6 +2,7 @@ import csv
 import json
 import os
 import re
+import time
 from glob import glob
 from pathlib import Path
 from typing import List, Dict
@@ -23,6 +24,24 @@ X_LABEL = [
 ]
 
 
+# Simulated minutes per episode (8 AM to 8 PM)
+EPISODE_MINUTES = 720
+
+
+def episode_timesteps(decision_interval: int = 30, action_repeat: int = 1) -> int:
+    """
+    Number of agent timesteps per episode of CustomEnvironment.
+    :param decision_interval: Simulated minutes per interval.
+    :param action_repeat: Number of intervals the fees of an action are kept for.
+    :return: Maximum number of timesteps per episode.
+    """
+    return -(-EPISODE_MINUTES // (decision_interval * action_repeat))
+
+
+# Downsampled levels of episode series, in ticks per row (1800 ticks per hour)
+SERIES_LEVELS = {"minute": 30, "half_hour": 900}
+
+
 def add_bool_arg(parser, name, default=False):
     """
     Adds boolean arguments to parser by registering both the positive argument and the "no"-argument.
@@ -140,14 +159,8 @@ def document_episode(nl, path: Path, reward_sum):
     :return:
     """
     path.mkdir(parents=True, exist_ok=True)
-    # Get all directories to check which episode this is
-    dirs = glob(str(path) + "/E*.pkl")
-    current_episode = 1
-    if dirs:
-        last_episode = max(
-            [int(re.findall("E(\d+)", dirs[i])[0]) for i in range(len(dirs))]
-        )
-        current_episode = last_episode + 1
+    # Check which episode this is
+    current_episode = get_episode_index(path) + 1
     episode_path = str(path / f"E{current_episode}_{np.around(reward_sum, 8)}").replace(
         "\\", "/"
     )
@@ -155,14 +168,209 @@ def document_episode(nl, path: Path, reward_sum):
     nl.command(f'export-world "{episode_path}.csv"')
     nl.command(f'export-view "{episode_path}.png"')
 
-    # Save relevant data as pickle to save storage
+    # Save relevant data as pickle (with downsampled levels and summary) to save storage
     df = get_data_from_run(f"{episode_path}.csv")
-    df.to_pickle(f"{episode_path}.pkl", compression="zip")
+    summary = save_episode_series(df, episode_path)
+    # Standard summary record of the episode (e.g. for the results warehouse)
+    append_jsonl(
+        path / "episode_summaries.jsonl",
+        {
+            "episode": os.path.basename(episode_path),
+            "reward": float(reward_sum),
+            **summary_scores(summary),
+            "summary": summary,
+        },
+    )
 
     # Delete csv
     os.remove(f"{episode_path}.csv")
 
 
+def append_jsonl(path: Path, record: dict):
+    """
+    Appends one record as JSON line to a file (single write, so concurrent environments appending
+    to the same file do not interleave records).
+    :param path: Path of JSONL file.
+    :param record: JSON-serializable record.
+    :return:
+    """
+    with open(str(path), "a") as fp:
+        fp.write(json.dumps(record) + "\n")
+
+
+def read_jsonl(path: Path) -> list:
+    """
+    Reads the complete records of a JSONL file (the last line may still be written).
+    :param path: Path of JSONL file.
+    :return: List of records.
+    """
+    records = []
+    with open(str(path), "r") as fp:
+        for line in fp:
+            if not line.endswith("\n"):
+                break
+            records.append(json.loads(line))
+    return records
+
+
+def get_episode_index(path: Path):
+    """
+    Returns the index of the last documented episode in given directory (0 if there is none).
+    :param path: Path of current Experiment.
+    :return: Index of last episode.
+    """
+    dirs = glob(str(path) + "/E*.pkl")
+    if not dirs:
+        return 0
+    return max([int(re.findall("E(\d+)", dirs[i])[0]) for i in range(len(dirs))])
+
+
+def delete_episodes_after(path: Path, episode_index: int):
+    """
+    Deletes documented episodes with an index larger than the given one, e.g. episodes written after
+    the last saved run state of a crashed experiment.
+    :param path: Path of current Experiment.
+    :param episode_index: Index of last episode to keep.
+    :return:
+    """
+    for file in glob(str(path) + "/E*"):
+        found = re.findall("E(\d+)_", os.path.basename(file))
+        if found and int(found[0]) > episode_index and os.path.isfile(file):
+            os.remove(file)
+
+
+def truncate_jsonl(path: Path, offset: int):
+    """
+    Drops the records after offset from a JSONL file written by other processes (e.g. summaries of
+    episodes repeated when resuming from a run state), including a record cut by offset.
+    :param path: Path of JSONL file.
+    :param offset: Size of the file up to which records are kept.
+    :return:
+    """
+    if not path.is_file():
+        return
+    with open(str(path), "r+b") as fp:
+        data = fp.read(offset)
+        fp.truncate(data.rfind(b"\n") + 1)
+
+
+def load_seeds(path: str):
+    """
+    Loads a list of per-episode seeds, so baseline and RL evaluation episodes can be compared pairwise.
+    :param path: Path of JSON file containing the list of seeds.
+    :return: List of seeds.
+    """
+    with open(path, "r") as fp:
+        seeds = json.load(fp=fp)
+    return [int(seed) for seed in seeds]
+
+
+# Independent seed streams derived from the seed of a run
+AGENT_SEEDS = 0
+PROCESS_SEEDS = 1
+EPISODE_SEEDS = 2
+
+
+def derive_seed(run_seed: int, stream: int, *indices: int) -> int:
+    """
+    Derives a seed from the seed of a run, which is statistically independent of the seeds of
+    other streams and indices (numpy.random.SeedSequence), and valid for NetLogo's random-seed.
+    :param run_seed: Seed of run.
+    :param stream: Stream of seeds (AGENT_SEEDS, PROCESS_SEEDS or EPISODE_SEEDS).
+    :param indices: Indices within stream, e.g. environment and episode.
+    :return: Seed in [0, 2**31).
+    """
+    sequence = np.random.SeedSequence([run_seed, stream, *indices])
+    return int(sequence.generate_state(1)[0] % 2**31)
+
+
+class ResultsLog:
+    def __init__(self, path: Path, fsync_episodes: int = 10, fsync_seconds: float = 60.0):
+        """
+        Append-only log of episode results (one JSON line per episode), which survives crashes of
+        the experiment and can be read by other processes while it is written.
+        Records are flushed per episode, the costlier fsync is batched.
+        :param path: Path of log file.
+        :param fsync_episodes: Number of records after which the log is synced to disk.
+        :param fsync_seconds: Seconds after which the log is synced to disk.
+        """
+        self.path = Path(path)
+        self.fsync_episodes = fsync_episodes
+        self.fsync_seconds = fsync_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fp = open(str(self.path), "a")
+        self.unsynced = 0
+        self.last_sync = time.time()
+
+    def offset(self) -> int:
+        """
+        Returns the size of the log up to and including the last complete record.
+        """
+        return self.fp.tell()
+
+    def truncate(self, offset: int):
+        """
+        Drops the records after offset (e.g. of episodes repeated when resuming from a run state).
+        :param offset: Offset returned by offset().
+        :return:
+        """
+        self.sync()
+        self.fp.truncate(offset)
+        self.fp.seek(offset)
+
+    def append(self, record: dict):
+        """
+        Appends one record to the log.
+        :param record: JSON-serializable episode results.
+        :return:
+        """
+        self.fp.write(json.dumps(record) + "\n")
+        # Visible to readers (and safe against crashes of this process) after flushing
+        self.fp.flush()
+        self.unsynced += 1
+        if (
+            self.unsynced >= self.fsync_episodes
+            or time.time() - self.last_sync >= self.fsync_seconds
+        ):
+            self.sync()
+
+    def sync(self):
+        """
+        Syncs flushed records to disk (safe against crashes of the machine).
+        :return:
+        """
+        if self.unsynced > 0:
+            os.fsync(self.fp.fileno())
+            self.unsynced = 0
+        self.last_sync = time.time()
+
+    def close(self):
+        self.sync()
+        self.fp.close()
+
+
+def read_results_log(path: Path, mode: str = None, run: str = None) -> pd.DataFrame:
+    """
+    Reads a results log without interfering with the process writing it.
+    :param path: Path of log file.
+    :param mode: Only return records of this mode ("training" or "eval"), all records if None.
+    :param run: Only return records of this run (started or resumed experiment), all if None.
+    :return: DataFrame with one row per logged episode.
+    """
+    records = []
+    with open(str(path), "r") as fp:
+        for line in fp:
+            # Last line may still be written
+            if not line.endswith("\n"):
+                break
+            record = json.loads(line)
+            if (mode is None or record["mode"] == mode) and (
+                run is None or record["run"] == run
+            ):
+                records.append(record)
+    return pd.DataFrame.from_records(records)
+
+
 def label_episodes(path: Path, df: pd.DataFrame, mode: str):
     """
     Identifies worst, median and best episode of run. Renames them and saves plots.
@@ -205,6 +413,19 @@ def label_episodes(path: Path, df: pd.DataFrame, mode: str):
                     episode.replace("pkl", "png"),
                     str(new_path / f"view_{mode}_{metric}_{performances[metric]}.png"),
                 )
+                if os.path.isfile(levels_path(episode)):
+                    os.rename(
+                        levels_path(episode),
+                        str(new_path / f"{mode}_{metric}_{performances[metric]}.levels"),
+                    )
+                append_jsonl(
+                    path / "episode_labels.jsonl",
+                    {
+                        "episode": os.path.splitext(os.path.basename(episode))[0],
+                        "mode": mode,
+                        "metric": metric,
+                    },
+                )
                 episode_files.remove(episode)
                 break
 
@@ -233,10 +454,8 @@ def save_plots(outpath: Path, episode_path: str):
     :param episode_path: Path of current episode.
     :return:
     """
-    try:
-        data_df = pd.read_pickle(episode_path, compression="zip")
-    except FileNotFoundError:
-        data_df = get_data_from_run(episode_path)
+    # Plots span 12 hours, one value per minute suffices
+    data_df = load_episode_series(episode_path, max_step=SERIES_LEVELS["minute"])
 
     for func in [
         plot_fees,
@@ -307,6 +526,137 @@ def get_data_from_run(episode_path):
     return data_df
 
 
+def episode_stem(episode_path: str) -> str:
+    """
+    Strips the .pkl or .csv suffix of an episode path (episode names contain the return, e.g.
+    E1_3.25, so other suffixes are part of the name).
+    :param episode_path: Path of episode (with or without .pkl or .csv suffix).
+    :return: Path of episode without suffix.
+    """
+    stem, suffix = os.path.splitext(episode_path)
+    return stem if suffix in [".pkl", ".csv"] else episode_path
+
+
+def levels_path(episode_path: str) -> str:
+    """
+    Returns the path of the downsampled levels of an episode (next to its full-resolution data).
+    :param episode_path: Path of episode (with or without .pkl or .csv suffix).
+    :return: Path of levels file.
+    """
+    return f"{episode_stem(episode_path)}.levels"
+
+
+def downsample_series(data_df: pd.DataFrame, step: int) -> pd.DataFrame:
+    """
+    Downsamples per-tick episode series to the values of every step-th tick (first and last tick
+    included, as an episode has a multiple of step ticks).
+    :param data_df: DataFrame with one row per tick.
+    :param step: Number of ticks per row of downsampled series.
+    :return: Downsampled DataFrame.
+    """
+    return data_df.iloc[::step].reset_index(drop=True)
+
+
+def episode_summary(data_df: pd.DataFrame) -> dict:
+    """
+    Computes summary scalars of per-tick episode series, which suffice for most analyses.
+    :param data_df: DataFrame with one row per tick.
+    :return: Dictionary with first, last, mean, min and max of every series, the share of ticks of
+    every CPZ in the target occupancy band and the resulting occupancy score.
+    """
+    summary = dict()
+    for col in data_df.columns:
+        if col == "x":
+            continue
+        summary[f"{col}_first"] = float(data_df[col].iloc[0])
+        summary[f"{col}_last"] = float(data_df[col].iloc[-1])
+        summary[f"{col}_mean"] = float(data_df[col].mean())
+        summary[f"{col}_min"] = float(data_df[col].min())
+        summary[f"{col}_max"] = float(data_df[col].max())
+    occupancy_score = 0
+    for c in ["yellow", "green", "teal", "blue"]:
+        share = float(
+            ((data_df[f"{c}_lot_occup"] > 75) & (data_df[f"{c}_lot_occup"] < 90)).mean()
+        )
+        summary[f"{c}_lot_target_share"] = share
+        occupancy_score += share * 0.25
+    summary["occupancy_score"] = occupancy_score
+    return summary
+
+
+def summary_scores(summary: dict) -> dict:
+    """
+    Scores of an episode (as in the radar plot) from its summary scalars.
+    :param summary: Summary scalars (see episode_summary).
+    :return: Dictionary with occupancy, cars, speed and social score.
+    """
+    return {
+        "occupancy": summary["occupancy_score"],
+        "cars": 1 - summary["cars_overall_last"] / 100,
+        "speed": summary["average_speed_mean"],
+        "social": summary["low_income_last"],
+    }
+
+
+def save_episode_series(data_df: pd.DataFrame, episode_path: str):
+    """
+    Saves per-tick episode series once at full resolution (.pkl) and, next to it, its downsampled
+    levels and summary (.levels), so analyses of many episodes do not load full series.
+    :param data_df: DataFrame with one row per tick.
+    :param episode_path: Path of episode (without extension).
+    :return: Summary scalars of episode.
+    """
+    data_df.to_pickle(f"{episode_path}.pkl", compression="zip")
+    levels = {
+        name: downsample_series(data_df, step) for name, step in SERIES_LEVELS.items()
+    }
+    levels["summary"] = episode_summary(data_df)
+    pd.to_pickle(levels, f"{episode_path}.levels", compression="zip")
+    return levels["summary"]
+
+
+def load_full_series(episode_path: str) -> pd.DataFrame:
+    """
+    Loads the full-resolution series of an episode, from its pickle or the csv exported by NetLogo.
+    :param episode_path: Path of episode (.pkl or .csv).
+    :return: DataFrame with one row per tick.
+    """
+    try:
+        return pd.read_pickle(f"{episode_stem(episode_path)}.pkl", compression="zip")
+    except (FileNotFoundError, BadZipFile):
+        return get_data_from_run(f"{episode_stem(episode_path)}.csv")
+
+
+def load_episode_series(episode_path: str, max_step: int = None) -> pd.DataFrame:
+    """
+    Loads episode series at the coarsest stored level with at most max_step ticks per row, full
+    resolution only if required (or if the episode has no stored levels).
+    :param episode_path: Path of episode (.pkl or .csv).
+    :param max_step: Maximum number of ticks per row, full resolution if None.
+    :return: DataFrame with episode series.
+    """
+    steps = [
+        (step, name)
+        for name, step in SERIES_LEVELS.items()
+        if max_step is not None and step <= max_step
+    ]
+    if steps and os.path.isfile(levels_path(episode_path)):
+        levels = pd.read_pickle(levels_path(episode_path), compression="zip")
+        return levels[max(steps)[1]]
+    return load_full_series(episode_path)
+
+
+def load_episode_summary(episode_path: str) -> dict:
+    """
+    Loads the summary scalars of an episode, computed from the full series if not stored.
+    :param episode_path: Path of episode (.pkl or .csv).
+    :return: Dictionary of summary scalars (see episode_summary).
+    """
+    if os.path.isfile(levels_path(episode_path)):
+        return pd.read_pickle(levels_path(episode_path), compression="zip")["summary"]
+    return episode_summary(load_full_series(episode_path))
+
+
 def plot_fees(data_df, outpath):
     """
     Plot fees for CPZs over run of episode.
@@ -493,9 +843,11 @@ def plot_speed(data_df, outpath):
     """
     fig, ax = plt.subplots(1, 1, figsize=(20, 8), dpi=300)
     ax.plot(data_df.x, data_df.average_speed, linewidth=3, color=cm.bamako(0))
+    # Rolling mean over 50 ticks, independent of the resolution of the series
+    ticks_per_row = max(1, round((data_df.x.iloc[1] - data_df.x.iloc[0]) * 1800))
     ax.plot(
         data_df.x,
-        data_df.average_speed.rolling(50).mean(),
+        data_df.average_speed.rolling(max(1, round(50 / ticks_per_row))).mean(),
         linewidth=3,
         color=cm.bamako(1.0),
     )
@@ -742,8 +1094,8 @@ def create_colourbar(fig):
 
 def draw_radar_plot(input_dir):
     """
-
-    :param input_dir:
+    Draws radar plot of the (median) episodes in a directory, labelled by their file names.
+    :param input_dir: Directory of episodes.
     :return:
     """
     if glob(input_dir + "/*.pkl"):
@@ -753,6 +1105,23 @@ def draw_radar_plot(input_dir):
         median_runs = glob(input_dir + "/*.csv")
         median_labels = [re.findall("([a-zA-Z]+).csv", run)[0] for run in median_runs]
 
+    # Scores only need summary scalars, not the series
+    plot_radar(
+        {
+            label: summary_scores(load_episode_summary(run))
+            for label, run in zip(median_labels, median_runs)
+        }
+    )
+
+
+def plot_radar(run_scores: dict, outpath: str = "radar_plot.pdf"):
+    """
+    Draws radar plot of the scores of runs, each normalized by its maximum over the runs.
+    :param run_scores: Scores (see summary_scores) per run label.
+    :param outpath: Path to save plot.
+    :return:
+    """
+    median_labels = list(run_scores.keys())
     categories = [
         "Optimize Occupancy",
         "Preserve Social Composition",
@@ -761,34 +1130,14 @@ def draw_radar_plot(input_dir):
     ]
     categories = [*categories, categories[0]]
     color_list = sns.color_palette("colorblind")
-    occup_scores = []
-    social_scores = []
-    speed_scores = []
-    n_cars_scores = []
     performance_dict = dict()
-    for i, run in enumerate(median_runs):
-        try:
-            df = pd.read_pickle(run, compression="zip")
-        except (FileNotFoundError, BadZipFile):
-            df = get_data_from_run(run)
-        label = median_labels[i]
+    for label in median_labels:
         performance_dict[label] = dict()
-        # Overall time
-        occup_score = 0
-        for c in ["yellow", "green", "teal", "blue"]:
-            occup_score += (
-                len(df[(df[f"{c}_lot_occup"] > 75) & (df[f"{c}_lot_occup"] < 90)])
-                / len(df)
-            ) * 0.25
-        occup_scores.append(occup_score)
-        n_cars_scores.append(1 - df["cars_overall"].iloc[-1] / 100)
-        speed_scores.append(df.average_speed.mean())
-        social_scores.append(df.low_income.iloc[-1])
-
-    for i, label in enumerate(median_labels):
         scores = []
-        for score_list in [occup_scores, social_scores, speed_scores, n_cars_scores]:
-            scores.append(score_list[i] / max(score_list))
+        for key in ["occupancy", "social", "speed", "cars"]:
+            scores.append(
+                run_scores[label][key] / max(run[key] for run in run_scores.values())
+            )
         scores.append(scores[0])
         performance_dict[label]["scores"] = scores
 
@@ -834,6 +1183,7 @@ def draw_radar_plot(input_dir):
     plt.tight_layout()
     ax.spines["polar"].set_color("#222222")
 
-    fig.savefig("radar_plot.pdf", bbox_inches="tight")
+    fig.savefig(outpath, bbox_inches="tight")
 
     plt.show()
+